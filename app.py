@@ -1,17 +1,244 @@
-from fastapi import FastAPI, HTTPException, Security, Depends, File, UploadFile
-import base64
+from fastapi import FastAPI, HTTPException, Security, Depends, File, UploadFile, Header, Request, Query, WebSocket
+import asyncio
+import contextlib
+import functools
+import json
+import logging
+import math
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import List, Optional
 from fastapi.security.api_key import APIKeyHeader
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 import uvicorn
-from inference import detector
-from fastapi.responses import HTMLResponse
+from audio import SAMPLE_RATE, DEFAULT_RESAMPLE_QUALITY, b64_to_bytes, load_audio_capped, wav_header
+from inference import loader, error_result, VAD_OPTIONS
+from cascade import CascadeDetector
+from batching import MicroBatcher, DEFAULT_MAX_BATCH_SIZE, DEFAULT_MAX_WAIT_MS
+from input_buffers import DEFAULT_BUCKET_EDGES_S
+import chunking
+import jobs
+from cache import ResultCache, cache_key, DEFAULT_MAX_DB_ENTRIES, DEFAULT_MAX_ENTRIES, DEFAULT_TTL_S
+import metrics
+import streaming
+from limits import (BodySizeLimit, base64_size, DEFAULT_MAX_UPLOAD_BYTES, DEFAULT_MAX_BATCH_BYTES,
+                    DEFAULT_MAX_DECODE_SECONDS, BODY_OVERHEAD_BYTES)
+import vad
+from static_page import STATIC_DIR, StaticPage
+from streaming import FrameDecoder, StreamSession
+from workers import (InferencePool, Overloaded, DeadlineExceeded, DEFAULT_DECODE_WORKERS,
+                     DEFAULT_INFERENCE_THREADS, DEFAULT_MAX_PENDING, DEFAULT_REQUEST_TIMEOUT_S)
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
+
+logger = logging.getLogger(__name__)
+
+# Model loading: "background" (start serving immediately, /ready flips when loaded),
+# "eager" (block startup until loaded) or "lazy" (load on the first detection request).
+# Set MODEL_PATH to a local save_pretrained() directory to load fully offline.
+MODEL_LOADING = os.environ.get("MODEL_LOADING", "background")
+MODEL_RETRY_AFTER_S = 5
+
+# Worker pool: blocking decode / forward work never runs on the event loop
+INFERENCE_EXECUTOR = os.environ.get("INFERENCE_EXECUTOR", "thread")  # "thread" or "process" (decode only)
+DECODE_WORKERS = int(os.environ.get("DECODE_WORKERS", DEFAULT_DECODE_WORKERS))
+INFERENCE_THREADS = int(os.environ.get("INFERENCE_THREADS", DEFAULT_INFERENCE_THREADS))
+MAX_PENDING_REQUESTS = int(os.environ.get("MAX_PENDING_REQUESTS", DEFAULT_MAX_PENDING))
+REQUEST_TIMEOUT_S = float(os.environ.get("REQUEST_TIMEOUT_S", DEFAULT_REQUEST_TIMEOUT_S))
+# Streamed request bodies stay in memory up to this size, then spill to a temp file
+SPOOL_MAX_MEMORY = int(os.environ.get("SPOOL_MAX_MEMORY", 8 * 1024 * 1024))
+
+# Request size limits (see limits.py), 0 = no cap. Bodies over the cap get 413 before they
+# are read, and decoding stops after MAX_DECODE_SECONDS, so a request holds at most its
+# body (in memory up to SPOOL_MAX_MEMORY, on disk beyond) plus MAX_DECODE_SECONDS of
+# float32 audio at the source rate while resampling.
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", DEFAULT_MAX_UPLOAD_BYTES))
+MAX_BATCH_BYTES = int(os.environ.get("MAX_BATCH_BYTES", DEFAULT_MAX_BATCH_BYTES))
+
+# Decoding: resampler quality ("fast", "hq", "vhq") and cap on decoded seconds; results
+# of longer clips carry "truncated": true and the "analyzed_seconds"
+RESAMPLE_QUALITY = os.environ.get("RESAMPLE_QUALITY", DEFAULT_RESAMPLE_QUALITY)
+MAX_DECODE_SECONDS = float(os.environ.get("MAX_DECODE_SECONDS", DEFAULT_MAX_DECODE_SECONDS)) or None
+decode_audio = functools.partial(load_audio_capped, quality=RESAMPLE_QUALITY, max_duration=MAX_DECODE_SECONDS)
+# With VAD_ENABLED the decode workers also cut the silence (see vad.py)
+decode_speech = functools.partial(vad.decode_speech, decode_audio, **VAD_OPTIONS) if VAD_OPTIONS else None
+
+# Micro-batching: concurrent requests are padded together into one forward pass
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", DEFAULT_MAX_BATCH_SIZE))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", DEFAULT_MAX_WAIT_MS))
+# Duration bucket edges in seconds ("2,4,8,16,32"): a batch is split into one pass per bucket ("" disables)
+BATCH_BUCKETS_S = tuple(float(edge) for edge in os.environ.get(
+    "BATCH_BUCKETS_S", ",".join(str(edge) for edge in DEFAULT_BUCKET_EDGES_S)).split(",") if edge.strip())
+
+# Chunked mode: long recordings are scored as overlapping windows with flat peak memory
+CHUNK_THRESHOLD_S = float(os.environ.get("CHUNK_THRESHOLD_S", chunking.DEFAULT_THRESHOLD_S))
+CHUNK_OPTIONS = {
+    "window_s": float(os.environ.get("CHUNK_WINDOW_S", chunking.DEFAULT_WINDOW_S)),
+    "hop_s": float(os.environ.get("CHUNK_HOP_S", chunking.DEFAULT_HOP_S)),
+    "batch_size": int(os.environ.get("CHUNK_BATCH_SIZE", chunking.DEFAULT_BATCH_SIZE)),
+    "aggregate": os.environ.get("CHUNK_AGGREGATE", chunking.DEFAULT_AGGREGATE),
+    "top_k": int(os.environ.get("CHUNK_TOP_K", chunking.DEFAULT_TOP_K)),
+}
+
+# Bulk endpoint: most clips accepted by one /detect/batch request
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", 64))
+
+# WebSocket streaming: rolling updates over the most recent audio; streams get their own
+# inference thread(s) and a CPU budget each, so they can't starve REST traffic
+STREAM_WINDOW_S = float(os.environ.get("STREAM_WINDOW_S", streaming.DEFAULT_WINDOW_S))
+STREAM_UPDATE_S = float(os.environ.get("STREAM_UPDATE_S", streaming.DEFAULT_UPDATE_S))
+STREAM_CPU_BUDGET = float(os.environ.get("STREAM_CPU_BUDGET", streaming.DEFAULT_CPU_BUDGET))
+STREAM_MAX_CONCURRENT = int(os.environ.get("STREAM_MAX_CONCURRENT", streaming.DEFAULT_MAX_STREAMS))
+STREAM_INFERENCE_THREADS = int(os.environ.get("STREAM_INFERENCE_THREADS", 1))
+STREAM_MAX_FRAME_BYTES = int(os.environ.get("STREAM_MAX_FRAME_BYTES", streaming.DEFAULT_MAX_FRAME_BYTES))
+
+# Result cache: identical audio (same bytes, same model) is answered without decoding
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", DEFAULT_MAX_ENTRIES))  # 0 disables
+RESULT_CACHE_TTL_S = float(os.environ.get("RESULT_CACHE_TTL_S", DEFAULT_TTL_S))
+RESULT_CACHE_DB = os.environ.get("RESULT_CACHE_DB")  # optional SQLite file, survives restarts
+RESULT_CACHE_DB_SIZE = int(os.environ.get("RESULT_CACHE_DB_SIZE", DEFAULT_MAX_DB_ENTRIES))
+
+# Job API (see jobs.py): long recordings are queued in JOB_DIR ("" disables) and scored by
+# JOB_WORKERS threads here (0: only by separate `python jobs.py` processes on the same directory)
+JOB_DIR = os.environ.get("JOB_DIR", jobs.DEFAULT_DIRECTORY)
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", jobs.DEFAULT_WORKERS))
+JOB_MAX_UPLOAD_BYTES = int(os.environ.get("JOB_MAX_UPLOAD_BYTES", jobs.DEFAULT_MAX_UPLOAD_BYTES))
+JOB_MAX_DECODE_SECONDS = float(os.environ.get("JOB_MAX_DECODE_SECONDS", jobs.DEFAULT_MAX_DECODE_SECONDS)) or None
+JOB_RETENTION_S = float(os.environ.get("JOB_RETENTION_S", jobs.DEFAULT_RETENTION_S))
+# Callbacks only go to public addresses, unless the host is listed in JOB_CALLBACK_HOSTS
+JOB_CALLBACK_HOSTS = jobs.callback_hosts_from_env()
+
+cache = (ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL_S, RESULT_CACHE_DB, RESULT_CACHE_DB_SIZE)
+         if RESULT_CACHE_SIZE > 0 else None)
+job_queue = jobs.JobQueue(JOB_DIR) if JOB_DIR else None
+job_workers = None
+
+pool = InferencePool(decode_workers=DECODE_WORKERS, inference_threads=INFERENCE_THREADS,
+                     max_pending=MAX_PENDING_REQUESTS, kind=INFERENCE_EXECUTOR)
+batcher = MicroBatcher(None, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS,
+                       bucket_edges_s=BATCH_BUCKETS_S)
+
+# Set once the model has loaded; detection endpoints answer 503 until then
+detector = None
+stream_executor = None
+stream_stats = {"active": 0, "max_concurrent": STREAM_MAX_CONCURRENT, "accepted": 0, "rejected": 0}
+model_load_lock = asyncio.Lock()
+job_model_loading = None
+
+async def load_model():
+    """Load the model off the event loop and hand it to the batcher and the job workers"""
+    global detector, job_workers
+    async with model_load_lock:
+        if detector is None:
+            loaded = await asyncio.get_running_loop().run_in_executor(None, loader.load)
+            detector = batcher.detector = loaded
+            if job_queue is not None and JOB_WORKERS > 0:
+                job_workers = jobs.JobWorkers(job_queue, detector, JOB_WORKERS, retention_s=JOB_RETENTION_S,
+                                              callback_hosts=JOB_CALLBACK_HOSTS)
+                job_workers.start()
+    return detector
+
+async def load_model_in_background():
+    """load_model() until it succeeds, backing off between failed attempts (ModelLoader.retry_in)"""
+    while True:
+        try:
+            return await load_model()
+        except Exception as e:
+            delay = loader.retry_in()
+            logger.error(f"Model failed to load (attempt {loader.failures}), /ready will report 503; "
+                         f"retrying in {delay:.1f}s: {e}")
+            await asyncio.sleep(delay)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global stream_executor
+    pool.start()
+    stream_executor = ThreadPoolExecutor(max_workers=max(1, STREAM_INFERENCE_THREADS), thread_name_prefix="stream")
+    await batcher.start(executor=pool.inference_executor)
+    loading = None
+    if MODEL_LOADING == "eager":
+        await load_model()
+    elif MODEL_LOADING == "background":
+        loading = asyncio.create_task(load_model_in_background())
+    yield
+    for task in (loading, job_model_loading):
+        if task is not None and not task.done():
+            task.cancel()
+    await batcher.stop()
+    if job_workers is not None:
+        await asyncio.get_running_loop().run_in_executor(None, job_workers.stop)
+    if job_queue is not None:
+        job_queue.close()
+    pool.shutdown()
+    if hasattr(detector, "close"):
+        detector.close()  # RemoteDetector: drop the model server connection and shared-memory arena
+    stream_executor.shutdown(wait=False, cancel_futures=True)
+    if cache is not None:
+        cache.close()
 
 app = FastAPI(
     title="AI Voice Detector API",
     description="API for distinguishing between human and AI-generated speech.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+def body_limit(path):
+    """Largest request body accepted on `path`; base64 JSON is a third larger than the audio"""
+    if path == "/detect/batch":
+        return base64_size(MAX_BATCH_BYTES) + BODY_OVERHEAD_BYTES if MAX_BATCH_BYTES else None
+    if path == "/jobs":
+        return JOB_MAX_UPLOAD_BYTES + BODY_OVERHEAD_BYTES if JOB_MAX_UPLOAD_BYTES else None
+    if not MAX_UPLOAD_BYTES:
+        return None
+    if path == "/detect":
+        return base64_size(MAX_UPLOAD_BYTES) + BODY_OVERHEAD_BYTES
+    return MAX_UPLOAD_BYTES + BODY_OVERHEAD_BYTES
+
+app.add_middleware(BodySizeLimit, limit_for=body_limit)
+
+# Scrape-time gauges of the serving queues
+metrics.Gauge("voice_pool_pending_requests", "Requests admitted to the worker pool", fn=lambda: pool.pending)
+metrics.Gauge("voice_batch_queue_depth", "Clips waiting for the micro-batcher", fn=lambda: batcher.queue_depth)
+metrics.Gauge("voice_streams_active", "Open WebSocket detection streams", fn=lambda: stream_stats["active"])
+metrics.Gauge("voice_jobs_queued", "Jobs waiting for a job worker",
+              fn=lambda: job_queue.queued() if job_queue is not None else 0)
+
+class RecordRequests:
+    """
+    ASGI middleware for request counts by route/status and the in-flight gauge. A
+    request leaves the gauge only when the app returns, i.e. after the last chunk of
+    a streamed body (NDJSON batches) has been sent or the client has gone away.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not metrics.METRICS_ENABLED:
+            return await self.app(scope, receive, send)
+        status = 500
+
+        async def recording_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        metrics.HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, recording_send)
+        finally:
+            metrics.HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            metrics.HTTP_REQUESTS.inc(method=scope["method"], route=route.path if route else "unmatched",
+                                      status=str(status))
+
+app.add_middleware(RecordRequests)
+
 # Security
 API_KEY_NAME = "X-API-Key"
 API_KEY = "hackathon-secret-key" # In production, use environment variables
@@ -26,352 +253,487 @@ async def get_api_key(api_key_header: str = Security(api_key_header)):
             status_code=403, detail="Could not validate credentials"
         )
 
+async def require_model():
+    """Detection endpoints need a loaded model; answer 503 (not a crash) while it isn't"""
+    if detector is not None:
+        return
+    if MODEL_LOADING == "lazy" and loader.retry_in() == 0:
+        try:
+            await load_model()
+            return
+        except Exception:
+            pass
+    detail = f"Model not ready ({loader.state})" + (f": {loader.error}" if loader.error else "")
+    retry_after = max(MODEL_RETRY_AFTER_S, math.ceil(loader.retry_in()))
+    raise HTTPException(status_code=503, detail=detail, headers={"Retry-After": str(retry_after)})
+
 # Input Schema
 class VoiceRequest(BaseModel):
     audio_base64: str
+    # None = decide from the clip length (CHUNK_THRESHOLD_S)
+    chunked: Optional[bool] = None
+    include_segments: bool = False
+
+class BatchVoiceRequest(BaseModel):
+    audio_base64: List[str]
 
-# --- EMBEDDED FRONTEND (To fix Cloud Deployment issues) ---
-HTML_CONTENT = """
-<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>AI Voice Detector | Premium</title>
-    <style>
-        :root {
-            --primary: #6366f1;
-            --primary-dark: #4338ca;
-            --secondary: #ec4899;
-            --bg: #0f172a;
-            --card-bg: rgba(30, 41, 59, 0.7);
-            --text: #f8fafc;
-            --text-muted: #94a3b8;
-            --success: #10b981;
-            --danger: #ef4444;
-        }
-
-        * { margin: 0; padding: 0; box-sizing: border-box; font-family: 'Inter', system-ui, -apple-system, sans-serif; }
-
-        body {
-            background-color: var(--bg);
-            background-image:
-                radial-gradient(at 0% 0%, rgba(99, 102, 241, 0.15) 0px, transparent 50%),
-                radial-gradient(at 100% 0%, rgba(236, 72, 153, 0.15) 0px, transparent 50%);
-            color: var(--text);
-            min-height: 100vh;
-            display: flex;
-            justify-content: center;
-            align-items: center;
-        }
-
-        .container { width: 100%; max-width: 500px; padding: 2rem; }
-
-        .card {
-            background: var(--card-bg);
-            backdrop-filter: blur(12px);
-            -webkit-backdrop-filter: blur(12px);
-            border: 1px solid rgba(255, 255, 255, 0.1);
-            border-radius: 24px;
-            padding: 2.5rem;
-            box-shadow: 0 25px 50px -12px rgba(0, 0, 0, 0.5);
-            text-align: center;
-        }
-
-        h1 {
-            font-size: 2rem;
-            font-weight: 700;
-            background: linear-gradient(135deg, var(--primary), var(--secondary));
-            -webkit-background-clip: text;
-            -webkit-text-fill-color: transparent;
-            margin-bottom: 0.5rem;
-        }
-
-        p.subtitle { color: var(--text-muted); margin-bottom: 2rem; font-size: 0.95rem; }
-
-        .controls { margin-bottom: 2rem; text-align: left; }
-
-        label { display: block; color: var(--text-muted); font-size: 0.85rem; margin-bottom: 0.5rem; font-weight: 500; }
-
-        select {
-            width: 100%;
-            background: rgba(15, 23, 42, 0.5);
-            border: 1px solid rgba(255, 255, 255, 0.1);
-            color: var(--text);
-            padding: 10px 14px;
-            border-radius: 8px;
-            outline: none;
-            transition: all 0.2s;
-        }
-
-        select:focus { border-color: var(--primary); box-shadow: 0 0 0 2px rgba(99, 102, 241, 0.2); }
-
-        .upload-area {
-            border: 2px dashed rgba(255, 255, 255, 0.1);
-            border-radius: 16px;
-            padding: 3rem 1rem;
-            cursor: pointer;
-            transition: all 0.3s;
-            position: relative;
-            overflow: hidden;
-        }
-
-        .upload-area:hover { border-color: var(--primary); background: rgba(99, 102, 241, 0.05); }
-
-        .upload-icon { font-size: 2.5rem; margin-bottom: 1rem; display: block; }
-
-        #fileName { font-size: 0.9rem; color: var(--text-muted); word-break: break-all; }
-
-        button.cta {
-            background: linear-gradient(135deg, var(--primary), var(--primary-dark));
-            color: white;
-            border: none;
-            padding: 14px 24px;
-            border-radius: 12px;
-            font-weight: 600;
-            font-size: 1rem;
-            width: 100%;
-            margin-top: 1.5rem;
-            cursor: pointer;
-            transition: transform 0.2s, box-shadow 0.2s;
-        }
-
-        button.cta:hover { transform: translateY(-2px); box-shadow: 0 10px 20px -10px var(--primary); }
-
-        button:disabled { opacity: 0.7; cursor: not-allowed; transform: none; }
-
-        #resultContainer {
-            margin-top: 2rem;
-            padding-top: 2rem;
-            border-top: 1px solid rgba(255, 255, 255, 0.1);
-            display: none;
-            animation: slideUp 0.4s ease-out;
-        }
-
-        @keyframes slideUp { from { opacity: 0; transform: translateY(10px); } to { opacity: 1; transform: translateY(0); } }
-
-        .result-badge { display: inline-block; padding: 6px 16px; border-radius: 20px; font-weight: 600; font-size: 0.9rem; margin-bottom: 1rem; }
-
-        .badge-real { background: rgba(16, 185, 129, 0.2); color: #34d399; border: 1px solid rgba(16, 185, 129, 0.3); }
-        .badge-fake { background: rgba(239, 68, 68, 0.2); color: #f87171; border: 1px solid rgba(239, 68, 68, 0.3); }
-
-        .meter-container {
-            background: rgba(255, 255, 255, 0.05);
-            height: 10px;
-            border-radius: 5px;
-            margin: 1.5rem 0 0.5rem 0;
-            overflow: hidden;
-            position: relative;
-        }
-
-        .meter-fill { height: 100%; border-radius: 5px; transition: width 1s cubic-bezier(0.4, 0, 0.2, 1); }
-
-        .score-info { display: flex; justify-content: space-between; font-size: 0.85rem; color: var(--text-muted); }
-
-        .explanation {
-            background: rgba(0, 0, 0, 0.2);
-            padding: 1rem;
-            border-radius: 8px;
-            margin-top: 1.5rem;
-            text-align: left;
-            font-size: 0.85rem;
-            line-height: 1.5;
-            color: #cbd5e1;
-            border-left: 3px solid var(--primary);
-        }
-
-        .loading-spinner {
-            display: none;
-            width: 24px;
-            height: 24px;
-            border: 3px solid rgba(255, 255, 255, 0.3);
-            border-radius: 50%;
-            border-top-color: white;
-            animation: spin 1s linear infinite;
-            margin: 0 auto;
-        }
-
-        @keyframes spin { to { transform: rotate(360deg); } }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="card">
-            <h1>Voice Truth</h1>
-            <p class="subtitle">Advanced AI Deepfake Detection</p>
-
-            <div class="controls">
-                <label>Language</label>
-                <select id="languageSelect">
-                    <option value="en">English (Universal)</option>
-                    <option value="hi">Hindi</option>
-                    <option value="ta">Tamil</option>
-                    <option value="te">Telugu</option>
-                    <option value="ml">Malayalam</option>
-                </select>
-            </div>
-
-            <div class="upload-area" id="dropArea" onclick="document.getElementById('fileInput').click()">
-                <div class="upload-icon">📁</div>
-                <div id="fileName">Click or Drag Audio File Here</div>
-                <input type="file" id="fileInput" accept="audio/*" style="display: none" onchange="handleFileSelect(this)">
-            </div>
-
-            <button class="cta" onclick="analyzeAudio()" id="btn">
-                <span id="btnText">Analyze Voice</span>
-                <div class="loading-spinner" id="spinner"></div>
-            </button>
-
-            <div id="resultContainer">
-                <div id="resultBadge" class="result-badge"></div>
-                <h2 id="resultTitle"></h2>
-                
-                <div class="meter-container">
-                    <div id="meterFill" class="meter-fill"></div>
-                </div>
-                <div class="score-info">
-                    <span>Confidence Score</span>
-                    <span id="scoreValue" style="color: white; font-weight: 600">0.00</span>
-                </div>
-
-                <div class="explanation" id="explanationText"></div>
-            </div>
-        </div>
-    </div>
-
-    <script>
-        function handleFileSelect(input) {
-            const file = input.files[0];
-            if (file) {
-                document.getElementById('fileName').innerText = file.name;
-                document.getElementById('fileName').style.color = 'var(--text)';
-            }
-        }
-
-        const dropArea = document.getElementById('dropArea');
-        ['dragenter', 'dragover', 'dragleave', 'drop'].forEach(eventName => {
-            dropArea.addEventListener(eventName, preventDefaults, false);
-        });
-
-        function preventDefaults(e) { e.preventDefault(); e.stopPropagation(); }
-
-        ['dragenter', 'dragover'].forEach(name => {
-            dropArea.addEventListener(name, () => dropArea.style.borderColor = 'var(--primary)', false);
-        });
-        
-        ['dragleave', 'drop'].forEach(name => {
-            dropArea.addEventListener(name, () => dropArea.style.borderColor = 'rgba(255, 255, 255, 0.1)', false);
-        });
-
-        dropArea.addEventListener('drop', handleDrop, false);
-
-        function handleDrop(e) {
-            const dt = e.dataTransfer;
-            const files = dt.files;
-            document.getElementById('fileInput').files = files;
-            handleFileSelect(document.getElementById('fileInput'));
-        }
-
-        async function analyzeAudio() {
-            const fileInput = document.getElementById('fileInput');
-            const file = fileInput.files[0];
-            
-            if (!file) {
-                const area = document.getElementById('dropArea');
-                area.style.borderColor = 'var(--danger)';
-                setTimeout(() => area.style.borderColor = 'rgba(255,255,255,0.1)', 1000);
-                return;
-            }
-
-            const btn = document.getElementById('btn');
-            const btnText = document.getElementById('btnText');
-            const spinner = document.getElementById('spinner');
-            const resultContainer = document.getElementById('resultContainer');
-            
-            btn.disabled = true;
-            btnText.style.display = 'none';
-            spinner.style.display = 'block';
-            resultContainer.style.display = 'none';
-
-            const formData = new FormData();
-            formData.append("file", file);
-
-            try {
-                const response = await fetch('/detect/audio-file', {
-                    method: 'POST',
-                    headers: { 'X-API-Key': 'hackathon-secret-key' },
-                    body: formData
-                });
-
-                const data = await response.json();
-                
-                resultContainer.style.display = 'block';
-                const isHuman = data.classification === 'HUMAN';
-                
-                const badge = document.getElementById('resultBadge');
-                badge.className = 'result-badge ' + (isHuman ? 'badge-real' : 'badge-fake');
-                badge.innerText = isHuman ? 'REAL VOICE' : 'AI GENERATED';
-
-                const title = document.getElementById('resultTitle');
-                title.innerText = isHuman ? 'Human Verified' : 'Deepfake Detected';
-
-                const scoreLayout = document.getElementById('scoreValue');
-                scoreLayout.innerText = data.confidence.toFixed(4);
-
-                const meter = document.getElementById('meterFill');
-                meter.style.width = (data.confidence * 100) + '%';
-                meter.style.backgroundColor = isHuman ? 'var(--success)' : 'var(--danger)';
-
-                document.getElementById('explanationText').innerText = data.explanation;
-
-            } catch (error) {
-                alert("An error occurred during analysis.");
-                console.error(error);
-            } finally {
-                btn.disabled = false;
-                btnText.style.display = 'block';
-                spinner.style.display = 'none';
-            }
-        }
-    </script>
-</body>
-</html>
-"""
+# Web UI: read, gzipped and hashed once; the page trims uploads to what the server analyzes
+page = StaticPage(os.path.join(STATIC_DIR, "index.html"),
+                  replacements={"__MAX_DECODE_SECONDS__": f"{MAX_DECODE_SECONDS or 0:g}"})
 
 # Endpoints
 @app.get("/")
-def read_root():
-    return HTMLResponse(content=HTML_CONTENT, status_code=200)
+def read_root(request: Request):
+    return page.response(request)
 
 @app.get("/health")
-def health_check():
-    return {"status": "active", "model": "Wav2Vec2"}
+async def health_check():
+    """Liveness: the process is up and serving, whatever the model is doing"""
+    return {"status": "active", "model": "Wav2Vec2", "model_state": loader.state}
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness: 200 only once the model is loaded and warmed up"""
+    status = loader.status()
+    return JSONResponse(content=status, status_code=200 if detector is not None else 503)
+
+def input_stats():
+    """Padding / buffer reuse of the model's input buffers (None for remote and spectral backends)"""
+    buffers = getattr(getattr(detector, "backend", None), "inputs", None)
+    return buffers.stats.snapshot() if buffers is not None else None
+
+@app.get("/stats")
+async def stats():
+    job_stats = None
+    if job_queue is not None:
+        job_stats = await asyncio.get_running_loop().run_in_executor(None, job_queue.snapshot)
+        job_stats["workers"] = job_workers.snapshot() if job_workers is not None else None
+    return {
+        "batching": batcher.stats.snapshot(batcher.queue_depth),
+        "pool": pool.snapshot(),
+        "cache": cache.snapshot() if cache is not None else None,
+        "cascade": detector.stats.snapshot() if isinstance(detector, CascadeDetector) else None,
+        "streams": dict(stream_stats),
+        "inputs": input_stats(),
+        "jobs": job_stats,
+    }
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus text exposition: stage latencies, results, request counts, queue gauges"""
+    # Off the event loop: the job gauge reads the queue's SQLite database
+    text = await asyncio.get_running_loop().run_in_executor(None, metrics.render)
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
+
+def request_timeout(x_request_timeout: Optional[float] = Header(None)):
+    """Per-request deadline in seconds, capped by the server-wide REQUEST_TIMEOUT_S"""
+    if x_request_timeout is None or x_request_timeout <= 0:
+        return REQUEST_TIMEOUT_S
+    return min(x_request_timeout, REQUEST_TIMEOUT_S)
+
+async def run_admitted(job, timeout):
+    """Run a request coroutine under admission control and a deadline"""
+    try:
+        with pool.admit():
+            return await asyncio.wait_for(job(time.time() + timeout), timeout)
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except (asyncio.TimeoutError, DeadlineExceeded):
+        pool.timed_out += 1
+        raise HTTPException(status_code=504, detail="Request deadline exceeded")
+
+async def classify_job(source, deadline, chunked=None, include_segments=False):
+    """
+    Classify a base64 string, raw bytes or an upload file object. Cached results are
+    returned without decoding; otherwise the audio is decoded in the worker pool and
+    short clips go through the micro-batcher, long ones (or chunked=True) through
+    windowed inference. Raises HTTPException / DeadlineExceeded.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        audio = source
+        if isinstance(audio, str):
+            audio, seconds = await pool.decode(metrics.timed, b64_to_bytes, audio, deadline=deadline)
+            metrics.observe_stage("base64_decode", seconds)
+        metrics.INPUT_BYTES.observe(input_size(audio))
+
+        key = None
+        if cache is not None:
+            variant = (f"chunked={chunked}|threshold_s={CHUNK_THRESHOLD_S}|segments={include_segments}"
+                       f"|{sorted(CHUNK_OPTIONS.items())}|resample={RESAMPLE_QUALITY}|max_s={MAX_DECODE_SECONDS}"
+                       f"|vad={VAD_OPTIONS}")
+            key, cached = await loop.run_in_executor(None, cached_result, audio, variant)
+            if cached is not None:
+                metrics.RESULTS.inc(classification=cached["classification"], source="cache")
+                return cached
+
+        speech = None
+        if decode_speech is not None:
+            (y, speech), seconds = await pool.decode(metrics.timed, decode_speech, audio, deadline=deadline)
+            metrics.observe_stage("vad", speech["vad_seconds"])
+            seconds -= speech["vad_seconds"]
+            truncated = speech["truncated"]
+        else:
+            (y, truncated), seconds = await pool.decode(metrics.timed, decode_audio, audio, deadline=deadline)
+        metrics.observe_stage("audio_decode", seconds)
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        logger.error(f"Error decoding audio: {e}")
+        raise HTTPException(status_code=500, detail="Invalid audio data")
+
+    input_seconds = speech["input_seconds"] if speech is not None else len(y) / SAMPLE_RATE
+    metrics.INPUT_SECONDS.observe(input_seconds)
+    # Decoding stopped at MAX_DECODE_SECONDS with more audio to go
+    cut = {"truncated": True, "analyzed_seconds": round(input_seconds, 3)} if truncated else {}
+    if speech is not None and len(y) == 0:
+        # Nothing to classify: answer before the model sees the clip
+        result = {**vad.no_speech_result(input_seconds), **cut}
+        metrics.RESULTS.inc(classification=result["classification"], source="vad")
+        if key is not None:
+            await loop.run_in_executor(None, cache.put, key, result)
+        return result
 
-@app.post("/detect", dependencies=[Depends(get_api_key)])
-async def detect_voice(request: VoiceRequest):
-    if not request.audio_base64:
-        raise HTTPException(status_code=400, detail="Missing audio_base64 field")
-    
-    result = detector.predict(request.audio_base64)
-    
+    use_chunks = chunked if chunked is not None else len(y) > CHUNK_THRESHOLD_S * SAMPLE_RATE
+    if use_chunks or include_segments:
+        predict = functools.partial(detector.predict_chunked, y, include_segments=include_segments,
+                                    **CHUNK_OPTIONS)
+        result = await loop.run_in_executor(pool.inference_executor, predict)
+    else:
+        result = await batcher.submit(y)
     if result["classification"] == "ERROR":
         raise HTTPException(status_code=500, detail=result["explanation"])
-        
+    if speech is not None:
+        result = {**result, "speech_seconds": speech["speech_seconds"]}
+    result = {**result, **cut}
+    metrics.RESULTS.inc(classification=result["classification"], source="index" if "match_id" in result else "model")
+    if key is not None:
+        await loop.run_in_executor(None, cache.put, key, result)
     return result
 
-@app.post("/detect/audio-file", dependencies=[Depends(get_api_key)])
-async def detect_voice_file(file: UploadFile = File(...)):
+def cached_result(audio, variant):
+    """Cache key of a request and its cached result or None; hashes and may query SQLite, so runs off the loop"""
+    key = cache_key(audio, detector.model_id, variant)
+    return key, cache.get(key)
+
+def check_chunking(chunked, include_segments):
+    """Segments come from windowed inference, so they can't be had with chunked=false"""
+    if chunked is False and include_segments:
+        raise HTTPException(status_code=422, detail="include_segments=true needs windowed inference, not chunked=false")
+
+async def classify(source, timeout, chunked=None, include_segments=False):
+    """classify_job() for one request, under admission control and the request deadline"""
+    check_chunking(chunked, include_segments)
+    return await run_admitted(functools.partial(classify_job, source, chunked=chunked,
+                                                include_segments=include_segments), timeout)
+
+def input_size(audio):
+    """Encoded size of bytes / buffers / seekable file objects"""
+    if hasattr(audio, "seek"):
+        size = audio.seek(0, os.SEEK_END)
+        audio.seek(0)
+        return size
+    return memoryview(audio).nbytes
+
+def decodable(fileobj):
+    """
+    What decode / hash work reads instead of the request's own file object, which is
+    closed (by FastAPI, a `with` block or form.close()) as soon as the response goes
+    out, even when a timed-out decode is still reading it in a worker: the bytes for
+    process workers (file objects can't cross a process boundary) and for a spool that
+    is still in memory, else a file on a duplicate descriptor that stays open for as
+    long as the request or a worker holds it.
+    """
+    fileobj.seek(0)
+    if pool.kind == "process" or not getattr(fileobj, "_rolled", True):
+        return fileobj.read()
+    return os.fdopen(os.dup(fileobj.fileno()), "rb")
+
+@app.post("/detect", dependencies=[Depends(get_api_key), Depends(require_model)])
+async def detect_voice(request: VoiceRequest, timeout: float = Depends(request_timeout)):
+    if not request.audio_base64:
+        raise HTTPException(status_code=400, detail="Missing audio_base64 field")
+
+    return await classify(request.audio_base64, timeout,
+                          chunked=request.chunked, include_segments=request.include_segments)
+
+@app.post("/detect/audio-file", dependencies=[Depends(get_api_key), Depends(require_model)])
+async def detect_voice_file(file: UploadFile = File(...), timeout: float = Depends(request_timeout),
+                            chunked: Optional[bool] = Query(None), include_segments: bool = Query(False)):
+    # Decode straight from the upload's spooled file: no read() into bytes, no base64 round trip
+    return await classify(decodable(file.file), timeout,
+                          chunked=chunked, include_segments=include_segments)
+
+@app.post("/detect/stream", dependencies=[Depends(get_api_key), Depends(require_model)])
+async def detect_voice_stream(request: Request, timeout: float = Depends(request_timeout),
+                              chunked: Optional[bool] = Query(None), include_segments: bool = Query(False)):
+    """Raw `application/octet-stream` body, spooled chunk by chunk instead of buffered as one bytes object"""
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY) as spool:
+        async for chunk in request.stream():
+            spool.write(chunk)
+        if spool.tell() == 0:
+            raise HTTPException(status_code=400, detail="Empty request body")
+        return await classify(decodable(spool), timeout,
+                              chunked=chunked, include_segments=include_segments)
+
+def pcm_format(content_type):
+    """(sample rate, channels) from an `audio/L16; rate=...; channels=...` content type (RFC 2586)"""
+    params = dict(part.strip().split("=", 1) for part in content_type.split(";")[1:] if "=" in part)
     try:
-        content = await file.read()
-        b64_string = base64.b64encode(content).decode('utf-8')
-        result = detector.predict(b64_string)
-        if result["classification"] == "ERROR":
-            raise HTTPException(status_code=500, detail=result["explanation"])
-        return result
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        return int(params.get("rate", SAMPLE_RATE)), int(params.get("channels", 1))
+    except ValueError:
+        raise HTTPException(status_code=415, detail=f"Bad PCM parameters in '{content_type}'")
+
+@app.post("/detect/pcm", dependencies=[Depends(get_api_key), Depends(require_model)])
+async def detect_voice_pcm(request: Request, timeout: float = Depends(request_timeout),
+                           chunked: Optional[bool] = Query(None), include_segments: bool = Query(False)):
+    """
+    Raw little-endian PCM16, mono at 16 kHz, as the web page sends it after decoding
+    and downsampling in the browser. Behind a WAV header it takes decode_audio's
+    zero-copy PCM path: no decoder library and no resampling.
+    """
+    rate, channels = pcm_format(request.headers.get("content-type", ""))
+    if (rate, channels) != (SAMPLE_RATE, 1):
+        raise HTTPException(status_code=415, detail=f"PCM must be mono at {SAMPLE_RATE} Hz, got {channels}ch at {rate} Hz")
+    body = await request.body()
+    if not body:
+        raise HTTPException(status_code=400, detail="Empty request body")
+    if len(body) % 2:
+        raise HTTPException(status_code=400, detail="PCM16 body has an odd number of bytes")
+    return await classify(wav_header(len(body)) + body, timeout, chunked=chunked, include_segments=include_segments)
+
+def batch_line(index, result, name=None):
+    line = {"index": index, **result}
+    if name is not None:
+        line["filename"] = name
+    return json.dumps(line) + "\n"
+
+async def stream_batch(sources, names, timeout, admission, chunked, include_segments, cleanup=None):
+    """
+    NDJSON lines, one per clip, in completion order. Every clip is classified
+    concurrently, so short clips meet in the micro-batcher and share forward passes.
+    A failing clip yields an ERROR line with its status code instead of failing the batch.
+    """
+    deadline = time.time() + timeout
+
+    async def run(index):
+        try:
+            result = await classify_job(sources[index], deadline, chunked=chunked, include_segments=include_segments)
+        except HTTPException as e:
+            result = {**error_result(e.detail), "status_code": e.status_code}
+        except DeadlineExceeded:
+            result = {**error_result("Request deadline exceeded"), "status_code": 504}
+        except Exception as e:
+            logger.error(f"Batch clip {index} failed: {e}")
+            result = {**error_result(e), "status_code": 500}
+        return index, result
+
+    tasks = [asyncio.create_task(run(index)) for index in range(len(sources))]
+    pending = set(range(len(sources)))
+    try:
+        for next_done in asyncio.as_completed(tasks, timeout=timeout):
+            index, result = await next_done
+            pending.discard(index)
+            yield batch_line(index, result, names[index])
+    except asyncio.TimeoutError:
+        pool.timed_out += 1
+        for index in sorted(pending):
+            yield batch_line(index, {**error_result("Request deadline exceeded"), "status_code": 504}, names[index])
+    finally:
+        for task in tasks:
+            task.cancel()
+        admission.close()
+        if cleanup is not None:
+            await cleanup()
+
+@app.post("/detect/batch", dependencies=[Depends(get_api_key), Depends(require_model)])
+async def detect_voice_batch(request: Request, timeout: float = Depends(request_timeout),
+                             chunked: Optional[bool] = Query(None), include_segments: bool = Query(False)):
+    """
+    Many clips in one request: JSON {"audio_base64": [...]} or multipart with several
+    `files`. Answers `application/x-ndjson`, one line per clip as soon as it finishes,
+    each carrying the clip's `index` (and `filename` for uploads).
+    """
+    check_chunking(chunked, include_segments)
+    cleanup = None
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        form = await request.form(max_files=BATCH_MAX_ITEMS + 1)
+        cleanup = form.close
+        uploads = [item for item in form.getlist("files") if hasattr(item, "file")]
+        sources = [decodable(upload.file) for upload in uploads]
+        names = [upload.filename for upload in uploads]
+    else:
+        try:
+            sources = BatchVoiceRequest(**await request.json()).audio_base64
+        except (ValueError, TypeError, ValidationError) as e:
+            raise HTTPException(status_code=422, detail=f"Expected {{\"audio_base64\": [...]}}: {e}")
+        names = [None] * len(sources)
+
+    # The whole batch is admitted as one request, before the response starts
+    admission = contextlib.ExitStack()
+    try:
+        if not sources:
+            raise HTTPException(status_code=400, detail="No clips in request")
+        if len(sources) > BATCH_MAX_ITEMS:
+            raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_ITEMS} clips per batch")
+        admission.enter_context(pool.admit())
+    except Overloaded as e:
+        if cleanup is not None:
+            await cleanup()
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except HTTPException:
+        if cleanup is not None:
+            await cleanup()
+        raise
+    # The slot is released when the stream ends, or after the response if it never started
+    return StreamingResponse(stream_batch(sources, names, timeout, admission, chunked, include_segments, cleanup),
+                             media_type="application/x-ndjson", background=BackgroundTask(admission.close))
+
+async def require_job_queue():
+    if job_queue is None:
+        raise HTTPException(status_code=503, detail="Job API disabled (JOB_DIR is empty)")
+
+def job_options(chunked, include_segments):
+    """The decode / chunking settings a job runs with, recorded when it is submitted"""
+    return {"chunked": chunked, "include_segments": include_segments, "chunk": CHUNK_OPTIONS,
+            "chunk_threshold_s": CHUNK_THRESHOLD_S, "resample_quality": RESAMPLE_QUALITY,
+            "max_decode_seconds": JOB_MAX_DECODE_SECONDS, "vad": VAD_OPTIONS}
+
+@app.post("/jobs", dependencies=[Depends(get_api_key), Depends(require_job_queue)])
+async def submit_job(request: Request, lane: str = Query(jobs.DEFAULT_LANE), callback_url: Optional[str] = Query(None),
+                     chunked: Optional[bool] = Query(None), include_segments: bool = Query(False)):
+    """
+    Queue a recording and answer 202 at once with the job; poll GET /jobs/{id}, or
+    pass `callback_url` to have the finished job POSTed there. The audio is a
+    multipart `file` upload or the raw request body. Workers take `interactive`
+    jobs before `normal` ones before `bulk` ones.
+    """
+    if lane not in jobs.LANES:
+        raise HTTPException(status_code=422, detail=f"Unknown lane '{lane}', expected one of {list(jobs.LANES)}")
+    check_chunking(chunked, include_segments)
+    loop = asyncio.get_running_loop()
+    if callback_url is not None:
+        try:
+            # Resolves the host name: off the event loop
+            await loop.run_in_executor(None, jobs.check_callback_url, callback_url, JOB_CALLBACK_HOSTS)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+    submit = functools.partial(job_queue.submit, lane=lane, options=job_options(chunked, include_segments),
+                               callback_url=callback_url)
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        form = await request.form(max_files=1)
+        try:
+            upload = form.get("file")
+            if not hasattr(upload, "file") or not upload.size:
+                raise HTTPException(status_code=400, detail="Missing or empty `file` upload")
+            job_id = await loop.run_in_executor(None, functools.partial(submit, upload.file, filename=upload.filename))
+        finally:
+            await form.close()
+    else:
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY) as spool:
+            async for chunk in request.stream():
+                spool.write(chunk)
+            if spool.tell() == 0:
+                raise HTTPException(status_code=400, detail="Empty request body")
+            spool.seek(0)
+            job_id = await loop.run_in_executor(None, submit, spool)
+
+    global job_model_loading
+    if job_workers is not None:
+        job_workers.wake()
+    elif MODEL_LOADING == "lazy" and JOB_WORKERS > 0 and (job_model_loading is None or job_model_loading.done()):
+        # A queued job is demand for the model: the workers start once it has loaded
+        job_model_loading = asyncio.create_task(load_model_in_background())
+    job = await loop.run_in_executor(None, job_queue.get, job_id)
+    return JSONResponse(job, status_code=202, headers={"Location": f"/jobs/{job_id}"})
+
+@app.get("/jobs/{job_id}", dependencies=[Depends(get_api_key), Depends(require_job_queue)])
+async def get_job(job_id: str):
+    """Status of a job; `result` (done) or `error` (failed) once it has finished"""
+    # SQLite calls can wait on worker transactions: never on the event loop
+    job = await asyncio.get_running_loop().run_in_executor(None, job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job
+
+@app.websocket("/detect/ws")
+async def detect_voice_ws(websocket: WebSocket, encoding: str = "pcm16", sample_rate: int = SAMPLE_RATE):
+    """
+    Streaming detection. Send binary frames (`encoding` pcm16 / f32 / opus, mono at
+    `sample_rate`); every STREAM_UPDATE_S of new audio the server scores the last
+    STREAM_WINDOW_S and pushes {"type": "update", ...}. Send the text "end" for a
+    closing {"type": "end", ...} summary. Browsers can't set headers on WebSockets,
+    so the API key may also come as the `api_key` query parameter.
+    """
+    await websocket.accept()
+    api_key = websocket.headers.get(API_KEY_NAME) or websocket.query_params.get("api_key")
+    if api_key != API_KEY:
+        await websocket.close(code=1008, reason="Could not validate credentials")
+        return
+    if detector is None:
+        await websocket.close(code=1013, reason=f"Model not ready ({loader.state})")
+        return
+    if stream_stats["active"] >= STREAM_MAX_CONCURRENT:
+        stream_stats["rejected"] += 1
+        await websocket.close(code=1013, reason="Too many concurrent streams, retry later")
+        return
+    try:
+        decoder = FrameDecoder(encoding, sample_rate, RESAMPLE_QUALITY)
+    except ValueError as e:
+        await websocket.close(code=1003, reason=str(e))
+        return
+
+    stream_stats["active"] += 1
+    stream_stats["accepted"] += 1
+    session = StreamSession(STREAM_WINDOW_S, STREAM_UPDATE_S, STREAM_CPU_BUDGET)
+    loop = asyncio.get_running_loop()
+
+    async def update(position, window):
+        seconds = 0.0
+        try:
+            (fake_prob,), seconds = await loop.run_in_executor(
+                stream_executor, metrics.timed, detector.fake_probabilities, [window])
+        finally:
+            session.finish(seconds)
+        await websocket.send_json({
+            "type": "update",
+            "t": round(position / SAMPLE_RATE, 3),
+            "window_s": round(len(window) / SAMPLE_RATE, 3),
+            "fake_probability": round(fake_prob, 4),
+            "classification": "AI_GENERATED" if fake_prob >= 0.5 else "HUMAN",
+            "confidence": round(max(fake_prob, 1.0 - fake_prob), 4),
+            "inference_ms": round(1000 * seconds, 2),
+        })
+
+    task = None
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes") is not None:
+                frame = message["bytes"]
+                if len(frame) > STREAM_MAX_FRAME_BYTES:
+                    await websocket.close(code=1009, reason=f"Frames are limited to {STREAM_MAX_FRAME_BYTES} bytes")
+                    break
+                try:
+                    session.push(decoder.decode(frame))
+                except Exception as e:
+                    await websocket.close(code=1003, reason=f"Invalid audio frame: {e}")
+                    break
+                if session.due():
+                    task = asyncio.create_task(update(*session.start()))
+            elif (message.get("text") or "").strip() == "end":
+                if task is not None:
+                    await task
+                await websocket.send_json({"type": "end", **session.summary()})
+                await websocket.close()
+                break
+    finally:
+        stream_stats["active"] -= 1
+        if task is not None and not task.done():
+            task.cancel()
 
 if __name__ == "__main__":
-    import os
     port = int(os.environ.get("PORT", 7860))
     uvicorn.run("app:app", host="0.0.0.0", port=port, reload=False)
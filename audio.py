@@ -0,0 +1,229 @@
+import base64
+import io
+import logging
+import struct
+
+import librosa
+import numpy as np
+import soundfile as sf
+
+logger = logging.getLogger(__name__)
+
+# Constants
+SAMPLE_RATE = 16000
+
+# Resampler quality presets (all soxr polyphase filters): "hq" is librosa's default,
+# "fast" trades a little stopband attenuation for speed, "vhq" is the reference
+RESAMPLE_QUALITIES = {"fast": "soxr_lq", "hq": "soxr_hq", "vhq": "soxr_vhq"}
+DEFAULT_RESAMPLE_QUALITY = "hq"
+
+# WAV format tags understood by the direct PCM parser
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# load_audio_capped() decodes this far past its cap to tell whether the audio goes on
+TRUNCATION_PROBE_S = 0.1
+
+
+class BufferReader(io.RawIOBase):
+    """
+    Read-only, seekable file object over any buffer (bytes, bytearray, memoryview, mmap).
+    Unlike io.BytesIO it never copies the underlying data: readinto() copies
+    straight from the caller's buffer into the decoder's buffer.
+    """
+
+    def __init__(self, buffer):
+        super().__init__()
+        self._view = memoryview(buffer).cast("B")
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        target = memoryview(b).cast("B")
+        n = min(len(target), len(self._view) - self._pos)
+        if n <= 0:
+            return 0
+        target[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = len(self._view) + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        self._pos = max(0, pos)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def close(self):
+        self._view.release()
+        super().close()
+
+
+def b64_to_bytes(base64_string):
+    """Raw audio bytes from a base64 string (optionally a data: URI)"""
+    if "," in base64_string:
+        base64_string = base64_string.split(",")[1]
+    return base64.b64decode(base64_string)
+
+
+def decode_base64(base64_string, sr=SAMPLE_RATE):
+    """Decode base64 string (optionally a data: URI) to audio time series"""
+    return load_audio(b64_to_bytes(base64_string), sr=sr)
+
+
+def sniff_format(header):
+    """Container format from the first bytes of a file"""
+    header = bytes(header[:12])
+    if header[:4] == b"RIFF" and header[8:12] == b"WAVE":
+        return "wav"
+    if header[:4] == b"fLaC":
+        return "flac"
+    if header[:4] == b"OggS":
+        return "ogg"
+    if header[:3] == b"ID3" or (len(header) > 1 and header[0] == 0xFF and header[1] & 0xE0 == 0xE0):
+        return "mp3"
+    return "unknown"
+
+
+def parse_wav_pcm(buffer, max_duration=None):
+    """
+    Parse an uncompressed PCM16 / float32 WAV held in memory without any decoder library.
+    Returns (mono float32 waveform, sample rate) or None if the WAV uses another encoding.
+    """
+    view = memoryview(buffer).cast("B")
+    fmt = None
+    pos = 12
+    while pos + 8 <= len(view):
+        chunk_id = bytes(view[pos:pos + 4])
+        chunk_size = struct.unpack_from("<I", view, pos + 4)[0]
+        body = pos + 8
+        if chunk_id == b"fmt ":
+            tag, channels, rate, _, _, bits = struct.unpack_from("<HHIIHH", view, body)
+            if tag == WAVE_FORMAT_EXTENSIBLE and chunk_size >= 40:
+                # The real format tag is the first two bytes of the SubFormat GUID
+                tag = struct.unpack_from("<H", view, body + 24)[0]
+            fmt = (tag, channels, rate, bits)
+        elif chunk_id == b"data" and fmt is not None:
+            tag, channels, rate, bits = fmt
+            if (tag, bits) == (WAVE_FORMAT_PCM, 16):
+                dtype, scale = np.dtype("<i2"), 1.0 / 32768.0
+            elif (tag, bits) == (WAVE_FORMAT_IEEE_FLOAT, 32):
+                dtype, scale = np.dtype("<f4"), None
+            else:
+                return None
+            # Streams written before their size is known can claim more data than exists
+            n_frames = min(chunk_size, len(view) - body) // (dtype.itemsize * channels)
+            if max_duration is not None:
+                n_frames = min(n_frames, int(max_duration * rate))
+            samples = np.frombuffer(view, dtype=dtype, count=n_frames * channels, offset=body)
+            samples = samples.reshape(-1, channels)
+            y = samples.mean(axis=1, dtype=np.float32) if channels > 1 else samples[:, 0].astype(np.float32)
+            if scale is not None:
+                y *= scale
+            return y, rate
+        pos = body + chunk_size + (chunk_size & 1)  # chunks are word aligned
+    return None
+
+
+def wav_header(n_bytes, sr=SAMPLE_RATE, channels=1, bits=16):
+    """44-byte RIFF/WAVE header for `n_bytes` of interleaved integer PCM"""
+    block = channels * bits // 8
+    return struct.pack("<4sI4s4sIHHIIHH4sI", b"RIFF", 36 + n_bytes, b"WAVE", b"fmt ", 16, WAVE_FORMAT_PCM,
+                       channels, sr, sr * block, block, bits, b"data", n_bytes)
+
+
+def resample(y, orig_sr, sr=SAMPLE_RATE, quality=DEFAULT_RESAMPLE_QUALITY):
+    """Resample a mono waveform; a no-op when the rates already match"""
+    if quality not in RESAMPLE_QUALITIES:
+        raise ValueError(f"Unknown resample quality '{quality}', expected one of {tuple(RESAMPLE_QUALITIES)}")
+    if orig_sr == sr:
+        return y
+    return librosa.resample(y, orig_sr=orig_sr, target_sr=sr, res_type=RESAMPLE_QUALITIES[quality])
+
+
+def _read_soundfile(source, max_duration=None):
+    """libsndfile decode (WAV/FLAC/OGG, and MP3 on libsndfile >= 1.1)"""
+    with sf.SoundFile(source) as f:
+        frames = -1 if max_duration is None else int(max_duration * f.samplerate)
+        data = f.read(frames=frames, dtype="float32", always_2d=True)
+        rate = f.samplerate
+    y = data.mean(axis=1, dtype=np.float32) if data.shape[1] > 1 else data[:, 0]
+    return y, rate
+
+
+def decode_audio(source, sr=SAMPLE_RATE, quality=DEFAULT_RESAMPLE_QUALITY, max_duration=None):
+    """
+    Decode to a mono float32 waveform at `sr` with the cheapest decoder that handles the input.
+    Returns (waveform, decoder name) where the decoder is one of:
+      * "pcm"        - in-memory PCM16/float32 WAV parsed directly (zero-copy read)
+      * "soundfile"  - libsndfile
+      * "librosa"    - audioread/ffmpeg fallback for anything libsndfile can't open
+    `max_duration` (seconds) stops decoding after the first N seconds.
+    """
+    is_file = hasattr(source, "read")
+    if is_file:
+        header = source.read(12)
+        source.seek(0)
+    else:
+        header = memoryview(source).cast("B")[:12]
+
+    if not is_file and sniff_format(header) == "wav":
+        parsed = parse_wav_pcm(source, max_duration=max_duration)
+        if parsed is not None:
+            y, rate = parsed
+            return resample(y, rate, sr, quality), "pcm"
+
+    reader = source if is_file else BufferReader(source)
+    try:
+        y, rate = _read_soundfile(reader, max_duration=max_duration)
+        return resample(y, rate, sr, quality), "soundfile"
+    except Exception as e:
+        logger.debug(f"soundfile could not decode input ({e}), falling back to librosa")
+    finally:
+        if not is_file:
+            reader.close()
+
+    if is_file:
+        source.seek(0)
+        y, rate = librosa.load(source, sr=None, mono=True, duration=max_duration)
+    else:
+        with BufferReader(source) as reader:
+            y, rate = librosa.load(reader, sr=None, mono=True, duration=max_duration)
+    return resample(y, rate, sr, quality), "librosa"
+
+
+def load_audio(source, sr=SAMPLE_RATE, quality=DEFAULT_RESAMPLE_QUALITY, max_duration=None):
+    """
+    Decode an encoded audio file to a mono float32 waveform at `sr`.
+    `source` may be any buffer (bytes, bytearray, memoryview) or a readable,
+    seekable binary file object such as an upload's spooled temp file.
+    """
+    y, _ = decode_audio(source, sr=sr, quality=quality, max_duration=max_duration)
+    return y
+
+
+def load_audio_capped(source, sr=SAMPLE_RATE, quality=DEFAULT_RESAMPLE_QUALITY, max_duration=None):
+    """
+    load_audio() for at most `max_duration` seconds (None = all of it).
+    Returns (waveform, truncated): whether the audio went on past the cap.
+    """
+    if max_duration is None:
+        return load_audio(source, sr, quality), False
+    y = load_audio(source, sr, quality, max_duration + TRUNCATION_PROBE_S)
+    cap = int(max_duration * sr)
+    # One sample of slack: resampling a clip exactly at the cap can round up
+    return y[:cap], len(y) > cap + 1
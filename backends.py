@@ -0,0 +1,216 @@
+import contextlib
+import json
+import logging
+import os
+
+import numpy as np
+import torch
+
+from audio import SAMPLE_RATE
+from features import SpectralFrontEnd, tile_pad
+from input_buffers import InputBuffers
+from metrics import stage
+from model import DualPathDetector
+from profiles import DEFAULT_PROFILE, apply_profile, forward_context
+
+logger = logging.getLogger(__name__)
+
+# Files of an exported artifact directory (written by export_model.py)
+ONNX_FILE = "model.onnx"
+TORCHSCRIPT_FILE = "model.pt"
+LABELS_FILE = "labels.json"
+PREPROCESSOR_FILE = "preprocessor.json"
+EXPORT_FILE = "export.json"
+STATE_DICT_FILE = "state_dict.pt"  # eager weights of in-repo models (DualPathDA)
+FRONTEND_FILE = "frontend.json"    # SpectralFrontEnd config of feature-input models
+
+
+def read_json(directory, name):
+    with open(os.path.join(directory, name)) as f:
+        return json.load(f)
+
+
+def write_json(directory, name, data):
+    with open(os.path.join(directory, name), "w") as f:
+        json.dump(data, f, indent=2)
+
+
+def load_id2label(directory):
+    """Label map of an exported artifact; JSON turns the integer ids into strings"""
+    return {int(idx): label for idx, label in read_json(directory, LABELS_FILE)["id2label"].items()}
+
+
+class WaveformPreprocessor:
+    """
+    Settings of Wav2Vec2FeatureExtractor (zero-mean/unit-variance per clip, right
+    padding, attention mask), applied by input_buffers.InputBuffers so exported
+    backends never import transformers.
+    """
+
+    def __init__(self, sampling_rate=SAMPLE_RATE, do_normalize=True, padding_value=0.0):
+        self.sampling_rate = sampling_rate
+        self.do_normalize = do_normalize
+        self.padding_value = padding_value
+
+    @classmethod
+    def from_feature_extractor(cls, feature_extractor):
+        return cls(feature_extractor.sampling_rate, feature_extractor.do_normalize,
+                   feature_extractor.padding_value)
+
+    def to_dict(self):
+        return {"sampling_rate": self.sampling_rate, "do_normalize": self.do_normalize,
+                "padding_value": self.padding_value}
+
+    def buffers(self, device=None, **options):
+        """
+        input_buffers.InputBuffers producing this preprocessor's inputs in reused memory;
+        int64 masks unless `options` say otherwise, as the exported graphs were traced with them
+        """
+        options.setdefault("mask_dtype", torch.long)
+        return InputBuffers(self.do_normalize, self.padding_value, device, **options)
+
+    def __call__(self, waveforms):
+        """Returns (input_values float32 [batch, time], attention_mask int64 [batch, time])"""
+        with self.buffers().batch(waveforms) as inputs:
+            return inputs["input_values"].numpy().copy(), inputs["attention_mask"].numpy().copy()
+
+
+def load_input_pipeline(directory):
+    """
+    (prepare, InputBuffers or None) for an exported artifact. `prepare(waveforms)` is a
+    context manager giving the graph inputs as CPU tensors, in the graph's input order:
+    (input_values, attention_mask) for transformer exports, built in reused buffers,
+    or DualPathDA's spectral features computed by the torch front end.
+    """
+    export = read_json(directory, EXPORT_FILE)
+    if export["input"] == "waveform":
+        buffers = WaveformPreprocessor(**read_json(directory, PREPROCESSOR_FILE)).buffers()
+        return buffers.batch, buffers
+
+    front_end = SpectralFrontEnd(**read_json(directory, FRONTEND_FILE)).eval()
+
+    def prepare(waveforms):
+        with stage("feature_extraction"), torch.inference_mode():
+            features = front_end(torch.from_numpy(tile_pad(waveforms)))
+        return contextlib.nullcontext({"features": features})
+    return prepare, None
+
+
+class TransformersBackend:
+    """Eager AutoModelForAudioClassification, the reference implementation"""
+
+    name = "transformers"
+
+    @staticmethod
+    def import_runtime():
+        import transformers  # noqa: F401
+
+    def __init__(self, source, device, profile=DEFAULT_PROFILE, **options):
+        from transformers import AutoModelForAudioClassification, AutoFeatureExtractor
+        self.device = device
+        self.profile = profile
+        self.model = AutoModelForAudioClassification.from_pretrained(source, **options).to(device)
+        self.model = apply_profile(self.model, profile)
+        self.feature_extractor = AutoFeatureExtractor.from_pretrained(source, **options)
+        # The feature extractor's normalization and padding, done in reused buffers; the eager
+        # model only sums the mask, so it is int32 rather than the extractor's int64
+        self.inputs = WaveformPreprocessor.from_feature_extractor(self.feature_extractor).buffers(
+            device, mask_dtype=torch.int32)
+        self.id2label = {int(idx): label for idx, label in self.model.config.id2label.items()}
+
+    @contextlib.contextmanager
+    def prepare(self, waveforms):
+        """Normalized, right-padded inputs + attention mask on the model's device, valid inside the with-block"""
+        with self.inputs.batch(waveforms) as inputs:
+            yield {key: val.to(self.device, non_blocking=True) for key, val in inputs.items()}
+
+    def logits(self, waveforms):
+        # The model expects input values, not raw LFCC/MFCC tensors we made manually before.
+        # Padding + attention mask lets clips of different lengths share a single forward pass.
+        with self.prepare(waveforms) as inputs, stage("forward"), forward_context(self.profile, self.device.type):
+            return self.model(**inputs).logits.float().cpu()
+
+
+class TorchScriptBackend:
+    """Traced module from export_model.py --format torchscript"""
+
+    name = "torchscript"
+
+    @staticmethod
+    def import_runtime():
+        pass  # torch is already loaded
+
+    def __init__(self, source, device, profile=DEFAULT_PROFILE, **options):
+        self.device = device
+        self.profile = profile
+        self.module = torch.jit.load(os.path.join(source, TORCHSCRIPT_FILE), map_location=device)
+        self.module.eval()
+        self.prepare, self.inputs = load_input_pipeline(source)
+        self.id2label = load_id2label(source)
+
+    def logits(self, waveforms):
+        with self.prepare(waveforms) as inputs, stage("forward"), forward_context(self.profile, self.device.type):
+            return self.module(*[value.to(self.device) for value in inputs.values()]).float().cpu()
+
+
+class OnnxBackend:
+    """ONNX Runtime CPU session with all graph optimizations enabled"""
+
+    name = "onnx"
+
+    @staticmethod
+    def import_runtime():
+        import onnxruntime  # noqa: F401
+
+    def __init__(self, source, device, profile=DEFAULT_PROFILE, intra_op_threads=0, **options):
+        import onnxruntime as ort
+        if profile != DEFAULT_PROFILE:
+            logger.warning(f"Execution profile '{profile}' is ignored by the ONNX backend; "
+                           "quantize the graph at export time instead")
+        session_options = ort.SessionOptions()
+        session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            session_options.intra_op_num_threads = int(intra_op_threads)
+        self.session = ort.InferenceSession(
+            os.path.join(source, ONNX_FILE), sess_options=session_options, providers=["CPUExecutionProvider"]
+        )
+        self.prepare, self.inputs = load_input_pipeline(source)
+        self.id2label = load_id2label(source)
+
+    def logits(self, waveforms):
+        with self.prepare(waveforms) as inputs, stage("forward"):
+            (logits,) = self.session.run(["logits"], {name: value.numpy() for name, value in inputs.items()})
+        return torch.from_numpy(logits)
+
+
+class DualPathBackend:
+    """Eager in-repo DualPathDetector (spectral front end + DualPathDA), the low-latency tier"""
+
+    name = "dualpath"
+
+    @staticmethod
+    def import_runtime():
+        pass  # torch is already loaded
+
+    def __init__(self, source, device, profile=DEFAULT_PROFILE, **options):
+        self.device = device
+        self.profile = profile
+        self.id2label = load_id2label(source)
+        model = DualPathDetector(SpectralFrontEnd(**read_json(source, FRONTEND_FILE)), num_classes=len(self.id2label))
+        model.classifier.load_state_dict(torch.load(os.path.join(source, STATE_DICT_FILE), map_location="cpu"))
+        self.model = apply_profile(model.to(device), profile)
+
+    def logits(self, waveforms):
+        with stage("feature_extraction"), forward_context(self.profile, self.device.type):
+            features = self.model.front_end(torch.from_numpy(tile_pad(waveforms)).to(self.device))
+        with stage("forward"), forward_context(self.profile, self.device.type):
+            return self.model.classifier(features).float().cpu()
+
+
+BACKENDS = {cls.name: cls for cls in (TransformersBackend, TorchScriptBackend, OnnxBackend, DualPathBackend)}
+
+
+def get_backend(name):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown model backend '{name}', expected one of {tuple(BACKENDS)}")
+    return BACKENDS[name]
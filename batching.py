@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+from inference import error_result
+from input_buffers import DEFAULT_BUCKET_EDGES_S, bucket_groups
+
+logger = logging.getLogger(__name__)
+
+# Defaults (overridable through environment variables in app.py)
+DEFAULT_MAX_BATCH_SIZE = 16
+DEFAULT_MAX_WAIT_MS = 10.0
+
+# Upper bounds of the batch size histogram buckets
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+# Number of recent wait times kept for percentile reporting
+WAIT_SAMPLES = 1024
+
+
+class BatcherStats:
+    """Counters used to tune the micro-batching scheduler"""
+
+    def __init__(self):
+        self.requests = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self.batch_size_histogram = {bucket: 0 for bucket in BATCH_SIZE_BUCKETS}
+        self.batch_size_overflow = 0
+        self.wait_ms = deque(maxlen=WAIT_SAMPLES)
+        self.total_wait_ms = 0.0
+        self.forward_passes = 0
+        self.valid_samples = 0
+        self.padded_samples = 0
+
+    def record_groups(self, groups):
+        """Forward passes of one batch, as lists of clip lengths in samples"""
+        for lengths in groups:
+            self.forward_passes += 1
+            self.valid_samples += sum(lengths)
+            self.padded_samples += len(lengths) * max(lengths) - sum(lengths)
+
+    def record_batch(self, size, waits_ms):
+        self.batches += 1
+        self.requests += size
+        for bucket in BATCH_SIZE_BUCKETS:
+            if size <= bucket:
+                self.batch_size_histogram[bucket] += 1
+                break
+        else:
+            self.batch_size_overflow += 1
+        self.wait_ms.extend(waits_ms)
+        self.total_wait_ms += sum(waits_ms)
+
+    def snapshot(self, queue_depth):
+        waits = sorted(self.wait_ms)
+
+        def percentile(p):
+            if not waits:
+                return 0.0
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))], 3)
+
+        histogram = {f"<={bucket}": count for bucket, count in self.batch_size_histogram.items()}
+        histogram[f">{BATCH_SIZE_BUCKETS[-1]}"] = self.batch_size_overflow
+        samples = self.valid_samples + self.padded_samples
+        return {
+            "queue_depth": queue_depth,
+            "requests": self.requests,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "mean_batch_size": round(self.requests / self.batches, 3) if self.batches else 0.0,
+            "batch_size_histogram": histogram,
+            "forward_passes": self.forward_passes,
+            "padding_ratio": round(self.padded_samples / samples, 4) if samples else 0.0,
+            "wait_ms": {
+                "mean": round(self.total_wait_ms / self.requests, 3) if self.requests else 0.0,
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "p99": percentile(0.99),
+            },
+        }
+
+
+class MicroBatcher:
+    """
+    Gathers concurrent requests into one padded forward pass.
+    A batch is dispatched as soon as `max_batch_size` clips are queued or the
+    oldest queued clip has waited `max_wait_ms`, whichever happens first.
+    A batch mixing durations is split by `bucket_edges_s` (seconds) into one
+    forward pass per duration bucket, so a 1 s clip is not padded to the length
+    of a 30 s one; the passes run concurrently on the executor. No edges: one
+    pass per batch.
+    """
+
+    def __init__(self, detector, max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+                 max_wait_ms=DEFAULT_MAX_WAIT_MS, executor=None, bucket_edges_s=DEFAULT_BUCKET_EDGES_S):
+        self.detector = detector
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.bucket_edges_s = tuple(bucket_edges_s)
+        self.executor = executor
+        self.stats = BatcherStats()
+        self._queue = None
+        # Set by submit(); the collector waits on it rather than on queue.get(), which
+        # wait_for() can cancel after it has already taken an item (Python < 3.12)
+        self._arrived = None
+        # Items taken off the queue and not answered yet, for stop() to fail
+        self._batch = []
+        self._task = None
+
+    async def start(self, executor=None):
+        if self._task is not None:
+            return
+        if executor is not None:
+            self.executor = executor
+        self._queue = asyncio.Queue()
+        self._arrived = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Micro-batcher started (max_batch_size={self.max_batch_size}, "
+                    f"max_wait_ms={self.max_wait * 1000:.1f}, buckets_s={list(self.bucket_edges_s)})")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        # Fail the batch being collected or run and whatever is still queued, so callers don't hang forever
+        pending = self._batch
+        self._batch = []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for _, future, _ in pending:
+            if not future.done():
+                future.set_result(error_result("Server is shutting down"))
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def submit(self, waveform):
+        """Queue one decoded waveform and wait for its own result"""
+        if self._task is None:
+            raise RuntimeError("MicroBatcher.start() has not been called")
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((waveform, future, time.perf_counter()))
+        self._arrived.set()
+        return await future
+
+    async def _wait_for_item(self, timeout=None):
+        """True once the queue holds an item, False if `timeout` seconds pass first; never dequeues"""
+        while self._queue.empty():
+            self._arrived.clear()
+            try:
+                await asyncio.wait_for(self._arrived.wait(), timeout)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    async def _collect(self):
+        """Wait for the first item, then top the batch up until it is full or the deadline passes"""
+        await self._wait_for_item()
+        batch = self._batch = [self._queue.get_nowait()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if self._queue.empty() and (timeout <= 0 or not await self._wait_for_item(timeout)):
+                break
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # Callers that gave up (client disconnect / timeout) don't need a forward pass
+            batch = self._batch = [item for item in batch if not item[1].done()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            waits_ms = [(started - enqueued) * 1000.0 for _, _, enqueued in batch]
+            waveforms = [waveform for waveform, _, _ in batch]
+            groups = bucket_groups([len(y) for y in waveforms], self.bucket_edges_s)
+            outcomes = await asyncio.gather(*(
+                loop.run_in_executor(self.executor, self.detector.predict_waveforms, [waveforms[i] for i in group])
+                for group in groups
+            ), return_exceptions=True)
+            results = [None] * len(batch)
+            for group, outcome in zip(groups, outcomes):
+                if isinstance(outcome, Exception):
+                    logger.error(f"Batched prediction failed: {outcome}")
+                    self.stats.failed_batches += 1
+                    outcome = [error_result(outcome)] * len(group)
+                for i, result in zip(group, outcome):
+                    results[i] = result
+
+            self.stats.record_batch(len(batch), waits_ms)
+            self.stats.record_groups([[len(waveforms[i]) for i in group] for group in groups])
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+            self._batch = []
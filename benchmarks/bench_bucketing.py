@@ -0,0 +1,139 @@
+"""
+Throughput of mixed-length batches: one padded pass vs duration buckets + reused input buffers.
+
+    python benchmarks/bench_bucketing.py [--model-path DIR] [--clips 64] [--batch-size 16]
+                                         [--min-seconds 0.5] [--max-seconds 20] [--repeat 3] [--out results.json]
+
+The workload is `--clips` random-noise clips with log-uniform durations (most short,
+a few long, as uploads are), cut into batches of `--batch-size` in arrival order, as
+the micro-batcher would see them under load. Each batch is scored three ways:
+
+  padded    Wav2Vec2FeatureExtractor(padding=True) on the whole batch, one forward pass
+            (the serving path before input_buffers.py)
+  buffers   the backend's InputBuffers on the whole batch, one forward pass
+  bucketed  the batch split with bucket_groups() (what MicroBatcher does), one
+            InputBuffers-fed pass per duration bucket
+
+The report has the padding ratio (padded / total samples fed to the model), the
+buffer allocations, input preparation time alone, and end-to-end clips/s with the
+speedup over `padded`. Without --model-path the tiny random stand-in from
+benchmarks/tiny_model.py is used (compare runs of the same model).
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from audio import SAMPLE_RATE  # noqa: E402
+from inference import VoiceDetector  # noqa: E402
+from input_buffers import DEFAULT_BUCKET_EDGES_S, InputBuffers, bucket_groups  # noqa: E402
+from profiles import forward_context  # noqa: E402
+from bench_micro import environment, measure  # noqa: E402
+from tiny_model import ensure_tiny_model  # noqa: E402
+
+
+def make_workload(clips, min_seconds, max_seconds, seed=0):
+    rng = np.random.default_rng(seed)
+    seconds = np.exp(rng.uniform(np.log(min_seconds), np.log(max_seconds), clips))
+    return [(0.1 * rng.standard_normal(int(s * SAMPLE_RATE))).astype(np.float32) for s in seconds]
+
+
+def padding_ratio(groups):
+    """Padded share of the samples fed to the model for lists of clip lengths, one per pass"""
+    valid = sum(sum(lengths) for lengths in groups)
+    total = sum(len(lengths) * max(lengths) for lengths in groups)
+    return round(1 - valid / total, 4)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model-path", default=None, help="Local model directory (default: tiny random model)")
+    parser.add_argument("--clips", type=int, default=64)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--min-seconds", type=float, default=0.5)
+    parser.add_argument("--max-seconds", type=float, default=20.0)
+    parser.add_argument("--buckets", type=float, nargs="*", default=list(DEFAULT_BUCKET_EDGES_S),
+                        help="Bucket edges in seconds")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", default=None, help="Also write the JSON here")
+    args = parser.parse_args()
+
+    model_path = args.model_path or ensure_tiny_model()
+    detector = VoiceDetector(model_path=model_path, backend="transformers")
+    backend = detector.backend
+    extractor = backend.feature_extractor
+    waveforms = make_workload(args.clips, args.min_seconds, args.max_seconds)
+    batches = [waveforms[start:start + args.batch_size] for start in range(0, len(waveforms), args.batch_size)]
+    split = [[[batch[i] for i in group] for group in bucket_groups([len(y) for y in batch], args.buckets)]
+             for batch in batches]
+
+    def forward(inputs):
+        with forward_context(detector.profile, detector.device.type):
+            return backend.model(**inputs).logits
+
+    def padded_prepare():
+        for batch in batches:
+            extractor(batch, sampling_rate=SAMPLE_RATE, return_tensors="pt", padding=True, return_attention_mask=True)
+
+    def padded():
+        for batch in batches:
+            forward(extractor(batch, sampling_rate=SAMPLE_RATE, return_tensors="pt", padding=True,
+                              return_attention_mask=True))
+
+    def buffered(buffers, passes):
+        def prepare():
+            for group in passes:
+                with buffers.batch(group):
+                    pass
+
+        def run():
+            for group in passes:
+                with buffers.batch(group) as inputs:
+                    forward(inputs)
+        return prepare, run
+
+    modes = {"padded": (padded_prepare, padded, [[len(y) for y in batch] for batch in batches], None)}
+    for name, passes in (("buffers", batches), ("bucketed", [group for groups in split for group in groups])):
+        buffers = InputBuffers(extractor.do_normalize, extractor.padding_value, edges_s=args.buckets)
+        prepare, run = buffered(buffers, passes)
+        modes[name] = (prepare, run, [[len(y) for y in group] for group in passes], buffers)
+
+    with torch.inference_mode():
+        results = {}
+        for name, (prepare, run, groups, buffers) in modes.items():
+            prepare_ms = measure(prepare, args.repeat)
+            run_ms = measure(run, args.repeat)
+            results[name] = {
+                "forward_passes": len(groups),
+                "padding_ratio": padding_ratio(groups),
+                "prepare": prepare_ms,
+                "total": run_ms,
+                "clips_per_s": round(1000 * len(waveforms) / run_ms["median_ms"], 2),
+            }
+            if buffers is not None:
+                results[name]["buffers"] = buffers.stats.snapshot()
+    for entry in results.values():
+        entry["speedup"] = round(results["padded"]["total"]["median_ms"] / entry["total"]["median_ms"], 2)
+
+    report = {
+        "benchmark": "bucketing",
+        "model": detector.model_id,
+        "environment": environment(),
+        "workload": {"clips": len(waveforms), "batch_size": args.batch_size,
+                     "audio_seconds": round(sum(len(y) for y in waveforms) / SAMPLE_RATE, 1),
+                     "buckets_s": args.buckets},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
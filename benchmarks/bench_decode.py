@@ -0,0 +1,102 @@
+"""
+Decode + resample throughput and accuracy drift of audio.decode_audio vs. the old librosa path.
+
+    python benchmarks/bench_decode.py [--seconds 30] [--repeat 3] [--max-duration N]
+
+Inputs are the bundled freesound MP3 plus synthetic WAVs at common rates.
+The baseline is the original `librosa.load(io.BytesIO(...), sr=16000)`; drift
+is reported as max absolute difference and SNR (dB) against that baseline.
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+
+import librosa
+import numpy as np
+import soundfile as sf
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, ROOT)
+from audio import SAMPLE_RATE, RESAMPLE_QUALITIES, decode_audio  # noqa: E402
+
+BUNDLED_MP3 = os.path.join(ROOT, "freesound_community-shortfilm-voice-56795.mp3")
+SYNTHETIC = [(8000, 1), (16000, 1), (22050, 1), (44100, 1), (48000, 1), (48000, 2)]
+
+
+def synthetic_wav(rate, channels, seconds):
+    """Speech-band chirp plus noise, written as PCM16 WAV"""
+    t = np.arange(int(rate * seconds)) / rate
+    rng = np.random.default_rng(rate)
+    y = 0.3 * np.sin(2 * np.pi * (100 + 1500 * t / seconds) * t) + 0.02 * rng.standard_normal(len(t))
+    data = np.stack([y] * channels, axis=1) if channels > 1 else y
+    buf = io.BytesIO()
+    sf.write(buf, data.astype(np.float32), rate, subtype="PCM_16", format="WAV")
+    return buf.getvalue()
+
+
+def timed(fn, repeat):
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, out
+
+
+def drift(y, reference):
+    n = min(len(y), len(reference))
+    err = y[:n] - reference[:n]
+    noise = float(np.sum(err ** 2))
+    snr = float("inf") if noise == 0 else 10 * np.log10(float(np.sum(reference[:n] ** 2)) / noise)
+    return {"max_abs": round(float(np.abs(err).max()), 6), "snr_db": round(snr, 2) if snr != float("inf") else "inf"}
+
+
+def bench(name, content, repeat, max_duration):
+    base_s, reference = timed(
+        lambda: librosa.load(io.BytesIO(content), sr=SAMPLE_RATE, duration=max_duration)[0], repeat
+    )
+    audio_seconds = len(reference) / SAMPLE_RATE
+    row = {
+        "input": name,
+        "bytes": len(content),
+        "audio_seconds": round(audio_seconds, 2),
+        "baseline": {"ms": round(base_s * 1000, 2), "audio_s_per_s": round(audio_seconds / base_s, 1)},
+    }
+    for quality in RESAMPLE_QUALITIES:
+        elapsed, (y, decoder) = timed(
+            lambda: decode_audio(memoryview(content), quality=quality, max_duration=max_duration), repeat
+        )
+        row[quality] = {
+            "decoder": decoder,
+            "ms": round(elapsed * 1000, 2),
+            "audio_s_per_s": round(audio_seconds / elapsed, 1),
+            "speedup": round(base_s / elapsed, 2),
+            "drift": drift(y, reference),
+        }
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=30.0, help="Length of the synthetic WAVs")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-duration", type=float, default=None, help="Decode only the first N seconds")
+    args = parser.parse_args()
+
+    inputs = [(os.path.basename(BUNDLED_MP3), open(BUNDLED_MP3, "rb").read())]
+    inputs += [(f"wav_{rate}hz_{channels}ch", synthetic_wav(rate, channels, args.seconds))
+               for rate, channels in SYNTHETIC]
+
+    # Warm up lazy imports / resampler plans
+    decode_audio(inputs[1][1])
+    librosa.load(io.BytesIO(inputs[1][1]), sr=SAMPLE_RATE)
+
+    results = [bench(name, content, args.repeat, args.max_duration) for name, content in inputs]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Throughput of the lightweight DualPathDA detector vs. the Wav2Vec2 transformer.
+
+    python benchmarks/bench_dualpath.py [--model-path DIR] [--dualpath-path DIR]
+                                        [--seconds 1 4 10] [--batch-sizes 1 8] [--repeat 3]
+
+Both models run end to end from 16 kHz waveforms (front end included) under
+inference_mode on CPU. Without --model-path the transformer is a randomly
+initialised base-size Wav2Vec2ForSequenceClassification and without
+--dualpath-path DualPathDA is randomly initialised too, so the comparison runs
+offline; weights don't change the cost of a forward pass.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from audio import SAMPLE_RATE  # noqa: E402
+from backends import DualPathBackend, TransformersBackend  # noqa: E402
+from features import DEFAULT_FRONT_END, SpectralFrontEnd, tile_pad  # noqa: E402
+from model import DualPathDetector  # noqa: E402
+
+
+def transformer_forward(model_path):
+    """waveforms -> logits for the HF model (local dir) or a random base-size one"""
+    if model_path:
+        backend = TransformersBackend(model_path, torch.device("cpu"), local_files_only=True)
+        return backend.logits, sum(p.numel() for p in backend.model.parameters())
+
+    from transformers import Wav2Vec2Config, Wav2Vec2ForSequenceClassification
+    model = Wav2Vec2ForSequenceClassification(Wav2Vec2Config(num_labels=2)).eval()
+
+    def forward(waveforms):
+        batch = torch.from_numpy(tile_pad(waveforms))
+        with torch.inference_mode():
+            return model(input_values=batch).logits
+    return forward, sum(p.numel() for p in model.parameters())
+
+
+def dualpath_forward(dualpath_path):
+    if dualpath_path:
+        backend = DualPathBackend(dualpath_path, torch.device("cpu"))
+        return backend.logits, sum(p.numel() for p in backend.model.parameters())
+
+    model = DualPathDetector(SpectralFrontEnd(**DEFAULT_FRONT_END)).eval()
+
+    def forward(waveforms):
+        with torch.inference_mode():
+            return model(torch.from_numpy(tile_pad(waveforms)))
+    return forward, sum(p.numel() for p in model.parameters())
+
+
+def measure(forward, seconds, batch_size, repeat):
+    rng = np.random.default_rng(0)
+    waveforms = [(0.1 * rng.standard_normal(int(seconds * SAMPLE_RATE))).astype(np.float32)
+                 for _ in range(batch_size)]
+    forward(waveforms)  # warm up allocator / kernels for this shape
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        forward(waveforms)
+        timings.append(time.perf_counter() - started)
+    latency = min(timings)
+    return {"latency_ms": round(latency * 1000, 2), "clips_per_s": round(batch_size / latency, 2),
+            "audio_s_per_s": round(batch_size * seconds / latency, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model-path", default=None, help="Local HF model directory (default: random base-size)")
+    parser.add_argument("--dualpath-path", default=None, help="DualPathDA artifact directory (export_model.py)")
+    parser.add_argument("--seconds", type=float, nargs="+", default=[1, 4, 10], help="Clip lengths")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    models = {"wav2vec2": transformer_forward(args.model_path), "dualpath": dualpath_forward(args.dualpath_path)}
+    results = {
+        "threads": torch.get_num_threads(),
+        "parameters": {name: params for name, (_, params) in models.items()},
+        "runs": [],
+    }
+    for seconds in args.seconds:
+        for batch_size in args.batch_sizes:
+            run = {"seconds": seconds, "batch_size": batch_size}
+            for name, (forward, _) in models.items():
+                run[name] = measure(forward, seconds, batch_size, args.repeat)
+            run["speedup"] = round(run["wav2vec2"]["latency_ms"] / run["dualpath"]["latency_ms"], 1)
+            results["runs"].append(run)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Query latency and recall of the embedding index at growing sizes, exact vs IVF/PQ.
+
+    python benchmarks/bench_index.py [--sizes 10000 100000 1000000] [--dim 256] [--queries 200]
+                                     [--nlist N] [--subvectors 32] [--nprobe 16] [--dir /tmp/idx] [--out results.json]
+
+Entries are synthetic unit vectors drawn around a few thousand centres (clips of
+the same voice / generator sit close together, as real embeddings do). Queries
+are stored entries plus noise, i.e. near-duplicates with cosine similarity around
+0.97 to the entry they came from. For every size the index is written to disk
+through EmbeddingIndex.add(), searched exactly, then partitioned with train_ivf()
+(default nlist: sqrt(size)) and searched again; the report has per-query p50/p99
+latency, recall@1 of the source entry and the build / training time. The 1M run
+needs ~0.5 GB of disk and a few minutes on one core.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from embedding_index import DEFAULT_NPROBE, DEFAULT_SUBVECTORS, EmbeddingIndex, normalize  # noqa: E402
+from bench_micro import environment  # noqa: E402
+
+CENTRES = 4096
+ADD_ROWS = 100_000  # rows per add() call while building
+SPREAD = 0.5        # entry offset from its centre (per-dimension std, relative to the centre's)
+QUERY_NOISE = 0.25  # query offset from its entry (same scale)
+
+
+def make_rows(rng, centres, n):
+    """n unit vectors scattered around random centres"""
+    picked = centres[rng.integers(0, len(centres), n)]
+    return normalize(picked + SPREAD * rng.standard_normal(picked.shape).astype(np.float32) / np.sqrt(picked.shape[1]))
+
+
+def timed_queries(index, queries, exact):
+    """(per-query latencies in ms, top-1 rows)"""
+    latencies, rows = [], []
+    for query in queries:
+        started = time.perf_counter()
+        _, found = index.search(query, 1, exact=exact)
+        latencies.append(1000 * (time.perf_counter() - started))
+        rows.append(int(found[0, 0]))
+    return np.array(latencies), np.array(rows)
+
+
+def report(latencies, rows, truth):
+    return {"p50_ms": round(float(np.percentile(latencies, 50)), 3),
+            "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+            "recall_at_1": round(float((rows == truth).mean()), 4)}
+
+
+def run_size(directory, size, args, rng, centres):
+    shutil.rmtree(directory, ignore_errors=True)
+    started = time.perf_counter()
+    index = EmbeddingIndex.create(directory, args.dim, 1, "synthetic")
+    for start in range(0, size, ADD_ROWS):
+        n = min(ADD_ROWS, size - start)
+        index.add(make_rows(rng, centres, n), range(start, start + n), ["AI_GENERATED"] * n)
+    build_s = time.perf_counter() - started
+
+    truth = rng.choice(size, args.queries, replace=False)
+    stored = np.asarray(index.vectors[np.sort(truth)], dtype=np.float32)[np.argsort(np.argsort(truth))]
+    queries = normalize(stored + QUERY_NOISE * rng.standard_normal(stored.shape).astype(np.float32) / np.sqrt(args.dim))
+    similarity = float(np.mean((queries * stored).sum(axis=1)))
+
+    # Fresh handle: the OS page cache may still hold the vectors, the process does not
+    index = EmbeddingIndex(directory)
+    exact = report(*timed_queries(index, queries, exact=True), truth)
+
+    nlist = args.nlist or int(np.sqrt(size))
+    started = time.perf_counter()
+    index.train_ivf(nlist, args.subvectors, args.nprobe)
+    train_s = time.perf_counter() - started
+    ivf = report(*timed_queries(index, queries, exact=False), truth)
+    return {
+        "entries": size,
+        "disk_mb": round(sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)) / 2 ** 20, 1),
+        "build_s": round(build_s, 2),
+        "query_similarity": round(similarity, 4),
+        "exact": exact,
+        "ivf_pq": {"nlist": nlist, "subvectors": args.subvectors, "nprobe": args.nprobe,
+                   "train_s": round(train_s, 2), **ivf, "speedup": round(exact["p50_ms"] / ivf["p50_ms"], 1)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=256, help="Embedding size (256: the wav2vec2 classifier projection)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--nlist", type=int, default=None, help="Inverted lists (default: sqrt(entries))")
+    parser.add_argument("--subvectors", type=int, default=DEFAULT_SUBVECTORS)
+    parser.add_argument("--nprobe", type=int, default=DEFAULT_NPROBE)
+    parser.add_argument("--dir", default=None, help="Scratch directory for the index (default: a temporary one)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="Also write the JSON here")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    centres = rng.standard_normal((CENTRES, args.dim)).astype(np.float32) / np.sqrt(args.dim)
+    scratch = args.dir or tempfile.mkdtemp(prefix="bench_index_")
+    try:
+        results = [run_size(os.path.join(scratch, "index"), size, args, rng, centres) for size in args.sizes]
+    finally:
+        if not args.dir:
+            shutil.rmtree(scratch, ignore_errors=True)
+    text = json.dumps({"benchmark": "index", "environment": environment(), "dim": args.dim,
+                       "queries": args.queries, "sizes": results}, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Async load generator for /detect and /detect/audio-file at a target request rate.
+
+    python benchmarks/bench_load.py [--rps 20] [--duration 30] [--seconds 3]
+                                    [--endpoints detect audio-file] [--url http://host:port]
+                                    [--out results.json]
+
+Requests are sent open-loop: a new request is started every 1/rps seconds no matter
+how many are still outstanding, so a saturated server shows up as growing latency
+and errors rather than as a politely slower client. Without --url a server is
+started on a free local port with the tiny random model from benchmarks/tiny_model.py
+(MODEL_LOADING=eager), so the run is offline and reproducible; its remaining
+settings come from the environment as usual. Every request carries a distinct clip so
+the result cache can't answer it. Reports throughput, status counts and
+p50/p95/p99 latency per endpoint as JSON.
+"""
+import argparse
+import asyncio
+import base64
+import contextlib
+import io
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+import numpy as np
+import soundfile as sf
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+from tiny_model import ensure_tiny_model  # noqa: E402
+from bench_micro import environment  # noqa: E402
+
+API_KEY = "hackathon-secret-key"
+CLIP_RATE = 44100
+READY_TIMEOUT_S = 120.0
+
+
+def make_wav(seconds, seed=0):
+    rng = np.random.default_rng(seed)
+    y = (0.1 * rng.standard_normal(int(seconds * CLIP_RATE))).astype(np.float32)
+    buf = io.BytesIO()
+    sf.write(buf, y, CLIP_RATE, subtype="PCM_16", format="WAV")
+    return buf.getvalue()
+
+
+def unique_wav(wav, i):
+    """The clip with its last four PCM16 samples replaced by `i`, so the server's result cache never hits"""
+    clip = bytearray(wav)
+    clip[-8:] = i.to_bytes(8, "little")
+    return bytes(clip)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextlib.contextmanager
+def local_server(model_path):
+    """uvicorn app:app on a free port, yielding its URL once /ready answers 200"""
+    port = free_port()
+    env = dict(os.environ, MODEL_PATH=model_path, MODEL_LOADING="eager")
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "app:app", "--port", str(port),
+                                "--log-level", "warning"], cwd=ROOT, env=env)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + READY_TIMEOUT_S
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"Server exited with code {process.returncode}")
+            try:
+                if httpx.get(f"{url}/ready", timeout=1.0).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Server not ready after {READY_TIMEOUT_S:.0f}s")
+            time.sleep(0.2)
+        yield url
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def percentiles(latencies):
+    if not latencies:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "mean_ms": None}
+    ms = 1000 * np.asarray(latencies)
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {"p50_ms": round(float(p50), 2), "p95_ms": round(float(p95), 2), "p99_ms": round(float(p99), 2),
+            "mean_ms": round(float(ms.mean()), 2)}
+
+
+async def drive(client, endpoint, wav, rps, duration, counter):
+    """Fire requests at `rps` for `duration` seconds, then wait for the stragglers"""
+    headers = {"X-API-Key": API_KEY}
+    latencies, statuses = [], {}
+
+    async def one(clip):
+        started = time.perf_counter()
+        try:
+            if endpoint == "detect":
+                response = await client.post("/detect", json={"audio_base64": base64.b64encode(clip).decode()},
+                                             headers=headers)
+            else:
+                response = await client.post("/detect/audio-file", headers=headers,
+                                             files={"file": ("clip.wav", clip, "audio/wav")})
+            status = str(response.status_code)
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        statuses[status] = statuses.get(status, 0) + 1
+        if status == "200":
+            latencies.append(time.perf_counter() - started)
+
+    tasks = []
+    started = time.perf_counter()
+    for i in range(int(rps * duration)):
+        # Open loop: sleep until this request's slot, independent of responses
+        await asyncio.sleep(max(0.0, started + i / rps - time.perf_counter()))
+        tasks.append(asyncio.create_task(one(unique_wav(wav, next(counter)))))
+    sent_s = time.perf_counter() - started
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    return {
+        "endpoint": endpoint,
+        "target_rps": rps,
+        "sent": len(tasks),
+        "send_rate": round(len(tasks) / sent_s, 2) if sent_s else None,
+        "ok": len(latencies),
+        "statuses": statuses,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        **percentiles(latencies),
+    }
+
+
+async def run(url, args):
+    wav = make_wav(args.seconds)
+    counter = itertools.count()
+    limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+    async with httpx.AsyncClient(base_url=url, timeout=args.timeout, limits=limits) as client:
+        results = []
+        for endpoint in args.endpoints:
+            # Warm up the connection pool and the server's lazy paths before measuring
+            await drive(client, endpoint, wav, min(args.rps, 5), 1, counter)
+            results.append(await drive(client, endpoint, wav, args.rps, args.duration, counter))
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default=None, help="Running server (default: start one with the tiny model)")
+    parser.add_argument("--model-path", default=None, help="Model for the local server (default: tiny random model)")
+    parser.add_argument("--endpoints", nargs="+", choices=("detect", "audio-file"), default=["detect", "audio-file"])
+    parser.add_argument("--rps", type=float, default=20.0, help="Target requests per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of load per endpoint")
+    parser.add_argument("--seconds", type=float, default=3.0, help="Clip length")
+    parser.add_argument("--max-connections", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=60.0, help="Client timeout per request (s)")
+    parser.add_argument("--out", default=None, help="Also write the JSON here")
+    args = parser.parse_args()
+
+    if args.url:
+        results = asyncio.run(run(args.url, args))
+        model = None
+    else:
+        model = args.model_path or ensure_tiny_model()
+        with local_server(model) as url:
+            results = asyncio.run(run(url, args))
+
+    report = {"benchmark": "load", "url": args.url or "local", "model": model, "clip_seconds": args.seconds,
+              "environment": environment(), "results": results}
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
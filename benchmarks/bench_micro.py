@@ -0,0 +1,116 @@
+"""
+Per-stage micro-benchmark of the prediction pipeline across clip lengths and batch sizes.
+
+    python benchmarks/bench_micro.py [--model-path DIR] [--seconds 1 5 30] [--batch-sizes 1 8]
+                                     [--repeat 5] [--out results.json]
+
+Stages are timed the way VoiceDetector runs them: `_decode_audio` (base64 WAV ->
+16 kHz waveform), feature extraction and the forward pass. Without --model-path
+the tiny random stand-in from benchmarks/tiny_model.py is used, so this runs
+offline (absolute numbers then say little; compare runs of the same model).
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+import soundfile as sf
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from audio import SAMPLE_RATE  # noqa: E402
+from inference import VoiceDetector  # noqa: E402
+from profiles import forward_context  # noqa: E402
+from tiny_model import ensure_tiny_model  # noqa: E402
+
+SOURCE_RATE = 44100  # clips are encoded at a common device rate so decode includes resampling
+
+
+def make_clip(seconds, seed=0):
+    rng = np.random.default_rng(seed)
+    y = (0.1 * rng.standard_normal(int(seconds * SOURCE_RATE))).astype(np.float32)
+    buf = io.BytesIO()
+    sf.write(buf, y, SOURCE_RATE, subtype="PCM_16", format="WAV")
+    return base64.b64encode(buf.getvalue()).decode()
+
+
+def measure(fn, repeat):
+    """Median and min of `repeat` timed calls after one warmup call, in ms"""
+    fn()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return {"median_ms": round(1000 * float(np.median(timings)), 3), "min_ms": round(1000 * min(timings), 3)}
+
+
+def environment():
+    """What a result has to be compared against"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"commit": commit, "python": platform.python_version(), "torch": torch.__version__,
+            "threads": torch.get_num_threads(), "machine": platform.machine()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model-path", default=None, help="Local model directory (default: tiny random model)")
+    parser.add_argument("--seconds", type=float, nargs="+", default=[1, 5, 30], help="Clip lengths")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", default=None, help="Also write the JSON here")
+    args = parser.parse_args()
+
+    model_path = args.model_path or ensure_tiny_model()
+    detector = VoiceDetector(model_path=model_path, backend="transformers")
+    backend = detector.backend
+
+    results = []
+    for seconds in args.seconds:
+        clip = make_clip(seconds)
+        y = detector._decode_audio(clip)
+        entry = {"seconds": seconds, "decode": measure(lambda: detector._decode_audio(clip), args.repeat),
+                 "batches": []}
+        for batch_size in args.batch_sizes:
+            waveforms = [y] * batch_size
+
+            def extract():
+                return backend.feature_extractor(waveforms, sampling_rate=SAMPLE_RATE, return_tensors="pt",
+                                                 padding=True, return_attention_mask=True)
+
+            inputs = extract()
+
+            def forward():
+                with forward_context(detector.profile, detector.device.type):
+                    return backend.model(**inputs).logits
+
+            features = measure(extract, args.repeat)
+            forward_ms = measure(forward, args.repeat)
+            entry["batches"].append({
+                "batch_size": batch_size,
+                "feature_extraction": features,
+                "forward": forward_ms,
+                "clips_per_s": round(1000 * batch_size / (features["median_ms"] + forward_ms["median_ms"]), 2),
+            })
+        results.append(entry)
+
+    report = {"benchmark": "micro", "model": detector.model_id, "environment": environment(), "results": results}
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
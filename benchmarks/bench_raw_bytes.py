@@ -0,0 +1,86 @@
+"""
+Memory / latency of the old base64 round trip vs. the raw-bytes upload path.
+
+    python benchmarks/bench_raw_bytes.py [--sizes 1 10 50] [--repeat 3]
+
+The old /detect/audio-file path did: bytes -> base64 str -> split(",") ->
+base64 bytes -> BytesIO -> librosa. The new path decodes straight from a
+memoryview over the upload. Clips are synthetic 16 kHz PCM16 WAVs so that
+decode cost is identical and only the transport overhead differs.
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import soundfile as sf
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from audio import SAMPLE_RATE, load_audio  # noqa: E402
+
+
+def make_wav(size_mb):
+    """Synthetic 16 kHz mono PCM16 WAV of roughly `size_mb` megabytes"""
+    n_samples = int(size_mb * 1024 * 1024 / 2)
+    rng = np.random.default_rng(0)
+    y = (0.1 * rng.standard_normal(n_samples)).astype(np.float32)
+    buf = io.BytesIO()
+    sf.write(buf, y, SAMPLE_RATE, subtype="PCM_16", format="WAV")
+    return buf.getvalue()
+
+
+def base64_round_trip(content):
+    b64_string = base64.b64encode(content).decode("utf-8")
+    if "," in b64_string:
+        b64_string = b64_string.split(",")[1]
+    return load_audio(base64.b64decode(b64_string))
+
+
+def raw_bytes(content):
+    return load_audio(memoryview(content))
+
+
+def measure(fn, content, repeat):
+    timings = []
+    peak = 0
+    for _ in range(repeat):
+        tracemalloc.start()
+        started = time.perf_counter()
+        fn(content)
+        timings.append(time.perf_counter() - started)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return {"latency_ms": round(min(timings) * 1000, 2), "peak_mb": round(peak / 2 ** 20, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 10, 50], help="Clip sizes in MB")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    # Warm up librosa's lazy imports so they don't count against the first size
+    raw_bytes(make_wav(0.1))
+
+    results = []
+    for size_mb in args.sizes:
+        content = make_wav(size_mb)
+        old = measure(base64_round_trip, content, args.repeat)
+        new = measure(raw_bytes, content, args.repeat)
+        results.append({
+            "size_mb": size_mb,
+            "base64": old,
+            "raw_bytes": new,
+            "latency_saved_ms": round(old["latency_ms"] - new["latency_ms"], 2),
+            "memory_saved_mb": round(old["peak_mb"] - new["peak_mb"], 2),
+        })
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Tiny randomly-initialised stand-in for the detector, so benchmarks run offline.
+
+    python benchmarks/tiny_model.py [--out DIR]
+
+Writes a save_pretrained() directory with the real model's architecture
+(Wav2Vec2ForSequenceClassification, same feature extractor) shrunk to
+~35k parameters; serve or benchmark it with MODEL_PATH=DIR. Weights
+are seeded, so every run produces the same model.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from audio import SAMPLE_RATE  # noqa: E402
+
+DEFAULT_DIR = os.path.join(tempfile.gettempdir(), "voice-detector-tiny-model")
+TINY_CONFIG = {
+    "hidden_size": 32,
+    "num_hidden_layers": 2,
+    "num_attention_heads": 2,
+    "intermediate_size": 64,
+    "conv_dim": [16] * 7,
+    "num_conv_pos_embeddings": 16,
+    "num_conv_pos_embedding_groups": 4,
+    "num_labels": 2,
+    "id2label": {0: "real", 1: "fake"},
+    "label2id": {"real": 0, "fake": 1},
+}
+SEED = 0
+
+
+def ensure_tiny_model(path=DEFAULT_DIR):
+    """Create the tiny model under `path` unless it is already there; returns `path`"""
+    if os.path.exists(os.path.join(path, "config.json")):
+        return path
+    import torch
+    from transformers import Wav2Vec2Config, Wav2Vec2FeatureExtractor, Wav2Vec2ForSequenceClassification
+    torch.manual_seed(SEED)
+    model = Wav2Vec2ForSequenceClassification(Wav2Vec2Config(**TINY_CONFIG)).eval()
+    model.save_pretrained(path)
+    Wav2Vec2FeatureExtractor(sampling_rate=SAMPLE_RATE, do_normalize=True, return_attention_mask=True
+                             ).save_pretrained(path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--out", default=DEFAULT_DIR)
+    args = parser.parse_args()
+    print(ensure_tiny_model(args.out))
+
+
+if __name__ == "__main__":
+    main()
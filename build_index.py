@@ -0,0 +1,153 @@
+"""
+Build, grow and partition an embedding index of known clips for near-duplicate matching.
+
+    python build_index.py build --data labeled/ --out index/ [--model-path DIR] [--layer N]
+    python build_index.py add --index index/ --label AI_GENERATED clips/ one.wav [--prefix campaign-7/]
+    python build_index.py add --index index/ --data more-labeled/
+    python build_index.py ivf --index index/ [--nlist 1024] [--subvectors 32] [--nprobe 16]
+
+`build` embeds every clip of a labeled folder (real/ and fake/ sub-folders, see
+labeled_data.py) into a new index; `add` appends clips to an existing one, either
+a labeled folder or files/folders given one `--label`. Clip ids are paths relative
+to the folder they were found under (a file's own name for file arguments), with
+`--prefix` in front; the API reports them as `match_id`.
+
+`--layer` picks the encoder layer embeddings are pooled from. The default, the
+last layer, is the model's own pooled embedding; an earlier layer lets a match
+stop the forward pass there. Each clip is embedded alone, unpadded, over its
+first `--clip-seconds`, and the server looks clips up the same way: inside the
+batch's forward pass when a clip is its longest, through a pass of its own up to
+`--layer` otherwise, and long (chunked) clips as a whole before windowing. The
+served model must be the one the index was built with; with VAD_ENABLED clips
+are trimmed as the server trims them. `ivf` partitions the index (inverted lists + product quantization) once it
+is large enough for exact search to be slow; later adds are encoded on the fly.
+Serve it with INDEX_PATH=index/.
+"""
+import argparse
+import json
+import os
+import time
+
+from audio import SAMPLE_RATE, load_audio
+from embedding_index import (DEFAULT_CLIP_SECONDS, DEFAULT_NLIST, DEFAULT_NPROBE, DEFAULT_SUBVECTORS, LABELS,
+                             EmbeddingIndex)
+from inference import VAD_OPTIONS, VoiceDetector
+from labeled_data import iter_audio_files, iter_labeled_folder
+import vad
+
+# Clips are embedded one at a time by default: padding a clip to the length of a longer
+# one shifts its embedding for group-norm feature encoders (wav2vec2-base and its
+# fine-tunes), and the index should hold what a lone request for that clip sees
+DEFAULT_BATCH_SIZE = 1
+
+
+def labeled_clips(root, prefix):
+    """(id, path, label) for a labeled folder"""
+    for path, label in iter_labeled_folder(root):
+        yield prefix + os.path.relpath(path, root), path, label
+
+
+def listed_clips(sources, label, prefix):
+    """(id, path, label) for files and folders that all share one label"""
+    for source in sources:
+        if os.path.isdir(source):
+            for path in iter_audio_files(source):
+                yield prefix + os.path.relpath(path, source), path, label
+        else:
+            yield prefix + os.path.basename(source), source, label
+
+
+def embed_clips(detector, clips, layer, batch_size, clip_samples):
+    """
+    Embeddings [clips, dim] of the first `clip_samples` of (id, path, label) clips,
+    batched by similar length to limit padding
+    """
+    waveforms = []
+    for _, path, _ in clips:
+        with open(path, "rb") as f:
+            y = load_audio(f.read())
+        if VAD_OPTIONS is not None:
+            speech, _ = vad.trim_silence(y, **VAD_OPTIONS)
+            y = speech if len(speech) else y
+        waveforms.append(y[:clip_samples])
+    order = sorted(range(len(clips)), key=lambda i: len(waveforms[i]))
+    embeddings = [None] * len(clips)
+    for start in range(0, len(order), batch_size):
+        rows = order[start:start + batch_size]
+        for i, vector in zip(rows, detector.embed([waveforms[i] for i in rows], layer)):
+            embeddings[i] = vector
+    return embeddings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="New index from a labeled folder")
+    build.add_argument("--data", required=True, help="Labeled folder with real/ and fake/ sub-folders")
+    build.add_argument("--out", required=True, help="Directory for the new index")
+    build.add_argument("--layer", type=int, default=None,
+                       help="Encoder layer to pool embeddings from, 1-based (default: the last)")
+    build.add_argument("--clip-seconds", type=float, default=DEFAULT_CLIP_SECONDS,
+                       help="Embed (and look up) at most this much of every clip")
+
+    add = commands.add_parser("add", help="Append clips to an existing index")
+    add.add_argument("--index", required=True)
+    add.add_argument("--data", default=None, help="Labeled folder with real/ and fake/ sub-folders")
+    add.add_argument("--label", choices=LABELS, default=None, help="Label of the listed files/folders")
+    add.add_argument("sources", nargs="*", help="Audio files or folders (with --label)")
+
+    for command in (build, add):
+        command.add_argument("--model-path", default=None, help="Local model directory (defaults to MODEL_PATH / hub)")
+        command.add_argument("--prefix", default="", help="Prepended to every clip id")
+        command.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                             help="Clips per forward pass (similar lengths are grouped; >1 trades exactness for speed)")
+
+    ivf = commands.add_parser("ivf", help="Partition an index with IVF/PQ")
+    ivf.add_argument("--index", required=True)
+    ivf.add_argument("--nlist", type=int, default=DEFAULT_NLIST, help="Inverted lists (coarse centroids)")
+    ivf.add_argument("--subvectors", type=int, default=DEFAULT_SUBVECTORS, help="PQ bytes per embedding")
+    ivf.add_argument("--nprobe", type=int, default=DEFAULT_NPROBE, help="Lists scanned per query (default)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.command == "ivf":
+        index = EmbeddingIndex(args.index)
+        index.train_ivf(args.nlist, args.subvectors, args.nprobe)
+        target = args.index
+    else:
+        detector = VoiceDetector(model_path=args.model_path, backend="transformers")
+        if args.command == "build":
+            clips = list(labeled_clips(args.data, args.prefix))
+            layer = args.layer or detector.taps.num_layers
+            embeddings = embed_clips(detector, clips, layer, args.batch_size, int(args.clip_seconds * SAMPLE_RATE))
+            index = EmbeddingIndex.create(args.out, len(embeddings[0]), layer, detector.model_id, args.clip_seconds)
+            target = args.out
+        else:
+            if bool(args.data) == bool(args.sources) or bool(args.sources) != bool(args.label):
+                parser.error("add takes either --data DIR or --label with files/folders")
+            index = EmbeddingIndex(args.index)
+            if index.model_id != detector.model_id:
+                raise SystemExit(f"The index was built with {index.model_id}, not {detector.model_id}")
+            clips = list(labeled_clips(args.data, args.prefix) if args.data
+                         else listed_clips(args.sources, args.label, args.prefix))
+            if not clips:
+                raise SystemExit("No audio clips found")
+            embeddings = embed_clips(detector, clips, index.layer, args.batch_size, index.clip_samples)
+            target = args.index
+        index.add(embeddings, [clip_id for clip_id, _, _ in clips], [label for _, _, label in clips])
+
+    labels = {label: index.labels.count(label) for label in LABELS}
+    print(json.dumps({
+        "index": target,
+        "entries": len(index),
+        "labels": labels,
+        "layer": index.layer,
+        "dim": index.dim,
+        "ivf": index.meta["ivf"],
+        "seconds": round(time.perf_counter() - started, 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Defaults (overridable through environment variables in app.py)
+DEFAULT_MAX_ENTRIES = 4096
+DEFAULT_TTL_S = 24 * 3600.0
+DEFAULT_MAX_DB_ENTRIES = 1_000_000
+# The SQLite file is pruned (expired rows, then the oldest past max_db_entries) every this many puts
+PRUNE_EVERY = 1000
+
+# Files are hashed in pieces so an upload never has to be read into memory at once
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def content_hash(source):
+    """SHA-256 of raw audio bytes; `source` is any buffer or a seekable binary file object"""
+    digest = hashlib.sha256()
+    if hasattr(source, "read"):
+        source.seek(0)
+        for chunk in iter(lambda: source.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+        source.seek(0)
+    else:
+        digest.update(memoryview(source))
+    return digest.hexdigest()
+
+
+def cache_key(source, model_id, variant=""):
+    """Content address of a result: audio bytes + model name/revision + response options"""
+    return f"{model_id}|{variant}|{content_hash(source)}"
+
+
+class ResultCache:
+    """
+    In-process LRU of prediction results with size and TTL eviction,
+    optionally backed by a SQLite file so entries survive restarts. The file
+    gets the same TTL and keeps at most `max_db_entries` rows, newest first.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl_s=DEFAULT_TTL_S, db_path=None,
+                 max_db_entries=DEFAULT_MAX_DB_ENTRIES):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_s = float(ttl_s)
+        self.max_db_entries = max(1, int(max_db_entries))
+        self._puts = 0
+        self._entries = OrderedDict()  # key -> (stored_at, result)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, stored_at REAL, result TEXT)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS results_stored_at ON results (stored_at)")
+            self._prune()
+            logger.info(f"Result cache persisted to {db_path}")
+
+    def _expired(self, stored_at, now):
+        return self.ttl_s > 0 and now - stored_at > self.ttl_s
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry[0], now):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return dict(entry[1])
+                del self._entries[key]
+                self.expirations += 1
+
+            if self._db is not None:
+                row = self._db.execute("SELECT stored_at, result FROM results WHERE key = ?", (key,)).fetchone()
+                if row is not None and not self._expired(row[0], now):
+                    result = json.loads(row[1])
+                    self._insert(key, row[0], result)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return dict(result)
+                if row is not None:
+                    self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+                    self._db.commit()
+                    self.expirations += 1
+
+            self.misses += 1
+            return None
+
+    def put(self, key, result):
+        stored_at = time.time()
+        with self._lock:
+            self._insert(key, stored_at, dict(result))
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results (key, stored_at, result) VALUES (?, ?, ?)",
+                    (key, stored_at, json.dumps(result)),
+                )
+                self._puts += 1
+                if self._puts % PRUNE_EVERY == 0:
+                    self._prune()
+                else:
+                    self._db.commit()
+
+    def _prune(self):
+        """Delete expired rows, then the oldest ones past max_db_entries, from the SQLite file"""
+        expired = 0
+        if self.ttl_s > 0:
+            expired = self._db.execute("DELETE FROM results WHERE stored_at < ?", (time.time() - self.ttl_s,)).rowcount
+        evicted = self._db.execute(
+            "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_db_entries,),
+        ).rowcount
+        self._db.commit()
+        self.expirations += expired
+        self.evictions += evicted
+
+    def _insert(self, key, stored_at, result):
+        self._entries[key] = (stored_at, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def snapshot(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "persistent": self._db is not None,
+        }
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
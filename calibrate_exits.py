@@ -0,0 +1,187 @@
+"""
+Fit early-exit heads and thresholds on a labeled folder and report the trade-off per exit point.
+
+    python calibrate_exits.py --data fixtures/ --out exits/ [--model-path DIR] [--layers 3 6 9]
+                              [--tolerance 0.01] [--holdout 0.3] [--epochs 500]
+
+`--data` is a labeled folder (real/ and fake/ sub-folders, see labeled_data.py).
+Every clip runs once through the full model while hooks record the mean-pooled
+states of the chosen encoder layers. A linear head per layer is fitted on a
+training split; its threshold is the lowest confidence at which the head's
+answers on that split are within `--tolerance` of the full model's accuracy.
+The held-out split then gets, per exit point, the head's accuracy when every
+clip stops there (the EARLY_EXIT_MAX_LAYERS setting), how many clips clear the
+threshold and how accurate those are, and the measured latency of a forward pass
+cut at that layer; plus the whole confidence-gated cascade against the full
+model. The heads are written to `--out`, ready for EARLY_EXIT_PATH.
+"""
+import argparse
+import json
+import random
+import time
+
+import numpy as np
+import torch
+from torch import nn
+
+from audio import SAMPLE_RATE, load_audio
+from early_exit import ExitHeads, LayerTaps, _Exit, masked_mean, save_heads
+from inference import VoiceDetector
+from labeled_data import iter_labeled_folder
+from profiles import forward_context
+
+NEVER = 1.01  # threshold no softmax confidence reaches
+LATENCY_CLIPS = 20
+
+
+def collect(detector, taps, waveforms, layers):
+    """Pooled states per layer [clips, hidden] and the full model's probabilities [clips, labels]"""
+    pooled = {layer: [] for layer in layers}
+    full = []
+
+    def record(layer, hidden):
+        if layer in pooled:
+            pooled[layer].append(masked_mean(hidden, None)[0])
+
+    backend = detector.backend
+    for y in waveforms:
+        inputs = backend.feature_extractor([y], sampling_rate=SAMPLE_RATE, return_tensors="pt")
+        with torch.inference_mode(), forward_context(detector.profile, detector.device.type):
+            output = taps.run({key: val.to(detector.device) for key, val in inputs.items()}, record)
+        full.append(output.logits[0].float().softmax(-1).cpu())
+    return {layer: torch.stack(rows).float().cpu() for layer, rows in pooled.items()}, torch.stack(full)
+
+
+def fit_head(features, labels, num_labels, epochs, weight_decay):
+    """Logistic regression on the pooled states of one layer (full batch, Adam)"""
+    head = nn.Linear(features.shape[1], num_labels)
+    optimizer = torch.optim.Adam(head.parameters(), lr=1e-2, weight_decay=weight_decay)
+    for _ in range(epochs):
+        optimizer.zero_grad()
+        nn.functional.cross_entropy(head(features), labels).backward()
+        optimizer.step()
+    return head.eval()
+
+
+def pick_threshold(confidence, correct, target):
+    """Lowest confidence whose exiting clips are at least `target` accurate"""
+    for threshold in np.unique(confidence):
+        if correct[confidence >= threshold].mean() >= target:
+            return float(threshold)
+    return NEVER
+
+
+def cut_latency_ms(detector, taps, waveforms, layer):
+    """Mean single-clip latency of a forward pass stopped after `layer` (None = full pass)"""
+    def stop(current, hidden):
+        if current == layer:
+            raise _Exit()
+
+    backend = detector.backend
+    timings = []
+    for y in waveforms:
+        started = time.perf_counter()
+        inputs = backend.feature_extractor([y], sampling_rate=SAMPLE_RATE, return_tensors="pt")
+        with torch.inference_mode(), forward_context(detector.profile, detector.device.type):
+            taps.run({key: val.to(detector.device) for key, val in inputs.items()}, stop)
+        timings.append(time.perf_counter() - started)
+    return 1000.0 * float(np.mean(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--data", required=True, help="Labeled folder with real/ and fake/ sub-folders")
+    parser.add_argument("--out", required=True, help="Directory for exit_heads.json / exit_heads.pt")
+    parser.add_argument("--model-path", default=None, help="Local model directory (defaults to MODEL_PATH / hub)")
+    parser.add_argument("--layers", type=int, nargs="+", default=None,
+                        help="Exit layers, 1-based (default: a quarter, half and three quarters of the encoder)")
+    parser.add_argument("--tolerance", type=float, default=0.01, help="Allowed accuracy drop vs the full model")
+    parser.add_argument("--holdout", type=float, default=0.3, help="Fraction of clips kept out of fitting")
+    parser.add_argument("--epochs", type=int, default=500)
+    parser.add_argument("--weight-decay", type=float, default=1e-3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    clips = list(iter_labeled_folder(args.data))
+    waveforms = [load_audio(open(path, "rb").read()) for path, _ in clips]
+    print(f"Loaded {len(clips)} clips from {args.data}")
+
+    detector = VoiceDetector(model_path=args.model_path, backend="transformers")
+    taps = LayerTaps(detector.backend.model)
+    num_layers = taps.num_layers
+    layers = sorted(set(args.layers or [max(1, round(num_layers * q)) for q in (0.25, 0.5, 0.75)]))
+    layers = [layer for layer in layers if 1 <= layer < num_layers]
+    if not layers:
+        raise SystemExit(f"No exit layers below the model's {num_layers} encoder layers")
+
+    fake_index = detector.fake_index
+    human_index = next(idx for idx in detector.id2label if idx != fake_index)
+    labels = torch.tensor([fake_index if label == "AI_GENERATED" else human_index for _, label in clips])
+    pooled, full_probs = collect(detector, taps, waveforms, layers)
+
+    order = list(range(len(clips)))
+    random.Random(args.seed).shuffle(order)
+    n_test = int(round(args.holdout * len(clips)))
+    test, train = (order[:n_test], order[n_test:]) if 0 < n_test < len(clips) else (order, order)
+    if test is train:
+        print("Too few clips for a holdout split; the report is on the fitting clips")
+
+    full_correct = (full_probs.argmax(-1) == labels).numpy()
+    target = full_correct[train].mean() - args.tolerance
+    heads = ExitHeads(layers, pooled[layers[0]].shape[1], len(detector.id2label))
+    thresholds, head_probs = {}, {}
+    for layer in layers:
+        head = fit_head(pooled[layer][train], labels[train], len(detector.id2label), args.epochs, args.weight_decay)
+        heads.heads[str(layer)].load_state_dict(head.state_dict())
+        with torch.no_grad():
+            head_probs[layer] = head(pooled[layer]).softmax(-1)
+        confidence = head_probs[layer].max(-1).values.numpy()
+        correct = (head_probs[layer].argmax(-1) == labels).numpy()
+        thresholds[layer] = pick_threshold(confidence[train], correct[train], target)
+
+    sample = [waveforms[i] for i in test[:LATENCY_CLIPS]]
+    full_ms = cut_latency_ms(detector, taps, sample, None)
+    exit_points, decided = [], np.zeros(len(clips), dtype=bool)
+    exit_layer = np.full(len(clips), num_layers)
+    cascade_correct = full_correct.copy()
+    cascade_ms = np.full(len(clips), full_ms)
+    for layer in layers:
+        confidence = head_probs[layer].max(-1).values.numpy()
+        correct = (head_probs[layer].argmax(-1) == labels).numpy()
+        exits = confidence >= thresholds[layer]
+        latency_ms = cut_latency_ms(detector, taps, sample, layer)
+        first = exits & ~decided
+        cascade_correct[first] = correct[first]
+        cascade_ms[first] = latency_ms
+        exit_layer[first] = layer
+        decided |= exits
+        exit_points.append({
+            "layer": layer,
+            "threshold": round(thresholds[layer], 4),
+            "truncated_accuracy": round(float(correct[test].mean()), 4),
+            "coverage": round(float(exits[test].mean()), 4),
+            "exit_accuracy": round(float(correct[test][exits[test]].mean()), 4) if exits[test].any() else None,
+            "latency_ms": round(latency_ms, 2),
+        })
+
+    save_heads(args.out, heads, thresholds, detector.model_id)
+    cascade_latency = float(cascade_ms[test].mean())
+    print(json.dumps({
+        "clips": len(clips),
+        "evaluated_on": len(test),
+        "encoder_layers": num_layers,
+        "tolerance": args.tolerance,
+        "full": {"accuracy": round(float(full_correct[test].mean()), 4), "latency_ms": round(full_ms, 2)},
+        "exit_points": exit_points,
+        "early_exit": {
+            "accuracy": round(float(cascade_correct[test].mean()), 4),
+            "mean_layers": round(float(exit_layer[test].mean()), 2),
+            "mean_latency_ms": round(cascade_latency, 2),
+            "speedup": round(full_ms / cascade_latency, 2),
+        },
+        "out": args.out,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import logging
+import threading
+import time
+
+import torch
+
+from inference import VoiceDetector
+from metrics import CASCADE_CLIPS, CASCADE_SAVED_SECONDS, CASCADE_STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Screener fake probabilities inside [low, high] are "uncertain" and go to the full model
+DEFAULT_BAND = (0.2, 0.8)
+SCREENER_STAGE = "screener"
+FULL_STAGE = "transformer"
+
+
+class CascadeStats:
+    """Escalation rate and time spent per stage, for /stats (and /metrics, see CascadeDetector._record)"""
+
+    def __init__(self, band):
+        self.band = band
+        self.clips = 0
+        self.escalated = 0
+        self.screener_seconds = 0.0
+        self.full_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, clips, escalated, screener_seconds, full_seconds):
+        """Add one call's counts; returns the full-model seconds its screened clips saved (0 until one escalated)"""
+        with self._lock:
+            self.clips += clips
+            self.escalated += escalated
+            self.screener_seconds += screener_seconds
+            self.full_seconds += full_seconds
+            full_per_clip = self.full_seconds / self.escalated if self.escalated else 0.0
+        return (clips - escalated) * full_per_clip
+
+    def snapshot(self):
+        with self._lock:
+            clips, escalated = self.clips, self.escalated
+            screener_seconds, full_seconds = self.screener_seconds, self.full_seconds
+        full_per_clip = full_seconds / escalated if escalated else None
+        # What the clips the screener decided would have cost on the full model, minus
+        # the screener's own cost; unknown until at least one clip was escalated
+        saved = None
+        if full_per_clip is not None:
+            saved = (clips - escalated) * full_per_clip - screener_seconds
+        return {
+            "band": list(self.band),
+            "clips": clips,
+            "escalated": escalated,
+            "escalation_rate": round(escalated / clips, 4) if clips else 0.0,
+            "screener_ms_per_clip": round(1000 * screener_seconds / clips, 2) if clips else None,
+            "full_ms_per_clip": round(1000 * full_per_clip, 2) if full_per_clip is not None else None,
+            "latency_saved_s": round(saved, 3) if saved is not None else None,
+        }
+
+
+class CascadeDetector(VoiceDetector):
+    """
+    Two-stage detector: a cheap screener (e.g. the dualpath backend) scores every clip
+    and only clips whose screener fake probability falls inside `band` are escalated to
+    the full model. It keeps the VoiceDetector interface, so the batcher, chunked
+    inference and the result cache use it unchanged; results carry a "stage" field.
+    """
+
+    def __init__(self, screener, full, band=DEFAULT_BAND):
+        # Both stages are loaded already, so VoiceDetector.__init__ is deliberately not called
+        low, high = float(band[0]), float(band[1])
+        if not 0.0 <= low <= high <= 1.0:
+            raise ValueError(f"Invalid cascade band [{low}, {high}], expected 0 <= low <= high <= 1")
+        self.screener = screener
+        self.full = full
+        self.band = (low, high)
+        self.device = full.device
+        self.profile = full.profile
+        self.backend_name = f"cascade({screener.backend_name}->{full.backend_name})"
+        self.backend = full.backend
+        self.id2label = full.id2label
+        self.model_id = f"cascade[{low:g},{high:g}]:{screener.model_id}->{full.model_id}"
+        self.load_timings = {f"{stage}_{phase}": secs
+                             for stage, detector in ((SCREENER_STAGE, screener), (FULL_STAGE, full))
+                             for phase, secs in detector.load_timings.items()}
+        self.cache = None
+        # Early exit of the full model happens inside its own _classify / predict_waveforms
+        self.early_exit = None
+        self.stats = CascadeStats(self.band)
+        # Windows escalated by the chunked call running on this thread
+        self._local = threading.local()
+
+    def _screen(self, waveforms):
+        """Screener probabilities in the full model's label order, the rows to escalate, the screener's time"""
+        started = time.perf_counter()
+        fake_probs = self.screener._classify(waveforms)[:, self.screener.fake_index].float()
+        screener_seconds = time.perf_counter() - started
+
+        low, high = self.band
+        escalated = (fake_probs >= low) & (fake_probs <= high)
+        fake_index = self.full.fake_index
+        human_index = next(idx for idx in self.id2label if idx != fake_index)
+        probs = torch.zeros(len(waveforms), len(self.id2label))
+        probs[:, fake_index] = fake_probs
+        probs[:, human_index] = 1.0 - fake_probs
+        return probs, escalated.nonzero().flatten().tolist(), screener_seconds
+
+    def _record(self, clips, escalated, screener_seconds, full_seconds):
+        saved = self.stats.record(clips, escalated, screener_seconds, full_seconds)
+        CASCADE_CLIPS.inc(clips - escalated, stage=SCREENER_STAGE)
+        CASCADE_CLIPS.inc(escalated, stage=FULL_STAGE)
+        CASCADE_STAGE_SECONDS.inc(screener_seconds, stage=SCREENER_STAGE)
+        CASCADE_STAGE_SECONDS.inc(full_seconds, stage=FULL_STAGE)
+        CASCADE_SAVED_SECONDS.inc(saved)
+
+    def _classify(self, waveforms):
+        waveforms = list(waveforms)
+        probs, rows, screener_seconds = self._screen(waveforms)
+        full_seconds = 0.0
+        if rows:
+            started = time.perf_counter()
+            probs[rows] = self.full._classify([waveforms[i] for i in rows]).float()
+            full_seconds = time.perf_counter() - started
+        self._record(len(waveforms), len(rows), screener_seconds, full_seconds)
+        self._local.escalated = getattr(self._local, "escalated", 0) + len(rows)
+        return probs
+
+    def _probabilities(self, waveforms, lookup=True):
+        # No early exit, so no index to keep out of the windows
+        return self._classify(waveforms), None
+
+    def predict_waveforms(self, waveforms):
+        waveforms = list(waveforms)
+        probs, rows, screener_seconds = self._screen(waveforms)
+        results = [{**self._format_result(row), "stage": SCREENER_STAGE} for row in probs]
+        full_seconds = 0.0
+        if rows:
+            # The full detector's own results keep its early-exit / index details and metrics
+            started = time.perf_counter()
+            for i, result in zip(rows, self.full.predict_waveforms([waveforms[i] for i in rows])):
+                results[i] = {**result, "stage": FULL_STAGE}
+            full_seconds = time.perf_counter() - started
+        self._record(len(waveforms), len(rows), screener_seconds, full_seconds)
+        return results
+
+    def predict_chunked(self, y, **options):
+        self._local.escalated = 0
+        result = super().predict_chunked(y, **options)
+        # A recording counts as escalated as soon as any of its windows was
+        result["stage"] = FULL_STAGE if self._local.escalated else SCREENER_STAGE
+        result["escalated_windows"] = self._local.escalated
+        return result
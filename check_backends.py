@@ -0,0 +1,104 @@
+"""
+Logit parity of exported artifacts against the eager model they were exported from.
+
+    python check_backends.py exported/onnx exported/ts [--model-path DIR] [--data FOLDER] [--tolerance 1e-3]
+
+Waveform artifacts are compared with the eager transformers backend on random
+waveforms of mixed lengths (one padded batch) and on real audio (the bundled MP3 and,
+optionally, every clip under --data). DualPathDA artifacts are compared with the
+eager `dualpath` backend (same front end, weights from state_dict.pt or --weights) on
+the same inputs. Exits non-zero if any logit differs by more
+than --tolerance.
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+import torch
+
+from audio import SAMPLE_RATE, load_audio
+from backends import EXPORT_FILE, read_json
+from inference import VoiceDetector
+from labeled_data import iter_audio_files
+
+BUNDLED_MP3 = os.path.join(os.path.dirname(os.path.abspath(__file__)), "freesound_community-shortfilm-voice-56795.mp3")
+RANDOM_LENGTHS_S = (0.5, 1.0, 2.5, 4.0)
+REAL_SECONDS = 10.0
+
+
+def real_waveforms(data_dir):
+    waveforms = [load_audio(open(BUNDLED_MP3, "rb").read(), max_duration=REAL_SECONDS)]
+    if data_dir:
+        waveforms += [load_audio(open(path, "rb").read(), max_duration=REAL_SECONDS)
+                      for path in iter_audio_files(data_dir)]
+    return waveforms
+
+
+def compare(reference, candidate):
+    diff = np.abs(reference - candidate)
+    return {
+        "max_abs_logit_diff": float(diff.max()),
+        "label_agreement": float(np.mean(reference.argmax(-1) == candidate.argmax(-1))),
+    }
+
+
+def check_artifact(artifact, export, reference, inputs):
+    detector = VoiceDetector(model_path=artifact, backend=export["format"], warmup=False)
+    report = {}
+    for name, waveforms in inputs.items():
+        expected = reference.backend.logits(waveforms).numpy()
+        report[name] = compare(expected, detector.backend.logits(waveforms).numpy())
+    return report
+
+
+def dualpath_reference(artifact, weights):
+    reference = VoiceDetector(model_path=artifact, backend="dualpath", warmup=False)
+    if weights:
+        reference.backend.model.classifier.load_state_dict(torch.load(weights, map_location="cpu"))
+    return reference
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("artifacts", nargs="+", help="Directories written by export_model.py")
+    parser.add_argument("--model-path", default=None, help="Local HF model the waveform artifacts came from")
+    parser.add_argument("--weights", default=None,
+                        help="DualPathDA state_dict to compare against (defaults to the artifact's own state_dict.pt)")
+    parser.add_argument("--data", default=None, help="Folder of extra real clips")
+    parser.add_argument("--tolerance", type=float, default=1e-3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    inputs = {
+        "random": [(0.1 * rng.standard_normal(int(s * SAMPLE_RATE))).astype(np.float32) for s in RANDOM_LENGTHS_S],
+        "real": real_waveforms(args.data),
+    }
+    reference = None
+
+    report, failed = {}, False
+    for artifact in args.artifacts:
+        export = read_json(artifact, EXPORT_FILE)
+        if export["format"] == "eager":
+            continue  # this is the reference itself
+        if export["input"] == "waveform":
+            if reference is None:
+                reference = VoiceDetector(model_path=args.model_path, backend="transformers", warmup=False)
+            result = check_artifact(artifact, export, reference, inputs)
+        else:
+            result = check_artifact(artifact, export, dualpath_reference(artifact, args.weights), inputs)
+        # int8 artifacts are expected to drift; they are reported but judged on labels only
+        exact = export.get("profile", "fp32") == "fp32"
+        ok = all((r["max_abs_logit_diff"] <= args.tolerance) if exact else (r["label_agreement"] == 1.0)
+                 for r in result.values())
+        failed |= not ok
+        report[artifact] = {"format": export["format"], "arch": export["arch"], "profile": export.get("profile"),
+                            "ok": ok, **result}
+
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
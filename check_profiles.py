@@ -0,0 +1,74 @@
+"""
+Accuracy-parity check of the CPU execution profiles against fp32.
+
+    python check_profiles.py --data fixtures/ [--profiles fp32 int8 bf16] [--tolerance 0.01]
+
+`--data` is a labeled folder (real/ and fake/ sub-folders, see labeled_data.py).
+Every profile scores the same decoded clips; the report lists accuracy, agreement
+with fp32, fake-probability drift and latency, and recommends the fastest profile
+whose accuracy is within `--tolerance` of fp32.
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from audio import load_audio
+from inference import VoiceDetector
+from labeled_data import iter_labeled_folder
+from profiles import PROFILES
+
+
+def score(detector, waveforms):
+    """Fake probability per clip and mean single-clip latency (ms)"""
+    fake_index = detector.fake_index
+    fake_probs, timings = [], []
+    for y in waveforms:
+        started = time.perf_counter()
+        fake_probs.append(detector._classify([y])[0, fake_index].item())
+        timings.append(time.perf_counter() - started)
+    return np.array(fake_probs), 1000.0 * float(np.mean(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--data", required=True, help="Labeled folder with real/ and fake/ sub-folders")
+    parser.add_argument("--profiles", nargs="+", default=list(PROFILES), choices=PROFILES)
+    parser.add_argument("--tolerance", type=float, default=0.01, help="Allowed accuracy drop vs fp32")
+    parser.add_argument("--model-path", default=None, help="Local model directory (defaults to MODEL_PATH / hub)")
+    args = parser.parse_args()
+
+    clips = list(iter_labeled_folder(args.data))
+    waveforms = [load_audio(open(path, "rb").read()) for path, _ in clips]
+    is_fake = np.array([label == "AI_GENERATED" for _, label in clips])
+    print(f"Loaded {len(clips)} clips from {args.data}")
+
+    profiles = ["fp32"] + [p for p in args.profiles if p != "fp32"]
+    report, reference = {}, None
+    for profile in profiles:
+        detector = VoiceDetector(model_path=args.model_path, profile=profile)
+        fake_probs, latency_ms = score(detector, waveforms)
+        predicted_fake = fake_probs >= 0.5
+        if reference is None:
+            reference = (fake_probs, predicted_fake)
+        report[profile] = {
+            "accuracy": round(float(np.mean(predicted_fake == is_fake)), 4),
+            "agreement_with_fp32": round(float(np.mean(predicted_fake == reference[1])), 4),
+            "max_fake_prob_drift": round(float(np.max(np.abs(fake_probs - reference[0]))), 4),
+            "mean_latency_ms": round(latency_ms, 2),
+        }
+        del detector
+
+    baseline = report["fp32"]["accuracy"]
+    eligible = [p for p in profiles if report[p]["accuracy"] >= baseline - args.tolerance]
+    for profile in profiles:
+        report[profile]["within_tolerance"] = profile in eligible
+    recommended = min(eligible, key=lambda p: report[p]["mean_latency_ms"])
+
+    print(json.dumps({"clips": len(clips), "tolerance": args.tolerance,
+                      "profiles": report, "recommended": recommended}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
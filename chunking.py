@@ -0,0 +1,46 @@
+import numpy as np
+
+# Defaults (overridable through environment variables in app.py)
+DEFAULT_WINDOW_S = 4.0
+DEFAULT_HOP_S = 2.0
+DEFAULT_BATCH_SIZE = 8
+DEFAULT_AGGREGATE = "mean"
+DEFAULT_TOP_K = 3
+# Clips longer than this are analysed in windows unless the caller says otherwise
+DEFAULT_THRESHOLD_S = 30.0
+
+AGGREGATES = ("mean", "max", "topk")
+
+
+def window_starts(n_samples, window, hop):
+    """
+    Start offsets of fixed-length windows covering `n_samples`.
+    The last window is aligned to the end of the clip so the tail is never dropped.
+    """
+    if n_samples <= window:
+        return [0]
+    starts = list(range(0, n_samples - window + 1, hop))
+    if starts[-1] + window < n_samples:
+        starts.append(n_samples - window)
+    return starts
+
+
+def iter_window_batches(y, window, hop, batch_size):
+    """Yield (starts, windows) batches; windows are views into `y`, never copies"""
+    starts = window_starts(len(y), window, hop)
+    for i in range(0, len(starts), batch_size):
+        batch_starts = starts[i:i + batch_size]
+        yield batch_starts, [y[s:s + window] for s in batch_starts]
+
+
+def aggregate(fake_probs, method=DEFAULT_AGGREGATE, top_k=DEFAULT_TOP_K):
+    """Combine per-window fake probabilities into one clip-level fake probability"""
+    fake_probs = np.asarray(fake_probs, dtype=np.float32)
+    if method == "mean":
+        return float(fake_probs.mean())
+    if method == "max":
+        return float(fake_probs.max())
+    if method == "topk":
+        k = max(1, min(int(top_k), len(fake_probs)))
+        return float(np.sort(fake_probs)[-k:].mean())
+    raise ValueError(f"Unknown aggregate '{method}', expected one of {AGGREGATES}")
@@ -1,45 +1,102 @@
-import requests
+"""
+Score audio files or whole directories against a running detector API.
+
+    python client.py clip.mp3
+    python client.py recordings/ more.wav [--url http://host:7860] [--concurrency 8]
+                     [--batch-size 16] [--chunked] [--out results.jsonl]
+
+A single file prints a readable summary. Anything more is scored in parallel
+through detector_client (groups of files per /detect/batch request when the
+server has it) and printed as one JSON line per file, in completion order,
+followed by a summary line on stderr.
+"""
 import argparse
-import sys
+import json
 import os
+import sys
+import time
+
+import httpx
+
+from detector_client import Client, DetectorError, DEFAULT_URL, DEFAULT_API_KEY, DEFAULT_CONCURRENCY, \
+    DEFAULT_BATCH_SIZE
+from labeled_data import iter_audio_files
+
+
+def expand(paths):
+    """Files as given, directories replaced by the audio files below them"""
+    for path in paths:
+        if os.path.isdir(path):
+            yield from iter_audio_files(path)
+        else:
+            yield path
+
 
-# Configuration
-API_URL = "http://127.0.0.1:8001/detect/audio-file"
-API_KEY = "hackathon-secret-key"
+def print_result(result):
+    print("\n" + "=" * 40)
+    print(f"ANALYSIS RESULT: {result['classification']}")
+    print("=" * 40)
+    print(f"Confidence:  {result['confidence'] * 100:.2f}%")
+    print(f"Explanation: {result['explanation']}")
+    print("=" * 40 + "\n")
 
-def check_voice(file_path):
+
+def check_voice(client, file_path):
     if not os.path.exists(file_path):
         print(f"Error: File '{file_path}' not found.")
-        return
-
-    print(f"Uploading '{file_path}' to {API_URL}...")
-    
-    headers = {"X-API-Key": API_KEY}
-    
+        return 1
+    print(f"Uploading '{file_path}'...")
     try:
-        with open(file_path, "rb") as f:
-            files = {"file": (os.path.basename(file_path), f, "audio/mpeg")}
-            response = requests.post(API_URL, headers=headers, files=files)
-            
-        if response.status_code == 200:
-            result = response.json()
-            print("\n" + "="*40)
-            print(f"ANALYSIS RESULT: {result['classification']}")
-            print("="*40)
-            print(f"Confidence:  {result['confidence'] * 100:.2f}%")
-            print(f"Explanation: {result['explanation']}")
-            print("="*40 + "\n")
-        else:
-            print(f"Error {response.status_code}: {response.text}")
-            
-    except requests.exceptions.ConnectionError:
+        print_result(client.detect_file(file_path))
+    except DetectorError as e:
+        print(f"Error {e.status_code}: {e.detail}")
+        return 1
+    except httpx.ConnectError:
         print("Error: Could not connect to server. Is 'python app.py' running?")
-    except Exception as e:
-        print(f"An error occurred: {e}")
+        return 1
+    return 0
+
+
+def score_many(client, paths, args):
+    out = open(args.out, "w") if args.out else sys.stdout
+    counts, started = {}, time.perf_counter()
+    try:
+        for path, result in client.detect_many(paths, batch_size=args.batch_size, chunked=args.chunked):
+            counts[result["classification"]] = counts.get(result["classification"], 0) + 1
+            out.write(json.dumps({"path": path, **result}) + "\n")
+            out.flush()
+    finally:
+        if args.out:
+            out.close()
+    elapsed = time.perf_counter() - started
+    summary = {"files": len(paths), "seconds": round(elapsed, 2),
+               "files_per_s": round(len(paths) / elapsed, 2) if elapsed else None,
+               "classifications": counts, "batch_api": client.batch_supported}
+    print(json.dumps(summary), file=sys.stderr)
+    return 1 if counts.get("ERROR") else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("paths", nargs="+", help="Audio files and/or directories")
+    parser.add_argument("--url", default=DEFAULT_URL, help="API base URL (default: DETECTOR_URL or %(default)s)")
+    parser.add_argument("--api-key", default=DEFAULT_API_KEY)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Requests in flight")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="Files per /detect/batch request; 1 uploads each file on its own")
+    parser.add_argument("--chunked", action="store_true", default=None, help="Force windowed inference")
+    parser.add_argument("--out", default=None, help="Write the JSON lines here instead of stdout")
+    args = parser.parse_args()
+
+    with Client(args.url, api_key=args.api_key, concurrency=args.concurrency) as client:
+        if len(args.paths) == 1 and not os.path.isdir(args.paths[0]):
+            return check_voice(client, args.paths[0])
+        paths = list(expand(args.paths))
+        if not paths:
+            print("Error: no audio files found.", file=sys.stderr)
+            return 1
+        return score_many(client, paths, args)
+
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python client.py <path_to_audio_file>")
-        print("Example: python client.py test_audio.mp3")
-    else:
-        check_voice(sys.argv[1])
+    sys.exit(main())
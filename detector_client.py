@@ -0,0 +1,347 @@
+"""
+Python client for the voice detector API, sync (Client) and asyncio (AsyncClient).
+
+    with Client("http://127.0.0.1:7860", api_key="...") as client:
+        client.detect_file("clip.mp3")
+        for path, result in client.detect_many(paths):
+            ...
+
+Both keep one pooled keep-alive connection per concurrent request, cap the number
+of requests in flight, and retry 429 / 503 answers (honouring Retry-After) and
+dropped connections with jittered exponential backoff. Files are streamed from
+disk as multipart uploads, never read into memory whole. detect_many() sends
+groups of files to /detect/batch and falls back to one /detect/audio-file call per
+file against servers without it; a file that can't be scored yields an ERROR
+result instead of raising, so one bad clip doesn't stop a directory.
+"""
+import asyncio
+import contextlib
+import json
+import mimetypes
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import httpx
+
+DEFAULT_URL = os.environ.get("DETECTOR_URL", "http://127.0.0.1:7860")
+DEFAULT_API_KEY = os.environ.get("API_KEY", "hackathon-secret-key")
+DEFAULT_CONCURRENCY = 8
+DEFAULT_BATCH_SIZE = 16          # files per /detect/batch request (the server caps at BATCH_MAX_ITEMS)
+DEFAULT_RETRIES = 4
+DEFAULT_BACKOFF_S = 0.5
+MAX_BACKOFF_S = 30.0
+DEFAULT_TIMEOUT_S = 120.0
+
+RETRY_STATUSES = (429, 503)
+# Failures where the request never reached the model; detection is idempotent anyway
+RETRY_EXCEPTIONS = (httpx.ConnectError, httpx.RemoteProtocolError, httpx.PoolTimeout)
+
+
+class DetectorError(Exception):
+    """The API answered with an error status (after retries, for retryable ones)"""
+
+    def __init__(self, status_code, detail):
+        super().__init__(f"{status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+def error_result(error, status_code=None):
+    """Same shape as the server's ERROR results, for files the client couldn't get scored"""
+    result = {"classification": "ERROR", "confidence": 0.0, "explanation": str(error)}
+    if status_code is not None:
+        result["status_code"] = status_code
+    return result
+
+
+def backoff_delay(attempt, backoff_s, retry_after=None):
+    """Full-jitter exponential backoff, never shorter than the server's Retry-After"""
+    delay = random.uniform(0, min(MAX_BACKOFF_S, backoff_s * 2 ** attempt))
+    if retry_after:
+        try:
+            delay += float(retry_after)
+        except ValueError:
+            pass
+    return delay
+
+
+def upload(path, field="file"):
+    """Multipart entry streaming `path` from disk; the caller closes the file"""
+    mime = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    return field, (os.path.basename(path), open(path, "rb"), mime)
+
+
+def check(response):
+    if response.status_code >= 400:
+        try:
+            detail = response.json().get("detail", response.text)
+        except ValueError:
+            detail = response.text
+        raise DetectorError(response.status_code, detail)
+
+
+def batch_results(paths, lines):
+    """Map /detect/batch NDJSON lines back to paths; clips missing from a cut-short stream are errors"""
+    seen = set()
+    for line in lines:
+        if not line.strip():
+            continue
+        result = json.loads(line)
+        index = result.pop("index")
+        result.pop("filename", None)
+        seen.add(index)
+        yield paths[index], result
+    for index, path in enumerate(paths):
+        if index not in seen:
+            yield path, error_result("No result in batch response")
+
+
+def chunks(paths, size):
+    return [paths[i:i + size] for i in range(0, len(paths), size)]
+
+
+def readable(paths):
+    """Split off paths that can't be opened, so one of them doesn't fail a whole batch"""
+    ok, missing = [], []
+    for path in paths:
+        (ok if os.path.isfile(path) and os.access(path, os.R_OK) else missing).append(path)
+    return ok, [(path, error_result(f"Cannot read '{path}'")) for path in missing]
+
+
+class BaseClient:
+    def __init__(self, base_url=DEFAULT_URL, api_key=DEFAULT_API_KEY, concurrency=DEFAULT_CONCURRENCY,
+                 retries=DEFAULT_RETRIES, backoff_s=DEFAULT_BACKOFF_S, timeout=DEFAULT_TIMEOUT_S,
+                 request_timeout=None):
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff_s = backoff_s
+        # None until the first detect_many() finds out whether /detect/batch exists
+        self.batch_supported = None
+        headers = {"X-API-Key": api_key}
+        if request_timeout is not None:
+            headers["X-Request-Timeout"] = str(request_timeout)
+        self._options = {
+            "base_url": base_url.rstrip("/"),
+            "headers": headers,
+            "timeout": timeout,
+            "limits": httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+        }
+
+    @staticmethod
+    def _params(chunked, include_segments):
+        params = {"include_segments": str(include_segments).lower()}
+        if chunked is not None:
+            params["chunked"] = str(chunked).lower()
+        return params
+
+
+class Client(BaseClient):
+    """Thread-safe; detect_many() runs up to `concurrency` requests on a thread pool"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._http = httpx.Client(**self._options)
+
+    def _send(self, method, url, files=(), **kwargs):
+        """Send with retries; `files` are (field, path) pairs, reopened for every attempt"""
+        for attempt in range(self.retries + 1):
+            with contextlib.ExitStack() as stack:
+                entries = [upload(path, field) for field, path in files]
+                for _, (_, f, _) in entries:
+                    stack.callback(f.close)
+                try:
+                    response = self._http.request(method, url, files=entries or None, **kwargs)
+                except RETRY_EXCEPTIONS:
+                    if attempt == self.retries:
+                        raise
+                    retry_after = None
+                else:
+                    if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                        check(response)
+                        return response
+                    retry_after = response.headers.get("Retry-After")
+            time.sleep(backoff_delay(attempt, self.backoff_s, retry_after))
+
+    def detect_file(self, path, chunked=None, include_segments=False):
+        response = self._send("POST", "/detect/audio-file", files=[("file", path)],
+                              params=self._params(chunked, include_segments))
+        return response.json()
+
+    def detect_base64(self, audio_base64, chunked=None, include_segments=False):
+        response = self._send("POST", "/detect", json={"audio_base64": audio_base64, "chunked": chunked,
+                                                       "include_segments": include_segments})
+        return response.json()
+
+    def detect_batch(self, paths, chunked=None, include_segments=False):
+        """[(path, result)] for one /detect/batch request"""
+        response = self._send("POST", "/detect/batch", files=[("files", path) for path in paths],
+                              params=self._params(chunked, include_segments))
+        return list(batch_results(paths, response.text.splitlines()))
+
+    def _try_batch(self, paths, chunked, include_segments):
+        """detect_batch() with failures as ERROR results; None if the server has no /detect/batch"""
+        paths, failed = readable(paths)
+        if not paths:
+            return failed
+        try:
+            results = self.detect_batch(paths, chunked, include_segments)
+        except DetectorError as e:
+            if e.status_code in (404, 405):
+                self.batch_supported = False
+                return None
+            return failed + [(path, error_result(e.detail, e.status_code)) for path in paths]
+        except (httpx.HTTPError, OSError) as e:
+            return failed + [(path, error_result(e)) for path in paths]
+        self.batch_supported = True
+        return failed + results
+
+    def _detect_one(self, path, chunked, include_segments):
+        try:
+            return [(path, self.detect_file(path, chunked, include_segments))]
+        except DetectorError as e:
+            return [(path, error_result(e.detail, e.status_code))]
+        except (httpx.HTTPError, OSError) as e:
+            return [(path, error_result(e))]
+
+    def _detect_group(self, paths, chunked, include_segments):
+        results = self._try_batch(paths, chunked, include_segments)
+        if results is None:
+            results = [item for path in paths for item in self._detect_one(path, chunked, include_segments)]
+        return results
+
+    def detect_many(self, paths, batch_size=DEFAULT_BATCH_SIZE, chunked=None, include_segments=False):
+        """Yield (path, result) for every path, in completion order"""
+        groups = chunks(list(paths), max(batch_size, 1))
+        use_batch = batch_size > 1 and self.batch_supported is not False
+        if use_batch and self.batch_supported is None and groups:
+            # The first group finds out whether /detect/batch exists before fanning out
+            results = self._try_batch(groups[0], chunked, include_segments)
+            if results is not None:
+                yield from results
+                groups = groups[1:]
+            use_batch = self.batch_supported
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            if use_batch:
+                futures = [executor.submit(self._detect_group, group, chunked, include_segments)
+                           for group in groups]
+            else:
+                futures = [executor.submit(self._detect_one, path, chunked, include_segments)
+                           for group in groups for path in group]
+            for future in as_completed(futures):
+                yield from future.result()
+
+    def close(self):
+        self._http.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class AsyncClient(BaseClient):
+    """asyncio variant; at most `concurrency` requests are in flight across all calls"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._http = httpx.AsyncClient(**self._options)
+        self._slots = asyncio.Semaphore(self.concurrency)
+
+    async def _send(self, method, url, files=(), **kwargs):
+        for attempt in range(self.retries + 1):
+            # Files are opened only once a slot is free, so thousands of queued jobs hold no descriptors
+            async with self._slots:
+                with contextlib.ExitStack() as stack:
+                    entries = [upload(path, field) for field, path in files]
+                    for _, (_, f, _) in entries:
+                        stack.callback(f.close)
+                    try:
+                        response = await self._http.request(method, url, files=entries or None, **kwargs)
+                    except RETRY_EXCEPTIONS:
+                        if attempt == self.retries:
+                            raise
+                        retry_after = None
+                    else:
+                        if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                            check(response)
+                            return response
+                        retry_after = response.headers.get("Retry-After")
+            await asyncio.sleep(backoff_delay(attempt, self.backoff_s, retry_after))
+
+    async def detect_file(self, path, chunked=None, include_segments=False):
+        response = await self._send("POST", "/detect/audio-file", files=[("file", path)],
+                                    params=self._params(chunked, include_segments))
+        return response.json()
+
+    async def detect_base64(self, audio_base64, chunked=None, include_segments=False):
+        response = await self._send("POST", "/detect", json={"audio_base64": audio_base64, "chunked": chunked,
+                                                             "include_segments": include_segments})
+        return response.json()
+
+    async def detect_batch(self, paths, chunked=None, include_segments=False):
+        response = await self._send("POST", "/detect/batch", files=[("files", path) for path in paths],
+                                    params=self._params(chunked, include_segments))
+        return list(batch_results(paths, response.text.splitlines()))
+
+    async def _try_batch(self, paths, chunked, include_segments):
+        paths, failed = readable(paths)
+        if not paths:
+            return failed
+        try:
+            results = await self.detect_batch(paths, chunked, include_segments)
+        except DetectorError as e:
+            if e.status_code in (404, 405):
+                self.batch_supported = False
+                return None
+            return failed + [(path, error_result(e.detail, e.status_code)) for path in paths]
+        except (httpx.HTTPError, OSError) as e:
+            return failed + [(path, error_result(e)) for path in paths]
+        self.batch_supported = True
+        return failed + results
+
+    async def _detect_one(self, path, chunked, include_segments):
+        try:
+            return [(path, await self.detect_file(path, chunked, include_segments))]
+        except DetectorError as e:
+            return [(path, error_result(e.detail, e.status_code))]
+        except (httpx.HTTPError, OSError) as e:
+            return [(path, error_result(e))]
+
+    async def _detect_group(self, paths, chunked, include_segments):
+        results = await self._try_batch(paths, chunked, include_segments)
+        if results is None:
+            singles = await asyncio.gather(*(self._detect_one(path, chunked, include_segments) for path in paths))
+            results = [item for items in singles for item in items]
+        return results
+
+    async def detect_many(self, paths, batch_size=DEFAULT_BATCH_SIZE, chunked=None, include_segments=False):
+        """Async generator of (path, result) for every path, in completion order"""
+        groups = chunks(list(paths), max(batch_size, 1))
+        use_batch = batch_size > 1 and self.batch_supported is not False
+        if use_batch and self.batch_supported is None and groups:
+            results = await self._try_batch(groups[0], chunked, include_segments)
+            if results is not None:
+                for item in results:
+                    yield item
+                groups = groups[1:]
+            use_batch = self.batch_supported
+        if use_batch:
+            jobs = [self._detect_group(group, chunked, include_segments) for group in groups]
+        else:
+            jobs = [self._detect_one(path, chunked, include_segments) for group in groups for path in group]
+        # Every job is scheduled at once; the semaphore in _send bounds what is in flight
+        for next_done in asyncio.as_completed(jobs):
+            for item in await next_done:
+                yield item
+
+    async def aclose(self):
+        await self._http.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
@@ -0,0 +1,353 @@
+import os
+import threading
+
+import torch
+from torch import nn
+
+from backends import read_json, write_json
+from embedding_index import DEFAULT_MATCH_THRESHOLD
+from metrics import stage
+from profiles import forward_context
+
+# Files of an exit-heads directory (written by calibrate_exits.py)
+HEADS_FILE = "exit_heads.pt"
+CONFIG_FILE = "exit_heads.json"
+DEFAULT_THRESHOLD = 0.9
+
+
+class _Exit(Exception):
+    """Raised from a layer hook once every clip of the batch has its answer"""
+
+
+def masked_mean(hidden, padding_mask):
+    """Mean over the valid frames of [batch, frames, hidden] states"""
+    if padding_mask is None:
+        return hidden.mean(dim=1)
+    mask = padding_mask.unsqueeze(-1).to(hidden.dtype)
+    return (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1.0)
+
+
+class ExitHeads(nn.Module):
+    """One linear classifier per exit layer over mean-pooled encoder states"""
+
+    def __init__(self, layers, hidden_size, num_labels):
+        super().__init__()
+        self.layers = sorted(int(layer) for layer in layers)
+        self.heads = nn.ModuleDict({str(layer): nn.Linear(hidden_size, num_labels) for layer in self.layers})
+
+    def forward(self, layer, pooled):
+        return self.heads[str(layer)](pooled)
+
+
+def save_heads(directory, heads, thresholds, model_id):
+    os.makedirs(directory, exist_ok=True)
+    torch.save(heads.state_dict(), os.path.join(directory, HEADS_FILE))
+    hidden_size, num_labels = next(iter(heads.heads.values())).weight.shape[::-1]
+    write_json(directory, CONFIG_FILE, {
+        "model_id": model_id,
+        "layers": heads.layers,
+        "hidden_size": hidden_size,
+        "num_labels": num_labels,
+        "thresholds": {str(layer): thresholds[layer] for layer in heads.layers},
+    })
+
+
+def load_heads(directory):
+    """(ExitHeads, {layer: threshold}, config) from a calibrate_exits.py directory"""
+    config = read_json(directory, CONFIG_FILE)
+    heads = ExitHeads(config["layers"], config["hidden_size"], config["num_labels"])
+    heads.load_state_dict(torch.load(os.path.join(directory, HEADS_FILE), map_location="cpu"))
+    return heads.eval(), {int(layer): t for layer, t in config["thresholds"].items()}, config
+
+
+class LayerTaps:
+    """
+    Forward hooks on the encoder layers of an eager wav2vec2-style classifier.
+    Hooks only act while a call on the same thread has installed a `state`, so the
+    model can be shared with plain forward passes and other threads.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.base = model.base_model
+        self.encoder = self.base.encoder
+        self.num_layers = len(self.encoder.layers)
+        self._local = threading.local()
+        for index, layer in enumerate(self.encoder.layers):
+            layer.register_forward_hook(self._hook(index + 1))
+
+    def _hook(self, layer):
+        def hook(module, args, output):
+            state = getattr(self._local, "state", None)
+            if state is not None:
+                state(layer, output[0] if isinstance(output, tuple) else output)
+        return hook
+
+    def padding_mask(self, inputs):
+        """Frame-level validity mask matching the encoder's sequence length"""
+        attention_mask = inputs.get("attention_mask")
+        if attention_mask is None:
+            return None
+        frames = self.base._get_feat_extract_output_lengths(attention_mask.sum(-1)).long()
+        n = int(frames.max())
+        return torch.arange(n, device=frames.device)[None, :] < frames[:, None]
+
+    def run(self, inputs, state):
+        """Forward pass with `state(layer, hidden)` called after every layer; None if a hook stopped it"""
+        self._local.state = state
+        try:
+            return self.model(**inputs)
+        except _Exit:
+            return None
+        finally:
+            self._local.state = None
+
+    def pooled(self, hidden, padding_mask):
+        """The model's pooled embedding (its classifier's input) computed from a layer's states"""
+        if getattr(self.model.config, "do_stable_layer_norm", False):
+            hidden = self.encoder.layer_norm(hidden)
+        return masked_mean(self.model.projector(hidden), padding_mask)
+
+    def classify(self, hidden, padding_mask):
+        """The model's own projector + classifier over an intermediate layer's states"""
+        return self.model.classifier(self.pooled(hidden, padding_mask))
+
+    def embedding(self, layer, hidden, padding_mask):
+        """Clip embedding at `layer`: the model's pooled embedding after the last layer, mean-pooled states below"""
+        if layer == self.num_layers:
+            return self.pooled(hidden, padding_mask)
+        return masked_mean(hidden, padding_mask)
+
+
+class EarlyExit:
+    """
+    Confidence-gated early exit for the transformers backend.
+
+    After each exit layer the head of that layer scores every clip still running;
+    clips whose top probability reaches the layer's threshold keep that answer, and
+    the forward pass is abandoned as soon as the whole batch has one. `max_layers`
+    truncates the encoder: clips still undecided there take that layer's head (or,
+    without one, the model's own classifier applied to that layer).
+
+    With an embedding_index.EmbeddingIndex, clips are also looked up at the layer
+    the index was built from: a clip whose embedding is within `match_threshold`
+    cosine similarity of a known one takes that clip's label there and then.
+    Lookups see what build_index.py embedded, the clip alone, unpadded and cut
+    to the index's clip length, so with an index clips run in passes of equal
+    lengths instead of one padded pass; each of those passes goes on past the
+    index layer for the clips without a match, so a clip still runs through the
+    encoder once. Only clips longer than the index's clip length (longer than
+    the default CHUNK_THRESHOLD_S, so chunked unless forced) pay a second pass:
+    their cut is looked up in a pass stopped at the index layer.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.base = model.base_model
+        self.encoder = self.base.encoder
+        self.num_layers = len(self.encoder.layers)
+        self._local = threading.local()
+        for index, layer in enumerate(self.encoder.layers):
+            layer.register_forward_hook(self._hook(index + 1))
+
+    def _hook(self, layer):
+        def hook(module, args, output):
+            state = getattr(self._local, "state", None)
+            if state is not None:
+                state(layer, output[0] if isinstance(output, tuple) else output)
+        return hook
+
+    def padding_mask(self, inputs):
+        """Frame-level validity mask matching the encoder's sequence length"""
+        attention_mask = inputs.get("attention_mask")
+        if attention_mask is None:
+            return None
+        frames = self.base._get_feat_extract_output_lengths(attention_mask.sum(-1)).long()
+        n = int(frames.max())
+        return torch.arange(n, device=frames.device)[None, :] < frames[:, None]
+
+    def run(self, inputs, state):
+        """Forward pass with `state(layer, hidden)` called after every layer; None if a hook stopped it"""
+        self._local.state = state
+        try:
+            return self.model(**inputs)
+        except _Exit:
+            return None
+        finally:
+            self._local.state = None
+
+    def pooled(self, hidden, padding_mask):
+        """The model's pooled embedding (its classifier's input) computed from a layer's states"""
+        if getattr(self.model.config, "do_stable_layer_norm", False):
+            hidden = self.encoder.layer_norm(hidden)
+        return masked_mean(self.model.projector(hidden), padding_mask)
+
+    def classify(self, hidden, padding_mask):
+        """The model's own projector + classifier over an intermediate layer's states"""
+        return self.model.classifier(self.pooled(hidden, padding_mask))
+
+    def embedding(self, layer, hidden, padding_mask):
+        """Clip embedding at `layer`: the model's pooled embedding after the last layer, mean-pooled states below"""
+        if layer == self.num_layers:
+            return self.pooled(hidden, padding_mask)
+        return masked_mean(hidden, padding_mask)
+
+
+class EarlyExit:
+    """
+    Confidence-gated early exit for the transformers backend.
+
+    After each exit layer the head of that layer scores every clip still running;
+    clips whose top probability reaches the layer's threshold keep that answer, and
+    the forward pass is abandoned as soon as the whole batch has one. `max_layers`
+    truncates the encoder: clips still undecided there take that layer's head (or,
+    without one, the model's own classifier applied to that layer).
+
+    With an embedding_index.EmbeddingIndex, clips are also looked up at the layer
+    the index was built from: a clip whose embedding is within `match_threshold`
+    cosine similarity of a known one takes that clip's label there and then.
+    Lookups see what build_index.py embedded, the clip alone, unpadded and cut
+    to the index's clip length: the longest clips of a batch are not padded, so
+    those are looked up inside the pass; any other clip first gets a pass of its
+    own stopped at the index layer (see lookup()).
+    """
+
+    def __init__(self, backend, heads_dir=None, max_layers=0, threshold=None, index=None,
+                 match_threshold=DEFAULT_MATCH_THRESHOLD):
+        if not hasattr(backend, "feature_extractor"):
+            raise ValueError(f"Early exit needs the transformers backend, not '{backend.name}'")
+        self.backend = backend
+        self.taps = LayerTaps(backend.model)
+        self.heads, self.thresholds = None, {}
+        if heads_dir:
+            self.heads, self.thresholds, _ = load_heads(heads_dir)
+            self.heads.to(backend.device)
+            if threshold is not None:
+                self.thresholds = {layer: threshold for layer in self.thresholds}
+        num_layers = self.taps.num_layers
+        self.max_layers = min(max_layers, num_layers) if max_layers else num_layers
+        if self.heads is None and self.max_layers == num_layers and index is None:
+            raise ValueError("Early exit needs exit heads (EARLY_EXIT_PATH), EARLY_EXIT_MAX_LAYERS or an index")
+        self.exit_layers = [layer for layer in sorted(self.thresholds) if layer < self.max_layers]
+
+        self.index, self.match_threshold = index, match_threshold
+        if index is not None and not 1 <= index.layer <= self.max_layers:
+            raise ValueError(f"The index holds layer-{index.layer} embeddings; the encoder runs {self.max_layers} layers")
+        fake_index = next(idx for idx, label in backend.id2label.items()
+                          if "fake" in label.lower() or "spoof" in label.lower())
+        human_index = next(idx for idx in backend.id2label if idx != fake_index)
+        self.label_index = {"AI_GENERATED": fake_index, "HUMAN": human_index}
+
+    def describe(self):
+        """Suffix for model ids, so early-exit results never share cache entries with full ones"""
+        gates = ",".join(f"{layer}:{self.thresholds[layer]:g}" for layer in self.exit_layers)
+        suffix = f"#exit[{gates}]max{self.max_layers}"
+        if self.index is not None:
+            suffix += f"{self.index.describe()}>={self.match_threshold:g}"
+        return suffix
+
+    def verdict_logits(self, match):
+        """Logits whose softmax gives the matched label the match's similarity"""
+        probs = torch.full((len(self.backend.id2label),), 1.0 - match["similarity"])
+        probs[self.label_index[match["label"]]] = match["similarity"]
+        return probs.clamp(min=1e-6).log()
+
+    def lookup(self, waveforms):
+        """
+        Index match (or None) of each clip, from one pass over their index.clip() cuts
+        stopped at the index layer; the cuts must all have the same length (no padding)
+        """
+        taps, found = self.taps, []
+
+        def state(layer, hidden):
+            if layer == self.index.layer:
+                found.extend(self.index.match(taps.embedding(layer, hidden, None).float().cpu().numpy(),
+                                              self.match_threshold))
+                raise _Exit()
+
+        with self.backend.prepare([self.index.clip(y) for y in waveforms]) as inputs, stage("index_lookup"), \
+                forward_context(self.backend.profile, self.backend.device.type):
+            taps.run(inputs, state)
+        return found
+
+    def logits(self, waveforms, lookup=True):
+        """
+        (logits [batch, labels], number of encoder layers that decided each clip,
+        index match of each clip or None). `lookup=False` skips the index, for
+        inputs that are not the unit it holds (chunked windows).
+        """
+        batch = len(waveforms)
+        logits = [None] * batch
+        decided_by = [self.taps.num_layers] * batch
+        matches = [None] * batch
+        if self.index is None or not lookup:
+            self._run(waveforms, list(range(batch)), logits, decided_by, matches)
+        else:
+            clip_samples = self.index.clip_samples
+            same_length = {}
+            for i, y in enumerate(waveforms):
+                if len(y) <= clip_samples:
+                    same_length.setdefault(len(y), []).append(i)
+            for positions in same_length.values():
+                self._run(waveforms, positions, logits, decided_by, matches, lookup=True)
+            longer = [i for i, y in enumerate(waveforms) if len(y) > clip_samples]
+            if longer:
+                for i, match in zip(longer, self.lookup([waveforms[i] for i in longer])):
+                    if match is not None:
+                        logits[i], decided_by[i], matches[i] = self.verdict_logits(match), self.index.layer, match
+                self._run(waveforms, [i for i in longer if logits[i] is None], logits, decided_by, matches)
+        return torch.stack([row.float().cpu() for row in logits]), decided_by, matches
+
+    def _run(self, waveforms, positions, logits, decided_by, matches, lookup=False):
+        """
+        One early-exit pass over the clips at `positions` (padded to the longest), filling
+        in their entries of logits / decided_by / matches; `lookup` looks them all up at
+        the index layer, which is only right for clips of one length within the index's
+        """
+        if not positions:
+            return
+        backend, taps = self.backend, self.taps
+        exit_layers, heads = set(self.exit_layers), self.heads
+        index_layer = self.index.layer if lookup else None
+        # The last layer of a truncated encoder decides every clip still open
+        cut = self.max_layers if self.max_layers < taps.num_layers else None
+
+        def open_rows():
+            rows = [row for row, i in enumerate(positions) if logits[i] is None]
+            return rows, padding_mask[rows] if padding_mask is not None else None
+
+        def state(layer, hidden):
+            if layer == index_layer:
+                rows, mask = open_rows()
+                if rows:
+                    with stage("index_lookup"):
+                        found = self.index.match(taps.embedding(layer, hidden[rows], mask).float().cpu().numpy(),
+                                                 self.match_threshold)
+                    for row, match in zip(rows, found):
+                        if match is not None:
+                            i = positions[row]
+                            logits[i], decided_by[i], matches[i] = self.verdict_logits(match), layer, match
+            if layer in exit_layers or layer == cut:
+                rows, mask = open_rows()
+                if rows:
+                    if heads is not None and layer in heads.layers:
+                        layer_logits = heads(layer, masked_mean(hidden[rows], mask))
+                    else:
+                        layer_logits = taps.classify(hidden[rows], mask)
+                    confident = layer_logits.softmax(-1).max(-1).values >= self.thresholds.get(layer, 1.0)
+                    for k, row in enumerate(rows):
+                        if layer == cut or confident[k]:
+                            logits[positions[row]], decided_by[positions[row]] = layer_logits[k], layer
+            if all(logits[i] is not None for i in positions):
+                raise _Exit()
+
+        # The padded inputs live in the backend's reused buffers until the pass is over
+        with backend.prepare([waveforms[i] for i in positions]) as inputs, stage("forward"), \
+                forward_context(backend.profile, backend.device.type):
+            padding_mask = taps.padding_mask(inputs)
+            output = taps.run(inputs, state)
+            if output is not None:
+                # The pass went all the way: the model's own head answers for clips still open
+                for row, i in enumerate(positions):
+                    if logits[i] is None:
+                        logits[i] = output.logits[row]
@@ -0,0 +1,320 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+from audio import SAMPLE_RATE
+from backends import read_json
+
+# Files of an index directory (written by build_index.py)
+META_FILE = "index.json"
+VECTORS_FILE = "vectors.f16"      # [count, dim] float16, unit length
+ENTRIES_FILE = "entries.jsonl"    # one {"id", "label"} per row
+IVF_FILE = "ivf.npz"              # coarse centroids + PQ codebooks
+LISTS_FILE = "ivf_lists.u16"      # [count] inverted list of every row
+CODES_FILE = "ivf_codes.u8"       # [count, subvectors] PQ codes of the residuals
+
+LABELS = ("HUMAN", "AI_GENERATED")
+
+# Defaults (overridable through environment variables in inference.py / build_index.py flags)
+DEFAULT_MATCH_THRESHOLD = 0.95
+DEFAULT_TOP_K = 5
+DEFAULT_NLIST = 1024
+DEFAULT_NPROBE = 16
+DEFAULT_SUBVECTORS = 32
+# Clips are embedded (and looked up) over at most their first this many seconds
+DEFAULT_CLIP_SECONDS = 30.0
+# IVF/PQ candidates re-scored against the exact float16 vectors
+DEFAULT_RERANK = 64
+# Rows converted to float32 at a time by the flat search and encoders
+BLOCK_ROWS = 65536
+KMEANS_ITERATIONS = 15
+KMEANS_SAMPLE = 65536
+PQ_CENTROIDS = 256
+
+
+def normalize(vectors):
+    """[n, dim] float32 rows scaled to unit length, so inner products are cosine similarities"""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def top_k(scores, k):
+    """(scores, columns) of the k largest entries of every row of [n, m] scores, best first"""
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return scores[:, :0], np.zeros((len(scores), 0), dtype=np.int64)
+    cols = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    picked = np.take_along_axis(scores, cols, axis=1)
+    order = np.argsort(-picked, axis=1, kind="stable")
+    return np.take_along_axis(picked, order, axis=1), np.take_along_axis(cols, order, axis=1)
+
+
+def nearest(data, centroids):
+    """Index of the closest centroid (squared L2) for every row of `data`"""
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    out = np.empty(len(data), dtype=np.int64)
+    for start in range(0, len(data), BLOCK_ROWS):
+        block = np.asarray(data[start:start + BLOCK_ROWS], dtype=np.float32)
+        out[start:start + len(block)] = np.argmin(centroid_norms[None, :] - 2.0 * block @ centroids.T, axis=1)
+    return out
+
+
+def kmeans(data, k, iterations=KMEANS_ITERATIONS, seed=0):
+    """Lloyd's k-means on float32 rows; clusters that empty out are re-seeded from random rows"""
+    rng = np.random.default_rng(seed)
+    k = min(k, len(data))
+    centroids = data[rng.choice(len(data), k, replace=False)].copy()
+    for _ in range(iterations):
+        assign = nearest(data, centroids)
+        counts = np.bincount(assign, minlength=k)
+        empty = counts == 0
+        # Per-cluster sums as segment sums over the rows sorted by cluster
+        order = np.argsort(assign, kind="stable")
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[~empty]
+        centroids[~empty] = np.add.reduceat(data[order], starts, axis=0) / counts[~empty, None]
+        centroids[empty] = data[rng.choice(len(data), int(empty.sum()))]
+    return centroids
+
+
+class IVFPQ:
+    """
+    Inverted-file partitioning with product-quantized residuals.
+
+    Every vector belongs to the list of its nearest coarse centroid and is stored
+    as one byte per sub-vector: the nearest of 256 centroids of its residual in
+    that subspace. A query scans only the `nprobe` lists closest to it, scores
+    those rows from per-subspace lookup tables, and re-scores the best `rerank`
+    of them against the exact vectors.
+    """
+
+    def __init__(self, centroids, codebooks, lists, codes):
+        self.centroids = centroids          # [nlist, dim]
+        self.codebooks = codebooks          # [subvectors, 256, dim / subvectors]
+        self.lists = lists
+        self.codes = codes
+        # Rows grouped by list: rows of list l are order[offsets[l]:offsets[l + 1]]
+        self.order = np.argsort(lists, kind="stable")
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(lists, minlength=len(centroids)))))
+
+    @staticmethod
+    def train(vectors, nlist, subvectors, sample=KMEANS_SAMPLE, seed=0):
+        """(coarse centroids, PQ codebooks) fitted on up to `sample` rows of `vectors`"""
+        dim = vectors.shape[1]
+        if dim % subvectors:
+            raise ValueError(f"{subvectors} sub-vectors do not divide the embedding size {dim}")
+        rng = np.random.default_rng(seed)
+        rows = np.sort(rng.choice(len(vectors), min(sample, len(vectors)), replace=False))
+        data = np.asarray(vectors[rows], dtype=np.float32)
+        centroids = kmeans(data, nlist, seed=seed)
+        residuals = (data - centroids[nearest(data, centroids)]).reshape(len(data), subvectors, -1)
+        codebooks = np.stack([kmeans(residuals[:, m], PQ_CENTROIDS, seed=seed + m) for m in range(subvectors)])
+        return centroids, codebooks
+
+    @staticmethod
+    def encode(vectors, centroids, codebooks):
+        """(list [n] uint16, codes [n, subvectors] uint8) of unit-length float32 rows"""
+        lists = nearest(vectors, centroids)
+        residuals = (vectors - centroids[lists]).reshape(len(vectors), len(codebooks), -1)
+        codes = np.stack([nearest(residuals[:, m], codebooks[m]) for m in range(len(codebooks))], axis=1)
+        return lists.astype(np.uint16), codes.astype(np.uint8)
+
+    def candidates(self, query, nprobe, rerank):
+        """Up to `rerank` rows with the highest approximate inner product with one query"""
+        coarse = self.centroids @ query
+        probes = np.argpartition(-coarse, min(nprobe, len(coarse)) - 1)[:nprobe]
+        rows = np.concatenate([self.order[self.offsets[p]:self.offsets[p + 1]] for p in probes])
+        if len(rows) <= rerank:
+            return rows
+        subvectors = len(self.codebooks)
+        table = np.einsum("mcd,md->mc", self.codebooks, query.reshape(subvectors, -1))
+        approx = coarse[self.lists[rows]] + table[np.arange(subvectors), self.codes[rows]].sum(axis=1)
+        return rows[np.argpartition(-approx, rerank - 1)[:rerank]]
+
+
+class EmbeddingIndex:
+    """
+    On-disk index of labeled clip embeddings for near-duplicate lookups.
+
+    Vectors are unit-length float16 rows in a memory-mapped file, so opening an
+    index costs no more than reading its ids and the OS pages vectors in as
+    searches touch them. Searches are exact (blocked inner products over every
+    row) unless the index was partitioned with train_ivf(), in which case they go
+    through IVFPQ. `layer` is the encoder layer the embeddings were pooled from
+    (see VoiceDetector.embed), `model_id` the model that produced them and
+    `clip_seconds` the length every clip was cut to (see clip()).
+    """
+
+    def __init__(self, directory, nprobe=None, rerank=DEFAULT_RERANK):
+        self.directory = directory
+        self.rerank = rerank
+        self._lock = threading.Lock()
+        self._open()
+        self.nprobe = nprobe or (self.meta["ivf"] or {}).get("nprobe", DEFAULT_NPROBE)
+
+    @classmethod
+    def create(cls, directory, dim, layer, model_id, clip_seconds=DEFAULT_CLIP_SECONDS):
+        """Empty index at `directory`, which must not already hold one"""
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(os.path.join(directory, META_FILE)):
+            raise FileExistsError(f"{directory} already holds an embedding index")
+        for name in (VECTORS_FILE, ENTRIES_FILE):
+            open(os.path.join(directory, name), "wb").close()
+        _write_meta(directory, {"model_id": model_id, "layer": layer, "dim": dim, "clip_seconds": clip_seconds,
+                                "count": 0, "ivf": None})
+        return cls(directory)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _memmap(self, name, dtype, shape):
+        if shape[0] == 0:
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(self._path(name), dtype=dtype, mode="r", shape=shape)
+
+    def _open(self):
+        # `count` in the metadata is authoritative: rows past it are leftovers of an interrupted add()
+        self.meta = read_json(self.directory, META_FILE)
+        self.dim, self.layer, self.model_id = self.meta["dim"], self.meta["layer"], self.meta["model_id"]
+        self.clip_samples = int(self.meta.get("clip_seconds", DEFAULT_CLIP_SECONDS) * SAMPLE_RATE)
+        self.ids, self.labels, self._entries_bytes = [], [], 0
+        with open(self._path(ENTRIES_FILE), "rb") as f:
+            for line, _ in zip(f, range(self.meta["count"])):
+                entry = json.loads(line)
+                self.ids.append(entry["id"])
+                self.labels.append(entry["label"])
+                self._entries_bytes += len(line)
+        self._map()
+
+    def _map(self):
+        """(Re)map the row arrays for the current count"""
+        count = self.meta["count"]
+        self.vectors = self._memmap(VECTORS_FILE, np.float16, (count, self.dim))
+        self.ivf = None
+        if self.meta["ivf"]:
+            params = np.load(self._path(IVF_FILE))
+            lists = self._memmap(LISTS_FILE, np.uint16, (count,))
+            codes = self._memmap(CODES_FILE, np.uint8, (count, len(params["codebooks"])))
+            self.ivf = IVFPQ(params["centroids"], params["codebooks"], np.asarray(lists), codes)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def clip(self, y):
+        """The part of a waveform the index embeds: its first `clip_seconds`, always unpadded"""
+        return y[:self.clip_samples]
+
+    def add(self, embeddings, ids, labels):
+        """Append embeddings (normalized here) with their clip ids and classifications"""
+        vectors = normalize(embeddings)
+        ids, labels = [str(i) for i in ids], list(labels)
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Embeddings have {vectors.shape[1]} dimensions, the index {self.dim}")
+        if not len(vectors) == len(ids) == len(labels):
+            raise ValueError("Need one id and one label per embedding")
+        unknown = set(labels) - set(LABELS)
+        if unknown:
+            raise ValueError(f"Unknown labels {sorted(unknown)}; expected {LABELS}")
+        with self._lock:
+            if len(set(ids)) != len(ids):
+                raise ValueError("Duplicate ids within the added embeddings")
+            duplicates = set(ids).intersection(self.ids)
+            if duplicates:
+                raise ValueError(f"Duplicate ids: {sorted(duplicates)[:5]}")
+            count = len(self)
+            self._append(VECTORS_FILE, count * self.dim * 2, vectors.astype(np.float16).tobytes())
+            entries = "".join(json.dumps({"id": i, "label": label}) + "\n" for i, label in zip(ids, labels)).encode()
+            self._append(ENTRIES_FILE, self._entries_bytes, entries)
+            if self.ivf is not None:
+                lists, codes = IVFPQ.encode(vectors, self.ivf.centroids, self.ivf.codebooks)
+                self._append(LISTS_FILE, count * 2, lists.tobytes())
+                self._append(CODES_FILE, count * codes.shape[1], codes.tobytes())
+            self.meta = {**self.meta, "count": count + len(ids)}
+            _write_meta(self.directory, self.meta)
+            self.ids.extend(ids)
+            self.labels.extend(labels)
+            self._entries_bytes += len(entries)
+            self._map()
+
+    def _append(self, name, offset, data):
+        with open(self._path(name), "r+b") as f:
+            f.seek(offset)
+            f.write(data)
+            f.truncate()
+
+    def train_ivf(self, nlist=DEFAULT_NLIST, subvectors=DEFAULT_SUBVECTORS, nprobe=DEFAULT_NPROBE,
+                  sample=KMEANS_SAMPLE, seed=0):
+        """Partition the index (IVFPQ) over its current rows; later add()s are encoded as they come"""
+        with self._lock:
+            if len(self) < PQ_CENTROIDS:
+                raise ValueError(f"Need at least {PQ_CENTROIDS} entries to train IVF/PQ, have {len(self)}")
+            centroids, codebooks = IVFPQ.train(self.vectors, nlist, subvectors, sample, seed)
+            lists, codes = [], []
+            for start in range(0, len(self), BLOCK_ROWS):
+                block = np.asarray(self.vectors[start:start + BLOCK_ROWS], dtype=np.float32)
+                block_lists, block_codes = IVFPQ.encode(block, centroids, codebooks)
+                lists.append(block_lists)
+                codes.append(block_codes)
+            np.savez(self._path(IVF_FILE), centroids=centroids, codebooks=codebooks)
+            np.concatenate(lists).tofile(self._path(LISTS_FILE))
+            np.concatenate(codes).tofile(self._path(CODES_FILE))
+            ivf = {"nlist": len(centroids), "subvectors": subvectors, "nprobe": nprobe}
+            self.meta = {**self.meta, "ivf": ivf}
+            _write_meta(self.directory, self.meta)
+            self._map()
+            self.nprobe = nprobe
+
+    def search(self, queries, k=DEFAULT_TOP_K, exact=False):
+        """
+        (similarities [queries, k], rows [queries, k]) of the nearest entries, best first.
+        Short rows (fewer than k entries reachable) are padded with -inf / -1.
+        """
+        queries = normalize(queries)
+        if self.ivf is not None and not exact:
+            results = [self._search_ivf(query, k) for query in queries]
+            return np.stack([r[0] for r in results]), np.stack([r[1] for r in results])
+        return self._search_flat(queries, k)
+
+    def _search_flat(self, queries, k):
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        rows = np.full((len(queries), k), -1, dtype=np.int64)
+        for start in range(0, len(self), BLOCK_ROWS):
+            block = np.asarray(self.vectors[start:start + BLOCK_ROWS], dtype=np.float32)
+            block_scores, block_rows = top_k(queries @ block.T, k)
+            merged = np.concatenate([scores, block_scores], axis=1)
+            merged_rows = np.concatenate([rows, block_rows + start], axis=1)
+            scores, cols = top_k(merged, k)
+            rows = np.take_along_axis(merged_rows, cols, axis=1)
+        return scores, rows
+
+    def _search_ivf(self, query, k):
+        scores = np.full(k, -np.inf, dtype=np.float32)
+        rows = np.full(k, -1, dtype=np.int64)
+        candidates = np.sort(self.ivf.candidates(query, self.nprobe, max(k, self.rerank)))
+        if len(candidates):
+            exact = np.asarray(self.vectors[candidates], dtype=np.float32) @ query
+            best, cols = top_k(exact[None, :], k)
+            scores[:best.shape[1]], rows[:best.shape[1]] = best[0], candidates[cols[0]]
+        return scores, rows
+
+    def match(self, queries, threshold=DEFAULT_MATCH_THRESHOLD):
+        """Per query: {"id", "label", "similarity"} of its nearest entry if that is at least `threshold`, else None"""
+        if not len(self):
+            return [None] * len(np.atleast_2d(queries))
+        scores, rows = self.search(queries, 1)
+        return [{"id": self.ids[row], "label": self.labels[row], "similarity": round(float(score), 4)}
+                if row >= 0 and score >= threshold else None
+                for score, row in zip(scores[:, 0], rows[:, 0])]
+
+    def describe(self):
+        """Suffix for model ids: results that used the index depend on what it held when loaded"""
+        return f"#index[{os.path.basename(os.path.normpath(self.directory))}:{len(self)}@L{self.layer}]"
+
+
+def _write_meta(directory, meta):
+    # Written aside and renamed, so a reader never sees half a file and `count` only moves once the rows are there
+    path = os.path.join(directory, META_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(path + ".tmp", path)
@@ -0,0 +1,85 @@
+"""
+Tune the cascade's uncertainty band against accuracy on a labeled folder.
+
+    python evaluate_cascade.py --data fixtures/ --screener-path exported/dualpath
+                               [--model-path DIR] [--bands 0.2:0.8 0.1:0.9] [--tolerance 0.01]
+
+`--data` is a labeled folder (real/ and fake/ sub-folders, see labeled_data.py).
+Every clip is scored once by the screener and once by the full model; each band is
+then simulated offline: clips whose screener fake probability lies inside the band
+take the full model's answer. The report lists accuracy, escalation rate and the
+expected per-clip latency of each band next to the full model alone, and recommends
+the cheapest band whose accuracy is within `--tolerance` of the full model.
+"""
+import argparse
+import json
+
+import numpy as np
+
+from audio import load_audio
+from check_profiles import score
+from inference import CASCADE_SCREENER_BACKEND, VoiceDetector
+from labeled_data import iter_labeled_folder
+
+DEFAULT_BANDS = ("0.5:0.5", "0.4:0.6", "0.3:0.7", "0.2:0.8", "0.1:0.9", "0.05:0.95")
+
+
+def parse_band(text):
+    low, high = (float(v) for v in text.split(":"))
+    if not 0.0 <= low <= high <= 1.0:
+        raise argparse.ArgumentTypeError(f"Invalid band '{text}', expected LOW:HIGH with 0 <= LOW <= HIGH <= 1")
+    return low, high
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--data", required=True, help="Labeled folder with real/ and fake/ sub-folders")
+    parser.add_argument("--screener-path", required=True, help="Screener artifact directory (export_model.py)")
+    parser.add_argument("--screener-backend", default=CASCADE_SCREENER_BACKEND)
+    parser.add_argument("--model-path", default=None, help="Local model directory (defaults to MODEL_PATH / hub)")
+    parser.add_argument("--bands", nargs="+", type=parse_band, default=[parse_band(b) for b in DEFAULT_BANDS],
+                        help="Bands to evaluate as LOW:HIGH screener fake probabilities")
+    parser.add_argument("--tolerance", type=float, default=0.01, help="Allowed accuracy drop vs the full model")
+    args = parser.parse_args()
+
+    clips = list(iter_labeled_folder(args.data))
+    waveforms = [load_audio(open(path, "rb").read()) for path, _ in clips]
+    is_fake = np.array([label == "AI_GENERATED" for _, label in clips])
+    print(f"Loaded {len(clips)} clips from {args.data}")
+
+    screener_probs, screener_ms = score(
+        VoiceDetector(model_path=args.screener_path, backend=args.screener_backend), waveforms)
+    full_probs, full_ms = score(VoiceDetector(model_path=args.model_path), waveforms)
+    full_accuracy = float(np.mean((full_probs >= 0.5) == is_fake))
+
+    bands = []
+    for low, high in args.bands:
+        escalated = (screener_probs >= low) & (screener_probs <= high)
+        fake_probs = np.where(escalated, full_probs, screener_probs)
+        escalation_rate = float(np.mean(escalated))
+        latency_ms = screener_ms + escalation_rate * full_ms
+        bands.append({
+            "band": [low, high],
+            "accuracy": round(float(np.mean((fake_probs >= 0.5) == is_fake)), 4),
+            "escalation_rate": round(escalation_rate, 4),
+            "mean_latency_ms": round(latency_ms, 2),
+            "speedup": round(full_ms / latency_ms, 2),
+        })
+    for band in bands:
+        band["within_tolerance"] = band["accuracy"] >= full_accuracy - args.tolerance
+    eligible = [band for band in bands if band["within_tolerance"]]
+    recommended = min(eligible, key=lambda band: band["mean_latency_ms"])["band"] if eligible else None
+
+    print(json.dumps({
+        "clips": len(clips),
+        "tolerance": args.tolerance,
+        "screener": {"accuracy": round(float(np.mean((screener_probs >= 0.5) == is_fake)), 4),
+                     "mean_latency_ms": round(screener_ms, 2)},
+        "full": {"accuracy": round(full_accuracy, 4), "mean_latency_ms": round(full_ms, 2)},
+        "bands": bands,
+        "recommended": recommended,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
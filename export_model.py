@@ -0,0 +1,169 @@
+"""
+Export the detector to ONNX or TorchScript for the serving backends in backends.py.
+
+    python export_model.py --format onnx --out exported/onnx [--model-path DIR]
+    python export_model.py --format torchscript --out exported/ts [--profile int8]
+    python export_model.py --arch dualpath --weights dualpath.pt --format onnx --out exported/dualpath
+    python export_model.py --arch dualpath --weights dualpath.pt --format eager --out exported/dualpath
+
+The output directory holds the graph (model.onnx / model.pt), labels.json (id2label),
+preprocessor.json and export.json, which is everything the ONNX Runtime / TorchScript
+backends need: transformers is not imported at serve time. DualPathDA artifacts also
+carry state_dict.pt and frontend.json (the log-mel/LFCC front end config), which is all
+the eager `dualpath` backend reads; `--format eager` writes only those.
+"""
+import argparse
+import logging
+import os
+import warnings
+
+import torch
+import torch.nn as nn
+
+from audio import SAMPLE_RATE
+from backends import (ONNX_FILE, TORCHSCRIPT_FILE, LABELS_FILE, PREPROCESSOR_FILE, EXPORT_FILE,
+                      STATE_DICT_FILE, FRONTEND_FILE, WaveformPreprocessor, write_json)
+from features import DEFAULT_FRONT_END, FRONT_ENDS
+from inference import MODEL_NAME, MODEL_REVISION
+from model import DualPathDA
+from profiles import PROFILES, apply_profile
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+OPSET = 17
+# Shape of the example input used for tracing; batch and time stay dynamic
+EXAMPLE_BATCH = 2
+EXAMPLE_SECONDS = 1.0
+DUALPATH_EXAMPLE_FRAMES = 200
+DUALPATH_LABELS = {0: "real", 1: "fake"}
+
+
+class WaveformClassifier(nn.Module):
+    """(input_values, attention_mask) -> logits, the signature every waveform artifact exposes"""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_values, attention_mask):
+        return self.model(input_values=input_values, attention_mask=attention_mask).logits
+
+
+def load_transformers(model_path):
+    from transformers import AutoModelForAudioClassification, AutoFeatureExtractor
+    if model_path:
+        source, options = model_path, {"local_files_only": True}
+    else:
+        source, options = MODEL_NAME, {"revision": MODEL_REVISION}
+    model = AutoModelForAudioClassification.from_pretrained(source, **options).eval()
+    feature_extractor = AutoFeatureExtractor.from_pretrained(source, **options)
+    id2label = {int(idx): label for idx, label in model.config.id2label.items()}
+    return model, WaveformPreprocessor.from_feature_extractor(feature_extractor), id2label, source
+
+
+def waveform_example():
+    input_values = torch.randn(EXAMPLE_BATCH, int(EXAMPLE_SECONDS * SAMPLE_RATE))
+    attention_mask = torch.ones_like(input_values, dtype=torch.long)
+    attention_mask[1, input_values.shape[1] // 2:] = 0  # trace the padded path too
+    return (input_values, attention_mask), ["input_values", "attention_mask"], {
+        "input_values": {0: "batch", 1: "time"},
+        "attention_mask": {0: "batch", 1: "time"},
+        "logits": {0: "batch"},
+    }
+
+
+def features_example(n_bins):
+    features = torch.randn(EXAMPLE_BATCH, 1, n_bins, DUALPATH_EXAMPLE_FRAMES)
+    return (features,), ["features"], {"features": {0: "batch", 3: "time"}, "logits": {0: "batch"}}
+
+
+def export_onnx(module, example, input_names, dynamic_axes, path, opset):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        # The TorchScript-based exporter handles the HF audio models with dynamic time axes
+        torch.onnx.export(module, example, path, input_names=input_names, output_names=["logits"],
+                          dynamic_axes=dynamic_axes, opset_version=opset, dynamo=False)
+
+
+def quantize_onnx(path):
+    """Dynamic INT8 quantization of the exported graph with ONNX Runtime's tooling"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    fp32_path = path + ".fp32"
+    os.replace(path, fp32_path)
+    quantize_dynamic(fp32_path, path, weight_type=QuantType.QInt8)
+    os.remove(fp32_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--format", choices=("onnx", "torchscript", "eager"), required=True,
+                        help="eager: weights + front end config only (--arch dualpath)")
+    parser.add_argument("--out", required=True, help="Artifact directory to write")
+    parser.add_argument("--arch", choices=("wav2vec2", "dualpath"), default="wav2vec2")
+    parser.add_argument("--model-path", default=None, help="Local HF model directory (defaults to the hub model)")
+    parser.add_argument("--weights", default=None, help="DualPathDA state_dict (--arch dualpath)")
+    parser.add_argument("--frontend", choices=FRONT_ENDS, default=DEFAULT_FRONT_END["kind"],
+                        help="DualPathDA input features (--arch dualpath)")
+    parser.add_argument("--n-bins", type=int, default=DEFAULT_FRONT_END["n_bins"],
+                        help="DualPathDA mel/linear filterbank bins (--arch dualpath)")
+    parser.add_argument("--profile", choices=PROFILES, default="fp32", help="int8 quantizes before/after export")
+    parser.add_argument("--opset", type=int, default=OPSET)
+    args = parser.parse_args()
+    if args.format == "eager" and args.arch != "dualpath":
+        parser.error("--format eager is only for --arch dualpath; serve wav2vec2 with the transformers backend")
+
+    os.makedirs(args.out, exist_ok=True)
+    if args.arch == "wav2vec2":
+        model, preprocessor, id2label, source = load_transformers(args.model_path)
+        module = WaveformClassifier(model).eval()
+        example, input_names, dynamic_axes = waveform_example()
+        write_json(args.out, PREPROCESSOR_FILE, preprocessor.to_dict())
+        model_input = "waveform"
+    else:
+        module = DualPathDA().eval()
+        if args.weights:
+            module.load_state_dict(torch.load(args.weights, map_location="cpu"))
+        else:
+            logger.warning("No --weights given, exporting a randomly initialised DualPathDA")
+        torch.save(module.state_dict(), os.path.join(args.out, STATE_DICT_FILE))
+        write_json(args.out, FRONTEND_FILE, dict(DEFAULT_FRONT_END, kind=args.frontend, n_bins=args.n_bins))
+        id2label, source = DUALPATH_LABELS, args.weights or "random-init"
+        example, input_names, dynamic_axes = features_example(args.n_bins)
+        model_input = "features"
+
+    if args.format == "eager":
+        path = os.path.join(args.out, STATE_DICT_FILE)
+    elif args.format == "torchscript":
+        module = apply_profile(module, args.profile)
+        with torch.inference_mode(), warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            traced = torch.jit.trace(module, example, check_trace=False)
+        path = os.path.join(args.out, TORCHSCRIPT_FILE)
+        traced.save(path)
+    else:
+        path = os.path.join(args.out, ONNX_FILE)
+        export_onnx(module, example, input_names, dynamic_axes, path, args.opset)
+        if args.profile == "int8":
+            quantize_onnx(path)
+        elif args.profile != "fp32":
+            logger.warning(f"Profile '{args.profile}' has no ONNX export path, wrote fp32")
+
+    write_json(args.out, LABELS_FILE, {"id2label": id2label})
+    write_json(args.out, EXPORT_FILE, {
+        "format": args.format,
+        "arch": args.arch,
+        "input": model_input,
+        "input_names": input_names,
+        "source": source,
+        "profile": args.profile,
+        "frontend": args.frontend if args.arch == "dualpath" else None,
+        "n_bins": args.n_bins if args.arch == "dualpath" else None,
+        "opset": args.opset if args.format == "onnx" else None,
+        "torch": torch.__version__,
+    })
+    logger.info(f"Wrote {path} ({os.path.getsize(path) / 2 ** 20:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
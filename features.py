@@ -0,0 +1,90 @@
+import librosa
+import numpy as np
+import torch
+import torch.nn as nn
+
+from audio import SAMPLE_RATE
+
+# Front-end kinds: log-mel filterbank energies or linear-frequency cepstral coefficients
+FRONT_ENDS = ("logmel", "lfcc")
+DEFAULT_FRONT_END = {
+    "kind": "logmel",
+    "n_fft": 512,
+    "win_length": 400,   # 25 ms
+    "hop_length": 160,   # 10 ms
+    "n_bins": 80,
+}
+LOG_EPS = 1e-6
+
+
+def linear_filterbank(sr, n_fft, n_bins):
+    """Triangular filters evenly spaced on a linear frequency axis (the LFCC filterbank)"""
+    fft_freqs = np.linspace(0, sr / 2, n_fft // 2 + 1)
+    edges = np.linspace(0, sr / 2, n_bins + 2)
+    lower, center, upper = edges[:-2, None], edges[1:-1, None], edges[2:, None]
+    rising = (fft_freqs - lower) / (center - lower)
+    falling = (upper - fft_freqs) / (upper - center)
+    return np.maximum(0.0, np.minimum(rising, falling)).astype(np.float32)
+
+
+def dct_matrix(n):
+    """Orthonormal DCT-II as a matrix, so cepstra are one matmul"""
+    k = np.arange(n)[:, None]
+    m = np.arange(n)[None, :]
+    basis = np.cos(np.pi / n * (m + 0.5) * k) * np.sqrt(2.0 / n)
+    basis[0] /= np.sqrt(2.0)
+    return basis.astype(np.float32)
+
+
+class SpectralFrontEnd(nn.Module):
+    """
+    Waveforms [batch, samples] -> per-utterance mean-normalized log-mel or LFCC
+    features [batch, 1, n_bins, frames], computed in torch (batched STFT + one matmul).
+    """
+
+    def __init__(self, kind="logmel", sample_rate=SAMPLE_RATE, n_fft=512, win_length=400,
+                 hop_length=160, n_bins=80):
+        super(SpectralFrontEnd, self).__init__()
+        if kind not in FRONT_ENDS:
+            raise ValueError(f"Unknown front end '{kind}', expected one of {FRONT_ENDS}")
+        self.kind = kind
+        self.sample_rate = sample_rate
+        self.n_fft = n_fft
+        self.win_length = win_length
+        self.hop_length = hop_length
+        self.n_bins = n_bins
+
+        if kind == "logmel":
+            filterbank = librosa.filters.mel(sr=sample_rate, n_fft=n_fft, n_mels=n_bins)
+        else:
+            filterbank = linear_filterbank(sample_rate, n_fft, n_bins)
+        # Derived from the config, so they are not part of the state_dict
+        self.register_buffer("window", torch.hann_window(win_length), persistent=False)
+        self.register_buffer("filterbank", torch.from_numpy(np.asarray(filterbank, dtype=np.float32)),
+                             persistent=False)
+        if kind == "lfcc":
+            self.register_buffer("dct", torch.from_numpy(dct_matrix(n_bins)), persistent=False)
+
+    def config(self):
+        return {"kind": self.kind, "n_fft": self.n_fft, "win_length": self.win_length,
+                "hop_length": self.hop_length, "n_bins": self.n_bins}
+
+    def forward(self, waveforms):
+        spec = torch.stft(waveforms, n_fft=self.n_fft, hop_length=self.hop_length, win_length=self.win_length,
+                          window=self.window, center=True, return_complex=True)
+        power = spec.real ** 2 + spec.imag ** 2           # [batch, freq, frames]
+        feats = torch.log(torch.matmul(self.filterbank, power) + LOG_EPS)  # [batch, bins, frames]
+        if self.kind == "lfcc":
+            feats = torch.matmul(self.dct, feats)
+        feats = feats - feats.mean(dim=-1, keepdim=True)
+        return feats.unsqueeze(1)
+
+
+def tile_pad(waveforms):
+    """
+    Stack waveforms of different lengths into one [batch, max_len] float32 array by
+    repeating each clip cyclically. Unlike zero padding this doesn't add silent frames
+    to the spectral statistics the convolutional model pools over.
+    """
+    max_len = max(len(y) for y in waveforms)
+    return np.stack([np.resize(np.asarray(y, dtype=np.float32), max_len) for y in waveforms])
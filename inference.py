@@ -1,101 +1,523 @@
 import torch
-import librosa
 import numpy as np
 import logging
-import io
-import base64
-from transformers import AutoModelForAudioClassification, AutoFeatureExtractor
+import os
+import threading
+import time
+from audio import SAMPLE_RATE, b64_to_bytes, decode_base64, load_audio
+from cache import cache_key
+from metrics import EXIT_LAYERS, INDEX_MATCHES, MODEL_LOAD_SECONDS, stage
+import chunking
+import vad
+from profiles import DEFAULT_PROFILE, configure_threads, forward_context
+from backends import get_backend
+from early_exit import EarlyExit, LayerTaps, _Exit
+from input_buffers import DEFAULT_MAX_RETAINED_SAMPLES
+from embedding_index import DEFAULT_MATCH_THRESHOLD, EmbeddingIndex, normalize
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Constants
-SAMPLE_RATE = 16000
 MODEL_NAME = "mo-thecreator/Deepfake-audio-detection"
+MODEL_REVISION = os.environ.get("MODEL_REVISION", "main")
+# Local directory with config/weights/preprocessor (save_pretrained layout); loads fully offline.
+# For the exported backends this is the artifact directory written by export_model.py.
+MODEL_PATH = os.environ.get("MODEL_PATH")
+# "transformers" (eager), "torchscript", "onnx" or "dualpath" (lightweight DualPathDA, see backends.py)
+MODEL_BACKEND = os.environ.get("MODEL_BACKEND", "transformers")
+# Cascade mode (see cascade.py): a screener artifact scores every clip first and only
+# clips with a screener fake probability inside [CASCADE_LOW, CASCADE_HIGH] reach the model above
+CASCADE_SCREENER_PATH = os.environ.get("CASCADE_SCREENER_PATH")
+CASCADE_SCREENER_BACKEND = os.environ.get("CASCADE_SCREENER_BACKEND", "dualpath")
+CASCADE_LOW = float(os.environ.get("CASCADE_LOW", 0.2))
+CASCADE_HIGH = float(os.environ.get("CASCADE_HIGH", 0.8))
+# Multi-worker serving (see model_server.py): with MODEL_SERVER set to the model server's
+# Unix socket, this process doesn't load a model and forwards waveforms to that server.
+# MODEL_SERVER_AUTHKEY is the server's hex key; there is no default, a known key would let
+# any local user send the server pickles
+MODEL_SERVER = os.environ.get("MODEL_SERVER")
+MODEL_SERVER_AUTHKEY = os.environ.get("MODEL_SERVER_AUTHKEY")
+# A failed model load may be retried after MODEL_LOAD_RETRY_S, doubling with every
+# further failure up to MODEL_LOAD_RETRY_MAX_S
+MODEL_LOAD_RETRY_S = float(os.environ.get("MODEL_LOAD_RETRY_S", 5))
+MODEL_LOAD_RETRY_MAX_S = float(os.environ.get("MODEL_LOAD_RETRY_MAX_S", 300))
+# Voice-activity gating (see vad.py): with VAD_ENABLED=1 silence and dead air are cut
+# from decoded audio before inference, at most VAD_MAX_SPEECH_S of speech is analysed
+# and clips without speech get a NO_SPEECH result without running the model
+VAD_ENABLED = os.environ.get("VAD_ENABLED", "0") == "1"
+VAD_OPTIONS = {
+    "threshold_db": float(os.environ.get("VAD_THRESHOLD_DB", vad.DEFAULT_THRESHOLD_DB)),
+    "min_speech_s": float(os.environ.get("VAD_MIN_SPEECH_S", vad.DEFAULT_MIN_SPEECH_S)),
+    "max_speech_s": float(os.environ.get("VAD_MAX_SPEECH_S", vad.DEFAULT_MAX_SPEECH_S)),
+} if VAD_ENABLED else None
+# Early exit (see early_exit.py, calibrate_exits.py), transformers backend only: exit heads
+# fitted on intermediate encoder layers let confident clips stop there, and
+# EARLY_EXIT_MAX_LAYERS > 0 runs at most that many layers. EARLY_EXIT_THRESHOLD
+# overrides the calibrated per-layer thresholds.
+EARLY_EXIT_PATH = os.environ.get("EARLY_EXIT_PATH")
+EARLY_EXIT_MAX_LAYERS = int(os.environ.get("EARLY_EXIT_MAX_LAYERS", 0))
+EARLY_EXIT_OPTIONS = {
+    "heads_dir": EARLY_EXIT_PATH,
+    "max_layers": EARLY_EXIT_MAX_LAYERS,
+    "threshold": float(os.environ["EARLY_EXIT_THRESHOLD"]) if os.environ.get("EARLY_EXIT_THRESHOLD") else None,
+} if EARLY_EXIT_PATH or EARLY_EXIT_MAX_LAYERS else None
+# Embedding index of known clips (see embedding_index.py, build_index.py), transformers
+# backend only: clips are looked up at the layer the index was built from (chunked clips
+# as a whole, before windowing), and a near-duplicate of a known clip takes its label there
+INDEX_PATH = os.environ.get("INDEX_PATH")
+INDEX_OPTIONS = {
+    "directory": INDEX_PATH,
+    "match_threshold": float(os.environ.get("INDEX_MATCH_THRESHOLD", DEFAULT_MATCH_THRESHOLD)),
+    "nprobe": int(os.environ.get("INDEX_NPROBE", 0)) or None,
+} if INDEX_PATH else None
+# Seconds of silence pushed through the model once after loading
+WARMUP_SECONDS = 1.0
+# CPU execution profile (see profiles.py) and torch thread pools (0 = torch default)
+EXECUTION_PROFILE = os.environ.get("EXECUTION_PROFILE", DEFAULT_PROFILE)
+TORCH_THREADS = int(os.environ.get("TORCH_THREADS", 0))
+TORCH_INTEROP_THREADS = int(os.environ.get("TORCH_INTEROP_THREADS", 0))
+# Batches of more samples (clips x longest clip) than this get one-off input buffers
+# instead of growing the ones kept per duration bucket (see input_buffers.py)
+INPUT_BUFFER_MAX_SAMPLES = int(os.environ.get("INPUT_BUFFER_MAX_SAMPLES", DEFAULT_MAX_RETAINED_SAMPLES))
 
 class VoiceDetector:
-    def __init__(self):
+    def __init__(self, model_path=None, warmup=True, profile=None, backend=None, early_exit=None, index=None):
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        logger.info(f"Loading model: {MODEL_NAME} (Device: {self.device})")
-        logger.info("This may take a while on first run deeply depending on internet speed...")
-        
+        # Cold-start phases in seconds: import, weights load, warmup forward
+        self.load_timings = {}
+        model_path = model_path or MODEL_PATH
+        self.profile = profile or EXECUTION_PROFILE
+        self.backend_name = backend or MODEL_BACKEND
+        if self.device.type == "cpu":
+            configure_threads(TORCH_THREADS, TORCH_INTEROP_THREADS)
+
+        backend_cls = get_backend(self.backend_name)
+        started = time.perf_counter()
+        # The runtime (transformers / onnxruntime) is imported here, not at module import,
+        # so tooling that only needs the decode helpers doesn't pay for it
+        backend_cls.import_runtime()
+        self.load_timings["import"] = time.perf_counter() - started
+
+        if self.backend_name != "transformers":
+            if not model_path:
+                raise ValueError(f"The {self.backend_name} backend needs MODEL_PATH pointing at an export_model.py artifact")
+            source, options = model_path, {"intra_op_threads": TORCH_THREADS}
+            # Identifies the weights in result cache keys
+            self.model_id = f"{os.path.abspath(model_path)}@{self.backend_name}"
+        elif model_path:
+            source, options = model_path, {"local_files_only": True}
+            self.model_id = f"{os.path.abspath(model_path)}@local"
+        else:
+            source, options = MODEL_NAME, {"revision": MODEL_REVISION}
+            self.model_id = f"{MODEL_NAME}@{MODEL_REVISION}"
+
+        logger.info(f"Loading model: {source} (Backend: {self.backend_name}, Device: {self.device})")
+        if not model_path:
+            logger.info("This may take a while on first run deeply depending on internet speed...")
+
+        started = time.perf_counter()
         try:
-            self.model = AutoModelForAudioClassification.from_pretrained(MODEL_NAME).to(self.device)
-            self.feature_extractor = AutoFeatureExtractor.from_pretrained(MODEL_NAME)
+            self.backend = backend_cls(source, device=self.device, profile=self.profile, **options)
+            self.id2label = self.backend.id2label
+            if getattr(self.backend, "inputs", None) is not None:
+                self.backend.inputs.max_retained_samples = INPUT_BUFFER_MAX_SAMPLES
             logger.info("Model loaded successfully!")
         except Exception as e:
             logger.error(f"Failed to load model: {e}")
             raise e
+        self.load_timings["weights"] = time.perf_counter() - started
+        if not model_path:
+            # A branch such as "main" moves; the commit it resolved to identifies the weights
+            commit = getattr(getattr(self.model, "config", None), "_commit_hash", None)
+            if commit:
+                self.model_id = f"{MODEL_NAME}@{commit}"
+        if self.profile != DEFAULT_PROFILE:
+            # Quantized / reduced-precision outputs must not share cache entries with fp32
+            self.model_id += f"#{self.profile}"
+
+        # `early_exit` holds EarlyExit options (EARLY_EXIT_OPTIONS for the served model) and
+        # `index` embedding-index options (INDEX_OPTIONS); index lookups run inside the early-exit pass
+        gates = dict(early_exit or {})
+        if index:
+            options = dict(index)
+            gates["match_threshold"] = options.pop("match_threshold", DEFAULT_MATCH_THRESHOLD)
+            gates["index"] = EmbeddingIndex(**options)
+            if gates["index"].model_id != self.model_id:
+                logger.warning(f"Index {options['directory']} was built with {gates['index'].model_id}, "
+                               f"not {self.model_id}; similarities may be meaningless")
+            logger.info(f"Embedding index: {len(gates['index'])} clips, layer {gates['index'].layer}")
+        self.early_exit = EarlyExit(self.backend, **gates) if gates else None
+        self._taps = None
+        if self.early_exit is not None:
+            self.model_id += self.early_exit.describe()
+
+        # Optional cache.ResultCache, consulted by predict()/predict_bytes()
+        self.cache = None
+
+        if warmup:
+            started = time.perf_counter()
+            self.predict_waveforms([np.zeros(int(WARMUP_SECONDS * SAMPLE_RATE), dtype=np.float32)])
+            self.load_timings["warmup"] = time.perf_counter() - started
+
+        logger.info("Cold start: " + ", ".join(f"{phase} {secs:.2f}s" for phase, secs in self.load_timings.items()))
 
     def _decode_audio(self, base64_string):
         """Decode base64 string to audio time series"""
         try:
-            if "," in base64_string:
-                base64_string = base64_string.split(",")[1]
-            
-            audio_bytes = base64.b64decode(base64_string)
-            y, sr = librosa.load(io.BytesIO(audio_bytes), sr=SAMPLE_RATE)
-            return y
+            return decode_base64(base64_string)
         except Exception as e:
             logger.error(f"Error decoding audio: {e}")
             raise ValueError("Invalid audio data")
 
+    def decode_buffer(self, source, **decode_options):
+        """
+        Decode raw audio bytes / memoryview / file object to audio time series (no base64).
+        `decode_options` are passed to audio.load_audio (quality, max_duration).
+        """
+        try:
+            return load_audio(source, **decode_options)
+        except Exception as e:
+            logger.error(f"Error decoding audio: {e}")
+            raise ValueError("Invalid audio data")
+
+    @property
+    def model(self):
+        """The eager torch model (transformers backend only)"""
+        return getattr(self.backend, "model", None)
+
+    @property
+    def taps(self):
+        """early_exit.LayerTaps on the eager model (transformers backend only)"""
+        if self.early_exit is not None:
+            return self.early_exit.taps
+        if self._taps is None:
+            if self.model is None:
+                raise ValueError(f"Embeddings need the transformers backend, not '{self.backend_name}'")
+            self._taps = LayerTaps(self.model)
+        return self._taps
+
+    def embed(self, waveforms, layer=None):
+        """
+        Unit-length clip embeddings [batch, dim] (float32 numpy) from one forward pass
+        stopped after encoder `layer`. The default, the last layer, gives the model's own
+        pooled embedding (its classifier's input); earlier layers give mean-pooled states.
+        Waveforms of different lengths are padded, which shifts the embeddings of
+        group-norm feature encoders; embed one clip at a time for exact values.
+        """
+        taps, backend = self.taps, self.backend
+        layer = layer or taps.num_layers
+        if not 1 <= layer <= taps.num_layers:
+            raise ValueError(f"Layer {layer} is outside the model's {taps.num_layers} encoder layers")
+        pooled = []
+        with backend.prepare(list(waveforms)) as inputs:
+            padding_mask = taps.padding_mask(inputs)
+
+            def state(current, hidden):
+                if current == layer:
+                    pooled.append(taps.embedding(layer, hidden, padding_mask))
+                    raise _Exit()
+
+            with forward_context(self.profile, self.device.type):
+                taps.run(inputs, state)
+        return normalize(pooled[0].float().cpu().numpy())
+
+    def _logits(self, waveforms, lookup=True):
+        """
+        (logits [batch, labels], per-clip details or None without early exit): the encoder
+        layer that decided each clip, and the matched clip when the index answered it.
+        `lookup=False` keeps the index out of it (see EarlyExit.logits)
+        """
+        if self.early_exit is None:
+            return self.backend.logits(waveforms), None
+        logits, layers, matches = self.early_exit.logits(waveforms, lookup)
+        details = []
+        for layer, match in zip(layers, matches):
+            details.append({"exit_layer": layer})
+            if match is not None:
+                details[-1].update(match_id=match["id"], match_similarity=match["similarity"])
+        return logits, details
+
+    def _probabilities(self, waveforms, lookup=True):
+        """([batch, labels] probs, per-clip details or None, see _logits)"""
+        logits, details = self._logits(waveforms, lookup)
+        return torch.softmax(logits, dim=-1), details
+
+    def _classify(self, waveforms):
+        """Run one padded forward pass over a list of waveforms, returns [batch, labels] probs"""
+        return self._probabilities(waveforms)[0]
+
+    def _format_result(self, probs):
+        """Turn one row of class probabilities into our API response"""
+        # Check config labels. Usually 0=Fake, 1=Real or vice versa.
+        # For `mo-thecreator/Deepfake-audio-detection`:
+        # Label 0: "real", Label 1: "fake" (Need to confirm via id2label usually, but let's assume standard behavior or inspect)
+        # Correction: Most Deepfake models: 1 is Fake (positive class).
+        # Let's inspect the id2label map dynamically if possible, but hardcoding for now based on typical behavior.
+        # If the model has config with labels (exported backends ship it as labels.json):
+        id2label = self.id2label
+
+        # Get the highest probability class
+        predicted_id = int(torch.argmax(probs).item())
+        predicted_label = id2label[predicted_id]
+        score = probs[predicted_id].item()
+
+        # Normalize output to our API standard
+        if "fake" in predicted_label.lower() or "spoof" in predicted_label.lower():
+            classification = "AI_GENERATED"
+        else:
+            classification = "HUMAN"
+
+        return {
+            "classification": classification,
+            "confidence": round(score, 4),
+            "explanation": f"Classified by AI Model as '{predicted_label}'."
+        }
+
+    def _add_detail(self, result, detail):
+        """Merge one clip's early-exit details (see _logits) into its result and count them"""
+        result.update(detail)
+        EXIT_LAYERS.inc(layer=str(detail["exit_layer"]))
+        if "match_id" in detail:
+            INDEX_MATCHES.inc(classification=result["classification"])
+            result["explanation"] = (f"Near-duplicate of known {result['classification']} clip "
+                                     f"'{detail['match_id']}' (similarity {detail['match_similarity']:.4f}).")
+        return result
+
+    @property
+    def fake_index(self):
+        """Index of the synthetic-speech class in the model's label map"""
+        for idx, label in self.id2label.items():
+            if "fake" in label.lower() or "spoof" in label.lower():
+                return int(idx)
+        raise ValueError("Model has no 'fake'/'spoof' label")
+
+    def fake_probabilities(self, waveforms):
+        """Fake-class probability of each waveform, from one batched forward pass"""
+        return self._classify(list(waveforms))[:, self.fake_index].tolist()
+
+    def predict_chunked(self, y, window_s=chunking.DEFAULT_WINDOW_S, hop_s=chunking.DEFAULT_HOP_S,
+                        batch_size=chunking.DEFAULT_BATCH_SIZE, aggregate=chunking.DEFAULT_AGGREGATE,
+                        top_k=chunking.DEFAULT_TOP_K, include_segments=False):
+        """
+        Classify a long waveform as fixed-length overlapping windows.
+        Only `batch_size` equal-length windows go through the model at a time, so
+        peak activation memory is independent of the clip length. With an embedding
+        index the clip is looked up as a whole first; a match answers for all of it.
+        A clip shorter than one window (even an empty one) is scored as one window
+        padded with silence.
+        """
+        try:
+            return self._predict_chunked(y, window_s, hop_s, batch_size, aggregate, top_k, include_segments)
+        except Exception as e:
+            logger.error(f"Chunked prediction failed: {e}")
+            return error_result(e)
+
+    def _predict_chunked(self, y, window_s, hop_s, batch_size, aggregate, top_k, include_segments):
+        window = max(1, int(window_s * SAMPLE_RATE))
+        hop = max(1, int(hop_s * SAMPLE_RATE))
+        fake_index = self.fake_index
+        n_samples = len(y)
+
+        early_exit = self.early_exit
+        match = None
+        # A padded window is not what the index holds, so only clips of a window or more are looked up
+        if early_exit is not None and early_exit.index is not None and n_samples >= window:
+            match, = early_exit.lookup([y])
+        if match is not None:
+            probs = torch.softmax(early_exit.verdict_logits(match), dim=-1)
+            detail = {"exit_layer": early_exit.index.layer, "match_id": match["id"],
+                      "match_similarity": match["similarity"]}
+            result = self._add_detail(self._format_result(probs), detail)
+            if include_segments:
+                result["segments"] = [{"start": 0.0, "end": round(n_samples / SAMPLE_RATE, 3),
+                                       "fake_probability": round(probs[fake_index].item(), 4), **detail}]
+            return result
+        if n_samples < window:
+            y = np.pad(np.asarray(y, dtype=np.float32), (0, window - n_samples))
+
+        segments = []
+        window_probs = []
+        for starts, windows in chunking.iter_window_batches(y, window, hop, batch_size):
+            # Windows are not what the index holds, the clip was looked up above
+            probs, details = self._probabilities(windows, lookup=False)
+            fake_probs = probs[:, fake_index].tolist()
+            window_probs.extend(fake_probs)
+            for i, (start, chunk, fake_prob) in enumerate(zip(starts, windows, fake_probs)):
+                segments.append({
+                    "start": round(start / SAMPLE_RATE, 3),
+                    "end": round(min(start + len(chunk), n_samples) / SAMPLE_RATE, 3),
+                    "fake_probability": round(fake_prob, 4),
+                })
+                if details is not None:
+                    segments[-1].update(details[i])
+                    # Every window is a forward pass of its own through the early-exit gates
+                    EXIT_LAYERS.inc(layer=str(details[i]["exit_layer"]))
+
+        fake_prob = chunking.aggregate(window_probs, aggregate, top_k)
+        if fake_prob >= 0.5:
+            classification, score = "AI_GENERATED", fake_prob
+        else:
+            classification, score = "HUMAN", 1.0 - fake_prob
+
+        result = {
+            "classification": classification,
+            "confidence": round(score, 4),
+            "explanation": f"Aggregated ({aggregate}) over {len(segments)} windows of {window_s:g}s; "
+                           f"fake probability {fake_prob:.4f}."
+        }
+        if self.early_exit is not None:
+            # The deepest layer any window needed
+            result["exit_layer"] = max(segment["exit_layer"] for segment in segments)
+        if include_segments:
+            result["segments"] = segments
+        return result
+
+    def predict_waveforms(self, waveforms):
+        """Classify already decoded waveforms in one batched forward pass"""
+        logits, details = self._logits(list(waveforms))
+        with stage("postprocess"):
+            probs = torch.softmax(logits, dim=-1)
+            results = [self._format_result(row) for row in probs]
+            if details is not None:
+                for result, detail in zip(results, details):
+                    self._add_detail(result, detail)
+            return results
+
     def predict(self, base64_audio):
         try:
+            with stage("base64_decode"):
+                audio_bytes = b64_to_bytes(base64_audio)
+        except Exception as e:
+            logger.error(f"Error decoding audio: {e}")
+            return error_result(ValueError("Invalid audio data"))
+        return self.predict_bytes(audio_bytes)
+
+    def predict_bytes(self, source):
+        """Same as predict() but takes raw audio bytes, a memoryview or a file object"""
+        try:
+            # 0. Identical audio was classified before: skip decode and inference entirely
+            key = None
+            if self.cache is not None:
+                key = cache_key(source, self.model_id)
+                cached = self.cache.get(key)
+                if cached is not None:
+                    return cached
+
             # 1. Decode
-            y = self._decode_audio(base64_audio)
-            
-            # 2. Preprocess (Transformers Feature Extractor)
-            # The model expects input values, not raw LFCC/MFCC tensors we made manually before
-            inputs = self.feature_extractor(y, sampling_rate=SAMPLE_RATE, return_tensors="pt", padding=True)
-            inputs = {key: val.to(self.device) for key, val in inputs.items()}
-            
-            # 3. Inference
-            with torch.no_grad():
-                logits = self.model(**inputs).logits
-                probs = torch.softmax(logits, dim=-1)
-                
-                # Check config labels. Usually 0=Fake, 1=Real or vice versa.
-                # For `mo-thecreator/Deepfake-audio-detection`: 
-                # Label 0: "real", Label 1: "fake" (Need to confirm via id2label usually, but let's assume standard behavior or inspect)
-                # Correction: Most Deepfake models: 1 is Fake (positive class). 
-                # Let's inspect self.model.config.id2label dynamically if possible, but hardcoding for now based on typical behavior.
-                # If the model has config with labels:
-                id2label = self.model.config.id2label
-                
-                # Get the highest probability class
-                predicted_id = torch.argmax(logits, dim=-1).item()
-                predicted_label = id2label[predicted_id]
-                score = probs[0][predicted_id].item()
-                
-                # Normalize output to our API standard
-                if "fake" in predicted_label.lower() or "spoof" in predicted_label.lower():
-                     classification = "AI_GENERATED"
-                     fake_score = score
+            with stage("audio_decode"):
+                y = self.decode_buffer(source)
+
+            # 2. Preprocess + 3. Inference (batch of one)
+            if VAD_OPTIONS is not None:
+                with stage("vad"):
+                    speech, speech_s = vad.trim_silence(y, **VAD_OPTIONS)
+                if len(speech) == 0:
+                    result = vad.no_speech_result(len(y) / SAMPLE_RATE)
                 else:
-                     classification = "HUMAN"
-                     fake_score = 1.0 - score # just for reference if needed
-                
-            return {
-                "classification": classification,
-                "confidence": round(score, 4),
-                "explanation": f"Classified by AI Model as '{predicted_label}'."
-            }
-            
+                    result = {**self.predict_waveforms([speech])[0], "speech_seconds": round(speech_s, 3)}
+            else:
+                result = self.predict_waveforms([y])[0]
+            if key is not None:
+                self.cache.put(key, result)
+            return result
+
         except Exception as e:
             logger.error(f"Prediction failed: {e}")
-            return {
-                "classification": "ERROR",
-                "confidence": 0.0,
-                "explanation": str(e)
-            }
-
-# Singleton instance
-# NOTE: This will trigger download on import!
-try:
-    detector = VoiceDetector()
-except Exception:
-    # If network fails, we shouldn't crash independent imports, but app startup will fail.
-    detector = None
+            return error_result(e)
+
+
+def error_result(error):
+    """Response returned when a clip could not be classified"""
+    return {
+        "classification": "ERROR",
+        "confidence": 0.0,
+        "explanation": str(error)
+    }
+
+class ModelLoader:
+    """
+    Loads the VoiceDetector exactly once, on demand or in the background; with a
+    screener path it is wrapped in a cascade.CascadeDetector, with a model server
+    address it is a model_server.RemoteDetector instead.
+    `state` is one of "not_loaded", "loading", "ready", "failed"; a failed load
+    can be attempted again once retry_in() is 0.
+    """
+
+    def __init__(self, model_path=None, profile=None, backend=None, screener_path=None, server_address=None):
+        self.model_path = model_path
+        self.profile = profile
+        self.backend = backend
+        self.screener_path = screener_path or CASCADE_SCREENER_PATH
+        # "" forces a local model even when MODEL_SERVER is set (the model server itself)
+        self.server_address = MODEL_SERVER if server_address is None else server_address
+        self.detector = None
+        self.error = None
+        self.state = "not_loaded"
+        self.failures = 0
+        self._failed_at = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Load (or return the already loaded) detector; raises if loading failed"""
+        with self._lock:
+            if self.detector is not None:
+                return self.detector
+            self.state = "loading"
+            self.error = None
+            try:
+                if self.server_address:
+                    # model_server.py builds on this module too
+                    from model_server import RemoteDetector
+                    detector = RemoteDetector(self.server_address)
+                else:
+                    detector = VoiceDetector(model_path=self.model_path, profile=self.profile, backend=self.backend,
+                                             early_exit=EARLY_EXIT_OPTIONS, index=INDEX_OPTIONS)
+                    if self.screener_path:
+                        # cascade.py builds on VoiceDetector, so it can only be imported once this module is
+                        from cascade import CascadeDetector
+                        screener = VoiceDetector(model_path=self.screener_path, profile=self.profile,
+                                                 backend=CASCADE_SCREENER_BACKEND)
+                        detector = CascadeDetector(screener, detector, band=(CASCADE_LOW, CASCADE_HIGH))
+                self.detector = detector
+            except Exception as e:
+                self.state = "failed"
+                self.error = str(e)
+                self.failures += 1
+                self._failed_at = time.monotonic()
+                raise
+            self.state = "ready"
+            for phase, secs in self.detector.load_timings.items():
+                MODEL_LOAD_SECONDS.set(secs, phase=phase)
+            return self.detector
+
+    def retry_in(self):
+        """Seconds until a failed load should be retried, with exponential backoff; 0 otherwise"""
+        if self.state != "failed":
+            return 0.0
+        backoff = min(MODEL_LOAD_RETRY_S * 2 ** (self.failures - 1), MODEL_LOAD_RETRY_MAX_S)
+        return max(0.0, self._failed_at + backoff - time.monotonic())
+
+    def status(self):
+        status = {"state": self.state}
+        if self.error:
+            status["error"] = self.error
+        if self.state == "failed":
+            status["failures"] = self.failures
+            status["retry_in_s"] = round(self.retry_in(), 1)
+        if self.detector is not None:
+            status["model"] = self.detector.model_id
+            status["profile"] = self.detector.profile
+            status["backend"] = self.detector.backend_name
+            status["load_timings"] = {phase: round(secs, 3) for phase, secs in self.detector.load_timings.items()}
+        return status
+
+
+# Shared loader: nothing is downloaded or loaded until get_detector() / loader.load() is called
+loader = ModelLoader()
+
 
+def get_detector():
+    """Process-wide VoiceDetector, loaded on first use"""
+    return loader.load()
@@ -0,0 +1,148 @@
+import contextlib
+import threading
+
+import numpy as np
+import torch
+
+from audio import SAMPLE_RATE
+from metrics import stage
+
+# Duration buckets in seconds: clips are batched with others of the same bucket
+# (batching.MicroBatcher) and each bucket keeps its own input buffers
+DEFAULT_BUCKET_EDGES_S = (2.0, 4.0, 8.0, 16.0, 32.0)
+# Variance floor of the per-clip normalization, as in Wav2Vec2FeatureExtractor
+NORM_EPS = 1e-7
+# Largest buffer (batch x samples) a bucket keeps between batches: 16 clips of 32 s
+DEFAULT_MAX_RETAINED_SAMPLES = 16 * 32 * SAMPLE_RATE
+
+
+def bucket_of(n_samples, edges_s=DEFAULT_BUCKET_EDGES_S, sr=SAMPLE_RATE):
+    """Index of the smallest bucket holding `n_samples`; len(edges_s) for longer clips"""
+    for index, edge in enumerate(edges_s):
+        if n_samples <= edge * sr:
+            return index
+    return len(edges_s)
+
+
+def bucket_groups(lengths, edges_s=DEFAULT_BUCKET_EDGES_S, sr=SAMPLE_RATE):
+    """Positions of `lengths` grouped by bucket, shortest bucket first"""
+    groups = {}
+    for position, n in enumerate(lengths):
+        groups.setdefault(bucket_of(n, edges_s, sr), []).append(position)
+    return [groups[bucket] for bucket in sorted(groups)]
+
+
+class InputStats:
+    """Padding and allocation counters of an InputBuffers"""
+
+    def __init__(self):
+        self.batches = 0
+        self.allocations = 0
+        self.reuses = 0
+        self.valid_samples = 0
+        self.padded_samples = 0
+
+    def snapshot(self):
+        total = self.valid_samples + self.padded_samples
+        return {
+            "batches": self.batches,
+            "allocations": self.allocations,
+            "reuses": self.reuses,
+            "padding_ratio": round(self.padded_samples / total, 4) if total else 0.0,
+        }
+
+
+class InputBuffers:
+    """
+    Model inputs for a wav2vec2-style waveform model, built in reusable memory.
+
+    Each duration bucket owns one flat float32 buffer for the input values and one
+    `mask_dtype` buffer for the attention mask, sized for the largest batch seen in
+    that bucket; a batch uses a contiguous [batch, longest clip] view of their
+    prefix, so no padding beyond its own longest clip is added and, once warm,
+    nothing is allocated per call. On CUDA the buffers are pinned for asynchronous
+    copies. Every clip is zero-mean / unit-variance normalized over its valid
+    samples (the Wav2Vec2FeatureExtractor contract) with a handful of whole-batch
+    ops. A bucket whose buffers are in use by another thread, or a batch larger than
+    `max_retained_samples`, gets a one-off pair instead, so one huge request does
+    not pin its memory for the life of the process.
+    """
+
+    def __init__(self, do_normalize=True, padding_value=0.0, device=None, edges_s=DEFAULT_BUCKET_EDGES_S,
+                 sr=SAMPLE_RATE, mask_dtype=torch.int32, max_retained_samples=DEFAULT_MAX_RETAINED_SAMPLES):
+        self.do_normalize = do_normalize
+        self.padding_value = padding_value
+        self.mask_dtype = mask_dtype
+        self.max_retained_samples = max_retained_samples
+        self.device = device or torch.device("cpu")
+        self.pin = self.device.type == "cuda"
+        self.edges = [int(edge * sr) for edge in edges_s]
+        self.stats = InputStats()
+        self._buffers = {}   # bucket -> (values, mask), flat
+        self._locks = {}     # bucket -> lock held while a batch uses the bucket's buffers
+        self._lock = threading.Lock()
+
+    def _allocate(self, size):
+        self.stats.allocations += 1
+        return (torch.empty(size, dtype=torch.float32, pin_memory=self.pin),
+                torch.empty(size, dtype=self.mask_dtype, pin_memory=self.pin))
+
+    def _acquire(self, batch, length):
+        """(values, mask) flat buffers of at least batch * length elements, and the lock to release"""
+        bucket = next((i for i, edge in enumerate(self.edges) if length <= edge), len(self.edges))
+        with self._lock:
+            lock = self._locks.setdefault(bucket, threading.Lock())
+            if not lock.acquire(blocking=False):
+                return self._allocate(batch * length), None
+            buffers = self._buffers.get(bucket)
+            if buffers is None or buffers[0].numel() < batch * length:
+                # Bounded buckets are sized for their longest clip, so any batch this large fits later
+                width = self.edges[bucket] if bucket < len(self.edges) else length
+                size = batch * width if batch * width <= self.max_retained_samples else batch * length
+                if size > self.max_retained_samples:
+                    lock.release()
+                    return self._allocate(batch * length), None
+                buffers = self._buffers[bucket] = self._allocate(size)
+            else:
+                self.stats.reuses += 1
+            return buffers, lock
+
+    @contextlib.contextmanager
+    def batch(self, waveforms):
+        """{"input_values", "attention_mask"} [batch, longest] CPU tensors, valid inside the with-block"""
+        lengths = [len(y) for y in waveforms]
+        batch, length = len(waveforms), max(max(lengths), 1)
+        with stage("feature_extraction"):
+            (values, mask), lock = self._acquire(batch, length)
+            try:
+                values = values[:batch * length].view(batch, length)
+                mask = mask[:batch * length].view(batch, length)
+                self._fill(values, mask, waveforms, lengths)
+            except BaseException:
+                if lock is not None:
+                    lock.release()
+                raise
+        with self._lock:
+            self.stats.batches += 1
+            self.stats.valid_samples += sum(lengths)
+            self.stats.padded_samples += batch * length - sum(lengths)
+        try:
+            yield {"input_values": values, "attention_mask": mask}
+        finally:
+            if lock is not None:
+                lock.release()
+
+    def _fill(self, values, mask, waveforms, lengths):
+        values.zero_()
+        for row, y in zip(values, waveforms):
+            row[:len(y)] = torch.from_numpy(np.asarray(y, dtype=np.float32))
+        counts = torch.tensor(lengths)
+        mask.copy_(torch.arange(values.shape[1])[None, :] < counts[:, None])
+        if self.do_normalize:
+            counts = counts.clamp(min=1).to(torch.float32)[:, None]
+            # Padding is zero, so plain row sums are sums over the valid samples
+            values.sub_(values.sum(dim=1, keepdim=True) / counts).mul_(mask)
+            variance = torch.linalg.vector_norm(values, dim=1, keepdim=True).square_() / counts
+            values.mul_(torch.rsqrt(variance + NORM_EPS))
+        if self.padding_value:
+            values.masked_fill_(mask == 0, self.padding_value)
@@ -0,0 +1,626 @@
+"""
+Durable job queue for long recordings, and the workers that drain it.
+
+    python jobs.py [--dir /tmp/voice-detector-jobs] [--workers 2] [--lanes interactive normal]
+
+POST /jobs stores the upload next to a SQLite database and answers at once with a
+job id; GET /jobs/{id} reports its status and, once done, its result. Workers claim
+queued jobs lane by lane (interactive before normal before bulk, oldest first
+within a lane), run the detector with the decode / chunking options recorded in
+the job when it was submitted, and store the result. They are threads inside the
+app (JOB_WORKERS) and/or this script, run as separate processes on the same
+directory with the same MODEL_* settings; `--lanes` reserves a process for some
+lanes, e.g. one that only ever takes interactive jobs.
+
+A claimed job is leased to its worker, which renews the lease while it runs; a
+job whose worker died (crash, kill, restart) goes back to the queue once its
+lease runs out and fails after DEFAULT_MAX_ATTEMPTS tries. Finished jobs with a
+callback URL get their job JSON POSTed there, retried with backoff until it is
+accepted; pending callbacks are in the database too, so they survive restarts.
+"""
+import argparse
+import http.client
+import ipaddress
+import json
+import logging
+import os
+import shutil
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+import urllib.parse
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import vad
+from audio import SAMPLE_RATE, load_audio_capped
+
+logger = logging.getLogger(__name__)
+
+# Defaults (overridable through environment variables in app.py)
+DEFAULT_DIRECTORY = os.path.join(tempfile.gettempdir(), "voice-detector-jobs")
+DEFAULT_WORKERS = 1
+DEFAULT_MAX_UPLOAD_BYTES = 512 * 1024 * 1024
+DEFAULT_MAX_DECODE_SECONDS = 4 * 3600.0
+DEFAULT_RETENTION_S = 7 * 24 * 3600.0
+
+# Lanes and their priority (lower runs first)
+LANES = {"interactive": 0, "normal": 1, "bulk": 2}
+DEFAULT_LANE = "normal"
+STATUSES = ("queued", "running", "done", "failed")
+
+DB_FILE = "jobs.db"
+AUDIO_DIR = "audio"
+# A running job's worker renews its lease every DEFAULT_LEASE_S / 4
+DEFAULT_LEASE_S = 60.0
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_POLL_S = 1.0
+PRUNE_INTERVAL_S = 3600.0
+# Callbacks: per-attempt timeout, attempts, and the first retry delay (doubled each time)
+CALLBACK_TIMEOUT_S = 10.0
+CALLBACK_ATTEMPTS = 6
+CALLBACK_BACKOFF_S = 5.0
+# Deliveries in flight at once per process; each claimed callback is sent right away
+CALLBACK_THREADS = 4
+# How long a claimed callback is hidden from other processes. The connection timeout bounds
+# each socket operation (connect, every read), not the whole attempt, hence the margin
+CALLBACK_HOLD_S = 6 * CALLBACK_TIMEOUT_S
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    lane TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    options TEXT NOT NULL,
+    filename TEXT,
+    size INTEGER,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    callback_url TEXT,
+    callback_state TEXT,
+    callback_attempts INTEGER NOT NULL DEFAULT 0,
+    callback_next_at REAL,
+    callback_error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority, created_at);
+"""
+
+
+class JobError(Exception):
+    """A job that cannot succeed (undecodable audio, model error): failed without retrying"""
+
+
+class JobQueue:
+    """
+    Jobs in a SQLite database (WAL mode, so any number of processes on the same
+    directory can share it) plus one audio file per job under `directory`/audio.
+    Claims run in IMMEDIATE transactions: a job is handed to exactly one worker.
+    """
+
+    def __init__(self, directory=DEFAULT_DIRECTORY, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.directory = directory
+        self.max_attempts = max_attempts
+        os.makedirs(os.path.join(directory, AUDIO_DIR), exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(directory, DB_FILE), timeout=30.0, isolation_level=None,
+                                   check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def audio_path(self, job_id):
+        return os.path.join(self.directory, AUDIO_DIR, job_id)
+
+    def _transaction(self, fn, *args):
+        """fn(*args) inside BEGIN IMMEDIATE ... COMMIT, rolled back if it raises"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                value = fn(*args)
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+            return value
+
+    def submit(self, fileobj, lane=DEFAULT_LANE, options=None, callback_url=None, filename=None):
+        """Store the audio of `fileobj` and queue a job for it; returns the job id"""
+        if lane not in LANES:
+            raise ValueError(f"Unknown lane '{lane}', expected one of {tuple(LANES)}")
+        job_id = uuid.uuid4().hex
+        path = self.audio_path(job_id)
+        # The row only appears once the audio is completely on disk
+        with open(path + ".part", "wb") as f:
+            shutil.copyfileobj(fileobj, f, 1024 * 1024)
+            size = f.tell()
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".part", path)
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, lane, priority, status, options, filename, size, created_at, callback_url,"
+                " callback_state) VALUES (?, ?, ?, 'queued', ?, ?, ?, ?, ?, ?)",
+                (job_id, lane, LANES[lane], json.dumps(options or {}), filename, size, time.time(), callback_url,
+                 "waiting" if callback_url else None),
+            )
+        return job_id
+
+    def claim(self, worker, lanes=None, lease_s=DEFAULT_LEASE_S):
+        """The next job for `worker` (a row dict, now running and leased to it), or None"""
+        lanes = list(lanes or LANES)
+
+        def claim_next():
+            now = time.time()
+            self._expire_leases(now)
+            row = self._db.execute(
+                f"SELECT * FROM jobs WHERE status = 'queued' AND lane IN ({', '.join('?' * len(lanes))})"
+                " ORDER BY priority, created_at LIMIT 1", lanes,
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, started_at = ?, lease_until = ?,"
+                " attempts = attempts + 1 WHERE id = ?", (worker, now, now + lease_s, row["id"]),
+            )
+            return {**dict(row), "status": "running", "worker": worker, "attempts": row["attempts"] + 1}
+        return self._transaction(claim_next)
+
+    def _expire_leases(self, now):
+        """Running jobs whose worker stopped renewing the lease: back to the queue, or failed"""
+        stale = self._db.execute("SELECT id, attempts FROM jobs WHERE status = 'running' AND lease_until < ?",
+                                 (now,)).fetchall()
+        for row in stale:
+            if row["attempts"] >= self.max_attempts:
+                logger.warning(f"Job {row['id']} lost its worker {row['attempts']} times, giving up")
+                self._set_finished(row["id"], now, None, f"Worker lost {row['attempts']} times")
+                self._remove_audio(row["id"])
+            else:
+                logger.info(f"Job {row['id']} lost its worker, requeued")
+                self._db.execute("UPDATE jobs SET status = 'queued', worker = NULL, lease_until = NULL WHERE id = ?",
+                                 (row["id"],))
+
+    def _set_finished(self, job_id, now, result, error, worker=None):
+        cursor = self._db.execute(
+            "UPDATE jobs SET status = ?, finished_at = ?, result = ?, error = ?, lease_until = NULL,"
+            " callback_state = CASE WHEN callback_url IS NULL THEN NULL ELSE 'pending' END"
+            " WHERE id = ? AND status = 'running'" + (" AND worker = ?" if worker else ""),
+            ("failed" if error is not None else "done", now, json.dumps(result) if result is not None else None,
+             error, job_id) + ((worker,) if worker else ()),
+        )
+        return cursor.rowcount > 0
+
+    def _remove_audio(self, job_id):
+        try:
+            os.remove(self.audio_path(job_id))
+        except FileNotFoundError:
+            pass
+
+    def renew(self, leases, lease_s=DEFAULT_LEASE_S):
+        """Extend the leases of running jobs, given as {job_id: worker}"""
+        until = time.time() + lease_s
+        with self._lock:
+            for job_id, worker in leases.items():
+                self._db.execute("UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                                 (until, job_id, worker))
+
+    def finish(self, job_id, worker, result=None, error=None):
+        """
+        Record a job's result (or error) and drop its audio. False if the job is no
+        longer `worker`'s: its lease ran out and someone else has it now.
+        """
+        with self._lock:
+            finished = self._set_finished(job_id, time.time(), result, error, worker)
+        if finished:
+            self._remove_audio(job_id)
+        return finished
+
+    def release(self, job_id, worker):
+        """Put a job `worker` is giving up on (shutdown) back in the queue, without counting the attempt"""
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL, lease_until = NULL, attempts = attempts - 1"
+                " WHERE id = ? AND worker = ? AND status = 'running'", (job_id, worker),
+            )
+
+    def get(self, job_id):
+        """Public view of a job, or None"""
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            position = None
+            if row["status"] == "queued":
+                position = self._db.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND"
+                    " (priority < ? OR (priority = ? AND created_at < ?))",
+                    (row["priority"], row["priority"], row["created_at"]),
+                ).fetchone()[0]
+        return job_view(row, position)
+
+    def claim_callbacks(self, limit=CALLBACK_THREADS, hold_s=CALLBACK_HOLD_S):
+        """
+        Finished jobs whose callback is due, each held back for one delivery attempt
+        (so another process doesn't send it at the same time)
+        """
+        def claim_due():
+            now = time.time()
+            rows = self._db.execute(
+                "SELECT * FROM jobs WHERE callback_state = 'pending' AND"
+                " (callback_next_at IS NULL OR callback_next_at <= ?) LIMIT ?", (now, limit),
+            ).fetchall()
+            for row in rows:
+                self._db.execute("UPDATE jobs SET callback_next_at = ? WHERE id = ?",
+                                 (now + hold_s, row["id"]))
+            return rows
+        return self._transaction(claim_due)
+
+    def callback_attempted(self, job_id, error=None):
+        """Record a delivery attempt; failures are retried with exponential backoff"""
+        with self._lock:
+            attempts = self._db.execute("SELECT callback_attempts FROM jobs WHERE id = ?",
+                                        (job_id,)).fetchone()[0] + 1
+            if error is None:
+                state, next_at = "delivered", None
+            elif attempts >= CALLBACK_ATTEMPTS:
+                state, next_at = "failed", None
+            else:
+                state, next_at = "pending", time.time() + CALLBACK_BACKOFF_S * 2 ** (attempts - 1)
+            self._db.execute(
+                "UPDATE jobs SET callback_state = ?, callback_attempts = ?, callback_next_at = ?, callback_error = ?"
+                " WHERE id = ?", (state, attempts, next_at, error, job_id),
+            )
+
+    def prune(self, retention_s=DEFAULT_RETENTION_S):
+        """Forget finished jobs older than `retention_s` whose callback is settled; returns how many"""
+        with self._lock:
+            cursor = self._db.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ? AND"
+                " (callback_state IS NULL OR callback_state != 'pending')", (time.time() - retention_s,),
+            )
+        return cursor.rowcount
+
+    def snapshot(self):
+        """Job counts by status and lane, and the age of the oldest queued job"""
+        with self._lock:
+            rows = self._db.execute("SELECT status, lane, COUNT(*) FROM jobs GROUP BY status, lane").fetchall()
+            oldest = self._db.execute("SELECT MIN(created_at) FROM jobs WHERE status = 'queued'").fetchone()[0]
+        counts = {status: {lane: 0 for lane in LANES} for status in STATUSES}
+        for status, lane, count in rows:
+            counts.setdefault(status, {})[lane] = count
+        return {**counts, "oldest_queued_s": round(time.time() - oldest, 3) if oldest is not None else None}
+
+    def queued(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def callback_hosts_from_env():
+    """JOB_CALLBACK_HOSTS: comma-separated host names callbacks may go to whatever they resolve to"""
+    return frozenset(host.strip().lower() for host in os.environ.get("JOB_CALLBACK_HOSTS", "").split(",")
+                     if host.strip())
+
+
+def job_view(row, position=None):
+    """What GET /jobs/{id} and callbacks show of a job row"""
+    view = {
+        "id": row["id"],
+        "status": row["status"],
+        "lane": row["lane"],
+        "filename": row["filename"],
+        "size_bytes": row["size"],
+        "created_at": row["created_at"],
+        "started_at": row["started_at"],
+        "finished_at": row["finished_at"],
+        "attempts": row["attempts"],
+    }
+    if position is not None:
+        view["queue_position"] = position
+    if row["result"] is not None:
+        view["result"] = json.loads(row["result"])
+    if row["error"] is not None:
+        view["error"] = row["error"]
+    if row["callback_url"] is not None:
+        view["callback"] = {"url": row["callback_url"], "state": row["callback_state"],
+                            "attempts": row["callback_attempts"], "error": row["callback_error"]}
+    return view
+
+
+def run_job(detector, path, options):
+    """
+    Classify a job's audio as app.classify_job would, with the options recorded at
+    submission: decode (+ VAD), then windowed inference for long or chunked=True
+    recordings, one forward pass otherwise. Raises JobError.
+    """
+    def decode(source):
+        return load_audio_capped(source, quality=options["resample_quality"],
+                                 max_duration=options["max_decode_seconds"])
+
+    try:
+        with open(path, "rb") as f:
+            if options.get("vad"):
+                y, speech = vad.decode_speech(decode, f, **options["vad"])
+                truncated = speech["truncated"]
+            else:
+                (y, truncated), speech = decode(f), None
+    except Exception as e:
+        logger.error(f"Error decoding job audio {path}: {e}")
+        raise JobError("Invalid audio data")
+
+    # Decoding stopped at max_decode_seconds with more audio to go
+    input_seconds = speech["input_seconds"] if speech is not None else len(y) / SAMPLE_RATE
+    cut = {"truncated": True, "analyzed_seconds": round(input_seconds, 3)} if truncated else {}
+    if speech is not None and len(y) == 0:
+        return {**vad.no_speech_result(input_seconds), **cut}
+    chunked = options.get("chunked")
+    if chunked is None:
+        chunked = len(y) > options["chunk_threshold_s"] * SAMPLE_RATE
+    if chunked or options.get("include_segments"):
+        result = detector.predict_chunked(y, include_segments=options.get("include_segments", False),
+                                          **options["chunk"])
+    else:
+        (result,) = detector.predict_waveforms([y])
+    if result["classification"] == "ERROR":
+        raise JobError(result["explanation"])
+    if speech is not None:
+        result = {**result, "speech_seconds": speech["speech_seconds"]}
+    return {**result, **cut}
+
+
+def check_callback_url(url, allowed_hosts=()):
+    """
+    Raise ValueError unless `url` is http(s) and either names one of `allowed_hosts`
+    (operator opt-in, any address) or resolves to public addresses only: results
+    must not be POSTable to loopback, private, link-local (cloud metadata) or
+    other internal addresses. Returns the checked address to connect to, None
+    for an allowed host.
+    """
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError("callback_url must be an http(s) URL")
+    if allowed_hosts:
+        if parts.hostname.lower() not in allowed_hosts:
+            raise ValueError(f"callback host '{parts.hostname}' is not in the allowed hosts")
+        return None
+    try:
+        addresses = [info[4][0] for info in socket.getaddrinfo(parts.hostname, parts.port or 0,
+                                                               proto=socket.IPPROTO_TCP)]
+    except (socket.gaierror, UnicodeError) as e:
+        raise ValueError(f"callback host '{parts.hostname}' does not resolve: {e}")
+    for address in addresses:
+        if not ipaddress.ip_address(address.split("%")[0]).is_global:
+            raise ValueError(f"callback host '{parts.hostname}' resolves to non-public address {address}")
+    return addresses[0]
+
+
+class CallbackFailed(Exception):
+    """A failed callback delivery; the message is safe to show the job's submitter"""
+
+
+class _PinnedHTTPSConnection(http.client.HTTPSConnection):
+    """HTTPS to an already-checked address, with SNI and certificate checks for the URL's host name"""
+
+    def __init__(self, address, port, server_hostname, **kwargs):
+        super().__init__(address, port, **kwargs)
+        self.server_hostname = server_hostname
+
+    def connect(self):
+        sock = socket.create_connection((self.host, self.port), self.timeout)
+        self.sock = self._context.wrap_socket(sock, server_hostname=self.server_hostname)
+
+
+def post_callback(url, payload, timeout=CALLBACK_TIMEOUT_S, allowed_hosts=()):
+    """
+    POST `payload` as JSON to the address the URL's host was checked against, so the
+    name can't be re-pointed (DNS rebinding) between check and connect. Redirects are
+    not followed: a 3xx is a failure like any other non-2xx answer. Raises
+    CallbackFailed; the underlying error is only logged.
+    """
+    parts = urllib.parse.urlsplit(url)
+    try:
+        # Checked again at delivery: the name may resolve elsewhere by now
+        address = check_callback_url(url, allowed_hosts) or parts.hostname
+        default_port = 443 if parts.scheme == "https" else 80
+        port = parts.port or default_port
+        if parts.scheme == "https":
+            connection = _PinnedHTTPSConnection(address, port, parts.hostname, timeout=timeout)
+        else:
+            connection = http.client.HTTPConnection(address, port, timeout=timeout)
+    except ValueError as e:
+        logger.warning(f"Callback to {url} refused: {e}")
+        raise CallbackFailed("callback URL refused (not a public http(s) address)")
+    host = parts.hostname if port == default_port else f"{parts.hostname}:{port}"
+    path = parts.path or "/"
+    if parts.query:
+        path += f"?{parts.query}"
+    try:
+        connection.request("POST", path, body=json.dumps(payload).encode(),
+                           headers={"Host": host, "Content-Type": "application/json"})
+        response = connection.getresponse()
+        response.read()
+    except (socket.timeout, TimeoutError) as e:
+        logger.warning(f"Callback to {url} timed out: {e}")
+        raise CallbackFailed("callback timed out")
+    except (OSError, http.client.HTTPException) as e:
+        logger.warning(f"Callback to {url} failed: {e}")
+        raise CallbackFailed("callback connection failed")
+    finally:
+        connection.close()
+    if not 200 <= response.status < 300:
+        raise CallbackFailed(f"callback answered HTTP {response.status}")
+
+
+class JobWorkers:
+    """
+    `workers` threads claiming jobs of `lanes` (default: all) from a JobQueue and
+    running them on `detector`, one thread renewing their leases, and one thread
+    delivering callbacks (CALLBACK_THREADS at a time) and pruning old jobs. Lease
+    renewal has its own thread so a slow callback host can never let a running
+    job's lease run out.
+    """
+
+    def __init__(self, queue, detector, workers=DEFAULT_WORKERS, lanes=None, lease_s=DEFAULT_LEASE_S,
+                 poll_s=DEFAULT_POLL_S, retention_s=DEFAULT_RETENTION_S, callback_hosts=()):
+        self.queue = queue
+        self.detector = detector
+        self.workers = max(1, int(workers))
+        self.lanes = list(lanes or LANES)
+        self.lease_s = lease_s
+        self.poll_s = poll_s
+        self.retention_s = retention_s
+        self.callback_hosts = callback_hosts
+        self.name = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.completed = 0
+        self.failed = 0
+        self._running = {}  # job id -> worker name
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._jobs_waiting = threading.Event()
+        self._callbacks_waiting = threading.Event()
+        self._threads = []
+
+    def start(self):
+        self._threads = [threading.Thread(target=self._work, args=(f"{self.name}/{n}",), name=f"job-worker-{n}",
+                                          daemon=True) for n in range(self.workers)]
+        self._threads.append(threading.Thread(target=self._renew_leases, name="job-leases", daemon=True))
+        self._threads.append(threading.Thread(target=self._callbacks, name="job-callbacks", daemon=True))
+        for thread in self._threads:
+            thread.start()
+        logger.info(f"Job workers started ({self.workers} x {self.name}, lanes={self.lanes})")
+
+    def wake(self):
+        """A job was just submitted: don't wait for the next poll"""
+        self._jobs_waiting.set()
+
+    def stop(self, timeout=5.0):
+        """
+        Stop claiming jobs. Jobs still running after `timeout` are handed back to the
+        queue, so a restarted or another worker runs them again.
+        """
+        self._stopping.set()
+        self._jobs_waiting.set()
+        self._callbacks_waiting.set()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        with self._lock:
+            running = dict(self._running)
+        for job_id, worker in running.items():
+            self.queue.release(job_id, worker)
+            logger.info(f"Job {job_id} handed back to the queue on shutdown")
+
+    def _work(self, worker):
+        while not self._stopping.is_set():
+            job = self.queue.claim(worker, self.lanes, self.lease_s)
+            if job is None:
+                self._jobs_waiting.wait(self.poll_s)
+                self._jobs_waiting.clear()
+                continue
+            with self._lock:
+                self._running[job["id"]] = worker
+            started = time.perf_counter()
+            result = error = None
+            try:
+                result = run_job(self.detector, self.queue.audio_path(job["id"]), json.loads(job["options"]))
+            except JobError as e:
+                error = str(e)
+            except Exception as e:
+                logger.exception(f"Job {job['id']} failed")
+                error = f"Job failed: {e}"
+            with self._lock:
+                self._running.pop(job["id"], None)
+            if not self.queue.finish(job["id"], worker, result, error):
+                # Handed back on shutdown, or the lease ran out and another worker has it
+                logger.warning(f"Job {job['id']} is no longer leased to {worker}, result dropped")
+                continue
+            self.failed += error is not None
+            self.completed += error is None
+            logger.info(f"Job {job['id']} ({job['lane']}) {'failed' if error else 'done'} "
+                        f"in {time.perf_counter() - started:.1f}s")
+            if job["callback_url"]:
+                self._callbacks_waiting.set()
+
+    def _renew_leases(self):
+        while not self._stopping.wait(self.lease_s / 4):
+            with self._lock:
+                leases = dict(self._running)
+            if leases:
+                try:
+                    self.queue.renew(leases, self.lease_s)
+                except sqlite3.Error as e:
+                    logger.warning(f"Renewing job leases failed, retrying: {e}")
+
+    def _callbacks(self):
+        last_prune = 0.0
+        with ThreadPoolExecutor(CALLBACK_THREADS, thread_name_prefix="job-callback") as executor:
+            while not self._stopping.is_set():
+                # No more than the executor runs at once: a claimed callback never waits for a free thread
+                rows = self.queue.claim_callbacks(CALLBACK_THREADS)
+                wait([executor.submit(self._deliver, row) for row in rows])
+                if time.monotonic() - last_prune >= PRUNE_INTERVAL_S:
+                    pruned = self.queue.prune(self.retention_s)
+                    if pruned:
+                        logger.info(f"Pruned {pruned} finished jobs")
+                    last_prune = time.monotonic()
+                if len(rows) < CALLBACK_THREADS:
+                    self._callbacks_waiting.wait(self.poll_s)
+                    self._callbacks_waiting.clear()
+
+    def _deliver(self, row):
+        try:
+            post_callback(row["callback_url"], job_view(row), allowed_hosts=self.callback_hosts)
+        except CallbackFailed as e:
+            logger.warning(f"Callback for job {row['id']} to {row['callback_url']} failed: {e}")
+            self.queue.callback_attempted(row["id"], str(e))
+        except Exception as e:
+            logger.error(f"Callback for job {row['id']} to {row['callback_url']} failed: {e}")
+            self.queue.callback_attempted(row["id"], "callback delivery failed")
+        else:
+            self.queue.callback_attempted(row["id"])
+
+    def snapshot(self):
+        with self._lock:
+            running = len(self._running)
+        return {"workers": self.workers, "lanes": self.lanes, "running": running,
+                "completed": self.completed, "failed": self.failed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dir", default=os.environ.get("JOB_DIR", DEFAULT_DIRECTORY),
+                        help="Job directory shared with the app (JOB_DIR)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Jobs run at the same time")
+    parser.add_argument("--lanes", nargs="+", choices=list(LANES), default=None,
+                        help="Only take jobs of these lanes (default: all, by priority)")
+    parser.add_argument("--lease", type=float, default=DEFAULT_LEASE_S,
+                        help="Seconds after which a silent worker's job is requeued")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    # Imported here: the app imports this module for the queue alone
+    from inference import loader
+    workers = JobWorkers(JobQueue(args.dir), loader.load(), args.workers, args.lanes, args.lease,
+                         callback_hosts=callback_hosts_from_env())
+    workers.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        workers.stop()
+
+
+if __name__ == "__main__":
+    main()
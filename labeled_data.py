@@ -0,0 +1,37 @@
+import os
+
+# Sub-folder names of a labeled fixture set, mapped to the API's classifications:
+#   <root>/real/*.wav, <root>/fake/*.mp3, ...
+LABEL_DIRS = {
+    "real": "HUMAN",
+    "human": "HUMAN",
+    "bonafide": "HUMAN",
+    "fake": "AI_GENERATED",
+    "ai": "AI_GENERATED",
+    "spoof": "AI_GENERATED",
+    "synthetic": "AI_GENERATED",
+}
+AUDIO_EXTENSIONS = (".wav", ".flac", ".mp3", ".ogg", ".m4a")
+
+
+def iter_audio_files(root):
+    """All audio files below `root`, in a stable order"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.lower().endswith(AUDIO_EXTENSIONS):
+                yield os.path.join(dirpath, name)
+
+
+def iter_labeled_folder(root):
+    """Yield (path, classification) for every clip under a known label folder of `root`"""
+    found = False
+    for entry in sorted(os.listdir(root)):
+        label = LABEL_DIRS.get(entry.lower())
+        if label is None or not os.path.isdir(os.path.join(root, entry)):
+            continue
+        for path in iter_audio_files(os.path.join(root, entry)):
+            found = True
+            yield path, label
+    if not found:
+        raise ValueError(f"No labeled clips under {root}; expected sub-folders named {sorted(LABEL_DIRS)}")
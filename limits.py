@@ -0,0 +1,66 @@
+import json
+
+from starlette.exceptions import HTTPException
+
+# Defaults (overridable through environment variables in app.py)
+DEFAULT_MAX_UPLOAD_BYTES = 32 * 1024 * 1024     # one encoded clip
+DEFAULT_MAX_BATCH_BYTES = 128 * 1024 * 1024     # a whole /detect/batch request
+DEFAULT_MAX_DECODE_SECONDS = 600.0               # decoding stops after this much audio
+# Headroom for multipart boundaries / JSON around the audio itself
+BODY_OVERHEAD_BYTES = 64 * 1024
+
+
+def base64_size(n_bytes):
+    """Length of `n_bytes` encoded as base64"""
+    return 4 * -(-n_bytes // 3)
+
+
+class BodySizeLimit:
+    """
+    ASGI middleware capping HTTP request bodies at `limit_for(path)` bytes (None = no cap).
+
+    A Content-Length over the cap is answered with 413 before anything is read, so
+    the client never gets a 100-continue; bodies without one (chunked uploads) are
+    counted as they arrive and the read fails with 413 as soon as they cross it.
+    Either way no more than the cap is ever buffered.
+    """
+
+    def __init__(self, app, limit_for):
+        self.app = app
+        self.limit_for = limit_for
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        limit = self.limit_for(scope["path"])
+        if limit is None:
+            return await self.app(scope, receive, send)
+
+        for name, value in scope["headers"]:
+            if name == b"content-length" and value.isdigit() and int(value) > limit:
+                return await self.reject(send, limit)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise HTTPException(status_code=413, detail=too_large(limit))
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    @staticmethod
+    async def reject(send, limit):
+        body = json.dumps({"detail": too_large(limit)}).encode()
+        await send({"type": "http.response.start", "status": 413,
+                    "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                                (b"connection", b"close")]})
+        await send({"type": "http.response.body", "body": body})
+
+
+def too_large(limit):
+    return f"Request body larger than {limit / (1024 * 1024):.1f} MB"
@@ -0,0 +1,214 @@
+import bisect
+import contextlib
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# METRICS_ENABLED=0 turns every stage() into a shared no-op context manager.
+# TRACING=otel wraps the same stages in OpenTelemetry spans (the SDK / exporter is
+# configured the usual OpenTelemetry way, e.g. OTEL_* variables); the default is none.
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+TRACING = os.environ.get("TRACING", "none")
+
+# Pipeline stages of a prediction, in order
+STAGES = ("base64_decode", "audio_decode", "vad", "feature_extraction", "forward", "index_lookup", "postprocess")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DURATION_BUCKETS = (0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+BYTES_BUCKETS = tuple(2 ** p for p in range(12, 28, 2))  # 4 KB .. 64 MB
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, key, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(labelnames, key)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    """A metric family: one value per combination of label values"""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(labels[name] for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value:g}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1.0, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(Metric):
+    """Set explicitly, or computed at scrape time by `fn` (label-less gauges only)"""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), fn=None):
+        super().__init__(name, documentation, labelnames)
+        self.fn = fn
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+    def inc(self, amount=1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount=1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def render(self):
+        if self.fn is not None:
+            try:
+                self.set(self.fn())
+            except Exception as e:
+                logger.debug(f"Gauge {self.name} callback failed: {e}")
+        return super().render()
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # per-bucket counts (last one is +Inf), sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = [(key, (list(state[0]), state[1], state[2])) for key, state in self._values.items()]
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total:g}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+REGISTRY = []
+
+
+def render():
+    """Everything in the Prometheus text exposition format (version 0.0.4)"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+STAGE_SECONDS = Histogram("voice_stage_seconds", "Time spent in each prediction stage (per call / batch)",
+                          ["stage"])
+RESULTS = Counter("voice_results_total", "Classified clips by classification and where the answer came from",
+                  ["classification", "source"])
+HTTP_REQUESTS = Counter("voice_http_requests_total", "HTTP requests by route and status code",
+                        ["method", "route", "status"])
+HTTP_IN_FLIGHT = Gauge("voice_http_requests_in_flight", "HTTP requests currently being served")
+INPUT_SECONDS = Histogram("voice_input_duration_seconds", "Decoded audio duration per clip",
+                          buckets=DURATION_BUCKETS)
+INPUT_BYTES = Histogram("voice_input_bytes", "Encoded audio size per clip", buckets=BYTES_BUCKETS)
+EXIT_LAYERS = Counter("voice_exit_layer_total", "Clips (windows of chunked ones) by the encoder layer that decided them",
+                      ["layer"])
+INDEX_MATCHES = Counter("voice_index_matches_total", "Clips answered by a near-duplicate in the embedding index",
+                        ["classification"])
+CASCADE_CLIPS = Counter("voice_cascade_clips_total",
+                        "Clips (windows of chunked ones) by the cascade stage that decided them", ["stage"])
+CASCADE_STAGE_SECONDS = Counter("voice_cascade_stage_seconds_total", "Time spent in each cascade stage", ["stage"])
+CASCADE_SAVED_SECONDS = Counter("voice_cascade_saved_seconds_total",
+                                "Full-model time not spent on clips the screener decided, at the mean full-model "
+                                "time per escalated clip (subtract the screener stage seconds for the net saving)")
+MODEL_LOAD_SECONDS = Gauge("voice_model_load_seconds", "Cold-start time of the loaded model by phase", ["phase"])
+
+
+def _make_tracer():
+    if TRACING == "none":
+        return None
+    if TRACING != "otel":
+        raise ValueError(f"Unknown TRACING '{TRACING}', expected 'none' or 'otel'")
+    try:
+        from opentelemetry import trace
+    except ImportError:
+        logger.warning("TRACING=otel but opentelemetry-api is not installed; tracing disabled")
+        return None
+    return trace.get_tracer("voice-detector")
+
+
+tracer = _make_tracer()
+_NOOP = contextlib.nullcontext()
+
+
+@contextlib.contextmanager
+def _stage(name):
+    span = tracer.start_as_current_span(name) if tracer is not None else _NOOP
+    with span:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            if METRICS_ENABLED:
+                STAGE_SECONDS.observe(time.perf_counter() - started, stage=name)
+
+
+def stage(name):
+    """Context manager timing one pipeline stage (histogram + span); a shared no-op when both are off"""
+    if not METRICS_ENABLED and tracer is None:
+        return _NOOP
+    return _stage(name)
+
+
+def observe_stage(name, seconds):
+    """Record a stage that was timed elsewhere (e.g. inside a worker process)"""
+    if METRICS_ENABLED:
+        STAGE_SECONDS.observe(seconds, stage=name)
+
+
+def timed(fn, *args):
+    """(fn(*args), seconds); picklable, so process workers can time their own work"""
+    started = time.perf_counter()
+    return fn(*args), time.perf_counter() - started
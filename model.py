@@ -14,10 +14,11 @@ class ChannelAttention(nn.Module):
         self.sigmoid = nn.Sigmoid()
 
     def forward(self, x):
-        avg_out = self.fc2(self.relu1(self.fc1(self.avg_pool(x))))
-        max_out = self.fc2(self.relu1(self.fc1(self.max_pool(x))))
-        out = avg_out + max_out
-        return self.sigmoid(out)
+        # Run the shared MLP once over both pooled descriptors stacked along the batch
+        b = x.size(0)
+        pooled = torch.cat([self.avg_pool(x), self.max_pool(x)], dim=0)
+        out = self.fc2(self.relu1(self.fc1(pooled)))
+        return self.sigmoid(out[:b] + out[b:])
 
 class SpatialAttention(nn.Module):
     def __init__(self, kernel_size=7):
@@ -61,10 +62,6 @@ class DualPathDA(nn.Module):
         self.ca = ChannelAttention(128)
         self.sa = SpatialAttention()
         
-        # Recurrent Back-end (Temporal Analysis)
-        # Using GRU as it's lighter than LSTM
-        self.gru = nn.GRU(128, 64, bidirectional=True, batch_first=True)
-        
         # Classification Head
         self.fc1 = nn.Linear(128, 64)
         self.dropout = nn.Dropout(0.3)
@@ -82,26 +79,9 @@ class DualPathDA(nn.Module):
         x = self.ca(x) * x
         x = self.sa(x) * x
         
-        # Prepare for RNN
-        # Reshape: [batch, channels, freq, time] -> [batch, time, channels*freq]
-        b, c, f, t = x.size()
-        x = x.permute(0, 3, 1, 2).contiguous()
-        x = x.view(b, t, -1)
-        
-        # RNN Path needs correct input size, adaptable via adaptive pool or fixed assumption
-        # For simplicity in this demo, we use global average pooling instead of GRU if dimensions mismatch widely
-        # But let's try to assume a standard input size or use adaptive pooling before GRU
-        
-        # Simplification for flexibility: Global Max Pooling over time instead of GRU complex sequence handling
-        # This makes the model input-size agnostic
-        x = torch.mean(x, dim=1) # Average over time [batch, c*f] -> this is too big if c*f is large.
-        
-        # Let's use adaptive pool instead to get fixed feature vector
-        # x was [b, c, f, t]. Let's pool manually to [b, 128]
-        # Using Global Average Pooling on the channel dimension essentially
-        
-        # Re-approach: GAP directly on the feature map
-        # x is [b, 128, f, t] from conv3/attention
+        # Global average pooling over the attended feature map keeps the model
+        # input-size agnostic: [b, 128, f, t] -> [b, 128]
+        b = x.size(0)
         x = F.adaptive_avg_pool2d(x, (1, 1)) # -> [b, 128, 1, 1]
         x = x.view(b, -1) # -> [b, 128]
         
@@ -110,3 +90,24 @@ class DualPathDA(nn.Module):
         x = self.fc2(x)
         
         return x
+
+    def _load_from_state_dict(self, state_dict, prefix, *args, **kwargs):
+        # Checkpoints from before the unused GRU was removed still carry its weights
+        for key in [k for k in state_dict if k.startswith(prefix + "gru.")]:
+            del state_dict[key]
+        super()._load_from_state_dict(state_dict, prefix, *args, **kwargs)
+
+
+class DualPathDetector(nn.Module):
+    """
+    Lightweight detector: waveform -> spectral front end -> DualPathDA -> logits.
+    Serves as the low-latency alternative to the transformer (MODEL_BACKEND=dualpath).
+    """
+    def __init__(self, front_end, num_classes=2):
+        super(DualPathDetector, self).__init__()
+        self.front_end = front_end
+        self.classifier = DualPathDA(input_channels=1, num_classes=num_classes)
+
+    def forward(self, waveforms):
+        # waveforms: [batch, samples] -> features [batch, 1, bins, frames]
+        return self.classifier(self.front_end(waveforms))
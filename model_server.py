@@ -0,0 +1,264 @@
+"""
+Single model-owner process for multi-worker serving.
+
+    python model_server.py --workers 4 [--port 7860]
+    MODEL_SERVER_AUTHKEY=<hex> python model_server.py --socket /run/voice/model.sock
+
+Loads the detector once (same MODEL_* / CASCADE_* / EXECUTION_PROFILE settings as
+the app) and serves it over a Unix socket. Front-end workers started with
+MODEL_SERVER=<socket> don't load the weights: their RemoteDetector writes decoded
+waveforms into a per-worker shared-memory arena and sends only offsets. Workers
+still import torch and librosa (decoding stays in the workers), so what a worker
+saves is the weights and the model's working memory, not the interpreter's
+baseline.
+
+Connections are authenticated with MODEL_SERVER_AUTHKEY (hex), as messages are
+pickles. With --workers the script generates a random key for the run, puts the
+socket in a private (0700) temporary directory unless --socket is given, and
+runs `uvicorn app:app --workers N` with both in its environment. Run on its own,
+it needs MODEL_SERVER_AUTHKEY set, and workers started separately need the same.
+"""
+import argparse
+import logging
+import os
+import secrets
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing import resource_tracker
+from multiprocessing.connection import Client, Listener
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from inference import ModelLoader, MODEL_SERVER_AUTHKEY
+
+logger = logging.getLogger(__name__)
+
+SOCKET_NAME = "model.sock"
+AUTHKEY_BYTES = 32
+DEFAULT_ARENA_BYTES = 16 * 1024 * 1024   # ~4 min of 16 kHz float32 audio per worker, grows on demand
+CONNECT_TIMEOUT_S = 60.0
+# Detector methods a front end may call, all taking waveforms first
+METHODS = ("predict_waveforms", "predict_chunked", "fake_probabilities")
+
+
+def authkey_from_env():
+    """MODEL_SERVER_AUTHKEY as bytes; never a built-in default"""
+    if not MODEL_SERVER_AUTHKEY:
+        raise RuntimeError("MODEL_SERVER_AUTHKEY is not set (model_server.py --workers sets it for its workers)")
+    return bytes.fromhex(MODEL_SERVER_AUTHKEY)
+
+
+def attach(name):
+    """Map a worker's arena without adopting it: the worker owns (and unlinks) it"""
+    shm = SharedMemory(name=name)
+    # Before Python 3.13 attaching registers the segment with this process's
+    # resource tracker, which would unlink it when the model server exits
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+class ModelServer:
+    """Serves one detector to any number of front-end connections, one thread each"""
+
+    def __init__(self, detector, address, authkey):
+        self.detector = detector
+        self.address = address
+        self.authkey = authkey
+        # One forward pass at a time; torch already uses every core for it
+        self._lock = threading.Lock()
+
+    def hello(self):
+        return {
+            "model_id": self.detector.model_id,
+            "profile": self.detector.profile,
+            "backend_name": self.detector.backend_name,
+            "load_timings": self.detector.load_timings,
+            "id2label": self.detector.id2label,
+        }
+
+    def serve_forever(self):
+        if os.path.exists(self.address):
+            os.remove(self.address)
+        with Listener(self.address, family="AF_UNIX", authkey=self.authkey) as listener:
+            logger.info(f"Model server listening on {self.address}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:  # failed handshake, keep serving the others
+                    logger.warning(f"Rejected connection: {e}")
+                    continue
+                threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        arena = None
+        try:
+            conn.send(self.hello())
+            while True:
+                try:
+                    method, segment, spans, options = conn.recv()
+                except EOFError:
+                    break
+                if arena is None or arena.name != segment:
+                    if arena is not None:
+                        arena.close()
+                    arena = attach(segment)
+                waveforms = [np.ndarray((length,), dtype=np.float32, buffer=arena.buf, offset=offset)
+                             for offset, length in spans]
+                try:
+                    if method not in METHODS:
+                        raise ValueError(f"Unknown method '{method}'")
+                    with self._lock:
+                        if method == "predict_chunked":
+                            result = self.detector.predict_chunked(waveforms[0], **options)
+                        else:
+                            result = getattr(self.detector, method)(waveforms)
+                    reply = ("ok", result)
+                except Exception as e:
+                    logger.error(f"{method} failed: {e}")
+                    reply = ("error", str(e))
+                # Views must be gone before the arena can be closed
+                del waveforms
+                conn.send(reply)
+        finally:
+            if arena is not None:
+                arena.close()
+            conn.close()
+
+
+class RemoteDetector:
+    """
+    VoiceDetector stand-in for front-end workers (MODEL_SERVER=<socket>): same
+    prediction methods and attributes, executed by the model server. Waveforms
+    travel through this worker's shared-memory arena; only offsets are pickled.
+    """
+
+    def __init__(self, address, connect_timeout_s=CONNECT_TIMEOUT_S, arena_bytes=DEFAULT_ARENA_BYTES, authkey=None):
+        self.address = address
+        self.authkey = authkey or authkey_from_env()
+        self.arena_bytes = arena_bytes
+        self.cache = None
+        self._arena = None
+        self._conn = None
+        self._lock = threading.Lock()
+        info = self._connect(connect_timeout_s)
+        self.model_id = info["model_id"]
+        self.profile = info["profile"]
+        self.backend_name = f"remote({info['backend_name']})"
+        self.load_timings = info["load_timings"]
+        self.id2label = info["id2label"]
+
+    def _connect(self, timeout_s=0.0):
+        """Connect, retrying while the model server is still starting"""
+        deadline = time.monotonic() + timeout_s
+        while True:
+            try:
+                self._conn = Client(self.address, family="AF_UNIX", authkey=self.authkey)
+                return self._conn.recv()
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.monotonic() > deadline:
+                    raise ConnectionError(f"No model server at {self.address}")
+                time.sleep(0.5)
+
+    def _write(self, waveforms):
+        """Copy waveforms into the arena (growing it if needed); returns (byte offset, length) spans"""
+        needed = sum(len(y) for y in waveforms) * 4
+        if self._arena is None or needed > self._arena.size:
+            if self._arena is not None:
+                self._arena.close()
+                self._arena.unlink()
+            self._arena = SharedMemory(create=True, size=max(needed, self.arena_bytes))
+        data = np.ndarray((self._arena.size // 4,), dtype=np.float32, buffer=self._arena.buf)
+        spans, start = [], 0
+        for y in waveforms:
+            data[start:start + len(y)] = y
+            spans.append((start * 4, len(y)))
+            start += len(y)
+        del data
+        return spans
+
+    def _call(self, method, waveforms, **options):
+        with self._lock:
+            spans = self._write(waveforms)
+            try:
+                if self._conn is None:
+                    self._connect()
+                self._conn.send((method, self._arena.name, spans, options))
+                status, result = self._conn.recv()
+            except (EOFError, OSError) as e:
+                # Model server restarted or died: reconnect on the next call
+                self._conn = None
+                raise ConnectionError(f"Lost connection to model server: {e}")
+        if status != "ok":
+            raise RuntimeError(result)
+        return result
+
+    def predict_waveforms(self, waveforms):
+        return self._call("predict_waveforms", list(waveforms))
+
+    def fake_probabilities(self, waveforms):
+        return self._call("fake_probabilities", list(waveforms))
+
+    def predict_chunked(self, y, **options):
+        return self._call("predict_chunked", [y], **options)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            if self._arena is not None:
+                self._arena.close()
+                self._arena.unlink()
+                self._arena = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--socket", default=None,
+                        help="Unix socket to listen on (default: in a new private temporary directory)")
+    parser.add_argument("--workers", type=int, default=0, help="Also run uvicorn app:app with this many workers")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 7860)))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.workers:
+        authkey = bytes.fromhex(MODEL_SERVER_AUTHKEY) if MODEL_SERVER_AUTHKEY else secrets.token_bytes(AUTHKEY_BYTES)
+    else:
+        try:
+            authkey = authkey_from_env()
+        except RuntimeError as e:
+            parser.error(str(e))
+    # mkdtemp creates the directory 0700: only this user can reach the socket
+    private_dir = tempfile.mkdtemp(prefix="voice-detector-") if args.socket is None else None
+    address = args.socket or os.path.join(private_dir, SOCKET_NAME)
+
+    detector = ModelLoader(server_address="").load()
+    server = ModelServer(detector, address, authkey)
+    try:
+        if not args.workers:
+            server.serve_forever()
+            return
+
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        env = dict(os.environ, MODEL_SERVER=address, MODEL_SERVER_AUTHKEY=authkey.hex())
+        app = subprocess.Popen([sys.executable, "-m", "uvicorn", "app:app", "--host", args.host,
+                                "--port", str(args.port), "--workers", str(args.workers)],
+                               cwd=os.path.dirname(os.path.abspath(__file__)), env=env)
+        try:
+            sys.exit(app.wait())
+        except KeyboardInterrupt:
+            app.terminate()
+            app.wait()
+    finally:
+        if private_dir is not None:
+            shutil.rmtree(private_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
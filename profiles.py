@@ -0,0 +1,53 @@
+import contextlib
+import logging
+import warnings
+
+import torch
+import torch.nn as nn
+
+logger = logging.getLogger(__name__)
+
+# Execution profiles for CPU serving:
+#   fp32 - eager fp32, the reference
+#   int8 - dynamic INT8 quantization of every nn.Linear (weights int8, activations quantized per batch)
+#   bf16 - bfloat16 autocast with channels-last weights (needs AVX512-BF16/AMX to pay off)
+PROFILES = ("fp32", "int8", "bf16")
+DEFAULT_PROFILE = "fp32"
+
+
+def configure_threads(intra_op=None, inter_op=None):
+    """Pin torch's intra-/inter-op thread pools; 0 or None keeps torch's default"""
+    if intra_op:
+        torch.set_num_threads(int(intra_op))
+    if inter_op:
+        try:
+            torch.set_num_interop_threads(int(inter_op))
+        except RuntimeError as e:
+            # Can only be set once, before any inter-op parallel work has started
+            logger.warning(f"Could not set inter-op threads: {e}")
+    logger.info(f"Torch threads: intra-op={torch.get_num_threads()}, inter-op={torch.get_num_interop_threads()}")
+
+
+def apply_profile(model, profile=DEFAULT_PROFILE):
+    """Return the model prepared for `profile` (a new module for int8, the same one otherwise)"""
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown execution profile '{profile}', expected one of {PROFILES}")
+    model.eval()
+    if profile == "int8":
+        from torch.ao.quantization import quantize_dynamic
+        with warnings.catch_warnings():
+            # Eager-mode quantization is deprecated upstream in favour of torchao, still works on CPU wheels
+            warnings.simplefilter("ignore")
+            model = quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+    elif profile == "bf16":
+        model = model.to(memory_format=torch.channels_last)
+    return model
+
+
+def forward_context(profile=DEFAULT_PROFILE, device_type="cpu"):
+    """Context for a forward pass under `profile`: always inference_mode, plus autocast for bf16"""
+    stack = contextlib.ExitStack()
+    stack.enter_context(torch.inference_mode())
+    if profile == "bf16":
+        stack.enter_context(torch.autocast(device_type=device_type, dtype=torch.bfloat16))
+    return stack
@@ -0,0 +1,289 @@
+"""
+Offline batch scoring of audio archives with VoiceDetector, no server involved.
+
+    python score_batch.py recordings/ --out scores.jsonl [--batch-size 16] [--workers 8]
+    python score_batch.py manifest.jsonl --out scores.parquet [--model-path DIR] [--backend onnx]
+
+The input is a directory (scanned recursively for audio files) or a JSONL manifest
+with one {"path": ..., "id": ...} object per line; relative manifest paths resolve
+against the manifest's directory. Clips are decoded in a process pool, batched
+through the model and written out as they finish.
+
+The output is also the checkpoint: rerunning the same command skips every clip
+already in it, so a killed run resumes where it stopped. A ".parquet" output is a
+directory of part files, each renamed into place only once it is complete.
+"""
+import argparse
+import collections
+import glob
+import itertools
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import chunking
+from audio import SAMPLE_RATE, DEFAULT_RESAMPLE_QUALITY, RESAMPLE_QUALITIES, load_audio
+from batching import DEFAULT_MAX_BATCH_SIZE
+from inference import ModelLoader, error_result
+from labeled_data import iter_audio_files
+from profiles import PROFILES
+from workers import DEFAULT_DECODE_WORKERS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Columns of every output row, in order
+ROW_FIELDS = ("path", "id", "classification", "confidence", "explanation", "stage", "duration_s")
+# Decoded clips waiting for the model, per decode worker
+PREFETCH_PER_WORKER = 4
+DEFAULT_PART_ROWS = 5000
+DEFAULT_LOG_EVERY_S = 10.0
+
+
+def iter_inputs(source):
+    """{"path", "id"} items of a directory or a JSONL manifest"""
+    if os.path.isdir(source):
+        for path in iter_audio_files(source):
+            yield {"path": path, "id": None}
+        return
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source) as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                yield {"path": os.path.join(base, item["path"]), "id": item.get("id")}
+
+
+def decode_clip(path, quality, max_duration):
+    """Runs in a decode worker: (waveform, None) or (None, error message)"""
+    try:
+        with open(path, "rb") as f:
+            return load_audio(f, quality=quality, max_duration=max_duration), None
+    except Exception as e:
+        return None, f"Invalid audio data: {e}"
+
+
+def iter_decoded(items, executor, quality, max_duration, prefetch):
+    """(item, waveform, error) in input order, with at most `prefetch` clips decoded ahead"""
+    items = iter(items)
+    pending = collections.deque()
+
+    def submit(batch):
+        for item in batch:
+            pending.append((item, executor.submit(decode_clip, item["path"], quality, max_duration)))
+
+    submit(itertools.islice(items, prefetch))
+    while pending:
+        item, future = pending.popleft()
+        submit(itertools.islice(items, 1))
+        y, error = future.result()
+        yield item, y, error
+
+
+class JsonlWriter:
+    """One JSON object per line, flushed after every batch"""
+
+    def __init__(self, path, **options):
+        self.file = open(path, "a")
+
+    @staticmethod
+    def completed(path, retry_errors=False):
+        """
+        Paths already scored; a torn last line from a killed run is cut off. Only
+        newline-terminated lines count: a row cut short can still parse as JSON.
+        """
+        done = set()
+        if not os.path.exists(path):
+            return done
+        with open(path, "rb+") as f:
+            good_bytes = 0
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    break
+                good_bytes += len(line)
+                if not (retry_errors and row["classification"] == "ERROR"):
+                    done.add(row["path"])
+            f.truncate(good_bytes)
+        return done
+
+    def write(self, rows):
+        for row in rows:
+            self.file.write(json.dumps(row) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    """Directory of part-NNNNN.parquet files of `part_rows` rows; a part only appears once written"""
+
+    def __init__(self, path, part_rows=DEFAULT_PART_ROWS, **options):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.part_rows = part_rows
+        self.part = len(glob.glob(os.path.join(path, "part-*.parquet")))
+        self.rows = []
+
+    @staticmethod
+    def completed(path, retry_errors=False):
+        import pyarrow.parquet as pq
+        done = set()
+        for leftover in glob.glob(os.path.join(path, "*.tmp")):
+            os.remove(leftover)
+        for part in sorted(glob.glob(os.path.join(path, "part-*.parquet"))):
+            table = pq.read_table(part, columns=["path", "classification"]).to_pydict()
+            done.update(p for p, c in zip(table["path"], table["classification"])
+                        if not (retry_errors and c == "ERROR"))
+        return done
+
+    def write(self, rows):
+        self.rows.extend(rows)
+        if len(self.rows) >= self.part_rows:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        schema = pa.schema([("path", pa.string()), ("id", pa.string()), ("classification", pa.string()),
+                            ("confidence", pa.float64()), ("explanation", pa.string()), ("stage", pa.string()),
+                            ("duration_s", pa.float64())])
+        final = os.path.join(self.path, f"part-{self.part:05d}.parquet")
+        rows = [dict(row, id=None if row["id"] is None else str(row["id"])) for row in self.rows]
+        pq.write_table(pa.Table.from_pylist(rows, schema=schema), final + ".tmp")
+        os.replace(final + ".tmp", final)
+        self.part += 1
+        self.rows = []
+
+    def close(self):
+        self.flush()
+
+
+class Throughput:
+    """Clips/s and audio-seconds/s since the start of the run"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.clips = 0
+        self.errors = 0
+        self.audio_seconds = 0.0
+
+    def record(self, rows):
+        self.clips += len(rows)
+        self.errors += sum(row["classification"] == "ERROR" for row in rows)
+        self.audio_seconds += sum(row["duration_s"] or 0.0 for row in rows)
+
+    def snapshot(self):
+        elapsed = time.perf_counter() - self.started
+        return {
+            "clips": self.clips,
+            "errors": self.errors,
+            "audio_seconds": round(self.audio_seconds, 1),
+            "elapsed_s": round(elapsed, 2),
+            "clips_per_s": round(self.clips / elapsed, 2) if elapsed else 0.0,
+            "audio_s_per_s": round(self.audio_seconds / elapsed, 1) if elapsed else 0.0,
+        }
+
+
+def make_row(item, result, y):
+    row = dict.fromkeys(ROW_FIELDS)
+    row.update({key: value for key, value in result.items() if key in ROW_FIELDS})
+    row["path"], row["id"] = item["path"], item["id"]
+    row["duration_s"] = round(len(y) / SAMPLE_RATE, 3) if y is not None else None
+    return row
+
+
+def score_batch(detector, batch, chunk_threshold_s):
+    """Rows for a list of (item, waveform): one forward pass for short clips, windows for long ones"""
+    short = [(item, y) for item, y in batch if len(y) <= chunk_threshold_s * SAMPLE_RATE]
+    long = [(item, y) for item, y in batch if len(y) > chunk_threshold_s * SAMPLE_RATE]
+    rows = []
+    if short:
+        try:
+            results = detector.predict_waveforms([y for _, y in short])
+        except Exception as e:
+            logger.error(f"Batch of {len(short)} failed: {e}")
+            results = [error_result(e)] * len(short)
+        rows += [make_row(item, result, y) for (item, y), result in zip(short, results)]
+    for item, y in long:
+        try:
+            result = detector.predict_chunked(y)
+        except Exception as e:
+            logger.error(f"{item['path']} failed: {e}")
+            result = error_result(e)
+        rows.append(make_row(item, result, y))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("source", help="Directory of audio files or a JSONL manifest")
+    parser.add_argument("--out", required=True, help="Results: *.jsonl file or *.parquet directory")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_MAX_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=DEFAULT_DECODE_WORKERS, help="Decode processes")
+    parser.add_argument("--model-path", default=None, help="Local model / artifact directory (defaults to MODEL_PATH)")
+    parser.add_argument("--backend", default=None, help="Model backend (defaults to MODEL_BACKEND)")
+    parser.add_argument("--profile", choices=PROFILES, default=None)
+    parser.add_argument("--resample-quality", choices=tuple(RESAMPLE_QUALITIES), default=DEFAULT_RESAMPLE_QUALITY)
+    parser.add_argument("--max-seconds", type=float, default=None, help="Decode at most this many seconds per clip")
+    parser.add_argument("--chunk-threshold", type=float, default=chunking.DEFAULT_THRESHOLD_S,
+                        help="Clips longer than this (s) are scored as windows")
+    parser.add_argument("--part-rows", type=int, default=DEFAULT_PART_ROWS, help="Rows per Parquet part file")
+    parser.add_argument("--retry-errors", action="store_true", help="Re-score clips that failed in earlier runs (the newer row supersedes the ERROR one)")
+    parser.add_argument("--log-every", type=float, default=DEFAULT_LOG_EVERY_S, help="Progress interval (s)")
+    args = parser.parse_args()
+
+    writer_cls = ParquetWriter if args.out.endswith(".parquet") else JsonlWriter
+    done = writer_cls.completed(args.out, retry_errors=args.retry_errors)
+    items = [item for item in iter_inputs(args.source) if item["path"] not in done]
+    logger.info(f"{len(items)} clips to score, {len(done)} already in {args.out}")
+
+    # Fork the decode workers before the model (and torch's thread pools) exist
+    executor = ProcessPoolExecutor(max_workers=max(1, args.workers))
+    executor.submit(int).result()
+    detector = ModelLoader(model_path=args.model_path, profile=args.profile, backend=args.backend).load()
+    writer = writer_cls(args.out, part_rows=args.part_rows)
+
+    throughput = Throughput()
+    last_log = time.perf_counter()
+
+    def emit(rows):
+        nonlocal last_log
+        writer.write(rows)
+        throughput.record(rows)
+        if time.perf_counter() - last_log >= args.log_every:
+            last_log = time.perf_counter()
+            progress = throughput.snapshot()
+            logger.info(f"{progress['clips']}/{len(items)} clips, {progress['clips_per_s']} clips/s, "
+                        f"{progress['audio_s_per_s']} audio-s/s")
+
+    try:
+        batch = []
+        for item, y, error in iter_decoded(items, executor, args.resample_quality, args.max_seconds,
+                                           prefetch=max(args.batch_size, args.workers * PREFETCH_PER_WORKER)):
+            if error is not None:
+                emit([make_row(item, error_result(error), None)])
+                continue
+            batch.append((item, y))
+            if len(batch) >= args.batch_size:
+                emit(score_batch(detector, batch, args.chunk_threshold))
+                batch = []
+        if batch:
+            emit(score_batch(detector, batch, args.chunk_threshold))
+    finally:
+        writer.close()
+        executor.shutdown(cancel_futures=True)
+
+    print(json.dumps({**throughput.snapshot(), "skipped": len(done), "out": args.out}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import gzip
+import hashlib
+import os
+
+from starlette.responses import Response
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+# Browsers revalidate on every load, which costs a 304 while the page is unchanged
+# and picks up a new deploy immediately
+CACHE_CONTROL = "no-cache"
+
+
+def etag_matches(if_none_match, etags):
+    """Whether an If-None-Match header names any of `etags` (weak comparison, as for GET)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return bool(candidates & set(etags))
+
+
+class StaticPage:
+    """
+    A static file read once, with `replacements` applied, and kept in memory both
+    plain and gzipped. Each form has its own ETag; a request naming either gets a
+    304 and no body.
+    """
+
+    def __init__(self, path, media_type="text/html; charset=utf-8", replacements=None):
+        with open(path, "rb") as f:
+            body = f.read()
+        for placeholder, value in (replacements or {}).items():
+            body = body.replace(placeholder.encode(), str(value).encode())
+        self.media_type = media_type
+        self.body = body
+        self.gzipped = gzip.compress(body, compresslevel=9, mtime=0)
+        digest = hashlib.sha256(body).hexdigest()[:16]
+        self.etag, self.gzip_etag = f'"{digest}"', f'"{digest}-gzip"'
+
+    def response(self, request):
+        gzipped = "gzip" in request.headers.get("accept-encoding", "")
+        headers = {"ETag": self.gzip_etag if gzipped else self.etag, "Cache-Control": CACHE_CONTROL,
+                   "Vary": "Accept-Encoding"}
+        if etag_matches(request.headers.get("if-none-match"), (self.etag, self.gzip_etag)):
+            return Response(status_code=304, headers=headers)
+        if gzipped:
+            return Response(self.gzipped, media_type=self.media_type, headers={**headers, "Content-Encoding": "gzip"})
+        return Response(self.body, media_type=self.media_type, headers=headers)
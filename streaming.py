@@ -0,0 +1,143 @@
+import logging
+import time
+
+import numpy as np
+
+from audio import SAMPLE_RATE, DEFAULT_RESAMPLE_QUALITY, RESAMPLE_QUALITIES
+
+logger = logging.getLogger(__name__)
+
+# Defaults (overridable through environment variables in app.py)
+DEFAULT_WINDOW_S = 2.0        # audio scored per update
+DEFAULT_UPDATE_S = 0.5        # new audio between updates
+DEFAULT_CPU_BUDGET = 0.25     # fraction of one inference thread a stream may keep busy
+DEFAULT_MAX_STREAMS = 4
+DEFAULT_MAX_FRAME_BYTES = 256 * 1024
+
+# Frame encodings: little-endian PCM16 / float32 mono at the declared rate, or Opus packets
+ENCODINGS = ("pcm16", "f32", "opus")
+OPUS_RATES = (8000, 12000, 16000, 24000, 48000)
+OPUS_MAX_FRAME_S = 0.12
+
+
+class RingBuffer:
+    """Fixed-size float32 ring of the most recent samples"""
+
+    def __init__(self, capacity):
+        self.capacity = int(capacity)
+        self._data = np.zeros(self.capacity, dtype=np.float32)
+        self._end = 0         # write position
+        self.filled = 0
+        self.total = 0       # samples ever written
+
+    def write(self, samples):
+        self.total += len(samples)
+        samples = samples[-self.capacity:]
+        n = len(samples)
+        first = min(n, self.capacity - self._end)
+        self._data[self._end:self._end + first] = samples[:first]
+        self._data[:n - first] = samples[first:]
+        self._end = (self._end + n) % self.capacity
+        self.filled = min(self.capacity, self.filled + n)
+
+    def latest(self, n):
+        """Copy of the last min(n, filled) samples in time order"""
+        n = min(int(n), self.filled)
+        start = (self._end - n) % self.capacity
+        if start + n <= self.capacity:
+            return self._data[start:start + n].copy()
+        return np.concatenate([self._data[start:], self._data[:self._end]])
+
+
+class FrameDecoder:
+    """Binary WebSocket frames -> float32 samples at SAMPLE_RATE"""
+
+    def __init__(self, encoding="pcm16", sample_rate=SAMPLE_RATE, quality=DEFAULT_RESAMPLE_QUALITY):
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Unknown encoding '{encoding}', expected one of {ENCODINGS}")
+        self.encoding = encoding
+        self.sample_rate = int(sample_rate)
+        self._opus = None
+        self._resampler = None
+        if encoding == "opus":
+            if self.sample_rate not in OPUS_RATES:
+                raise ValueError(f"Opus decodes at {OPUS_RATES} Hz, not {self.sample_rate}")
+            try:
+                import opuslib
+            except ImportError:
+                raise ValueError("Opus frames need the optional 'opuslib' package (and libopus)")
+            self._opus = opuslib.Decoder(self.sample_rate, 1)
+        if self.sample_rate != SAMPLE_RATE:
+            import soxr
+            # Stateful, so frame boundaries don't produce filter edge artifacts
+            self._resampler = soxr.ResampleStream(self.sample_rate, SAMPLE_RATE, 1, dtype="float32",
+                                                  quality=RESAMPLE_QUALITIES[quality].split("_")[1])
+
+    def decode(self, frame):
+        if self.encoding == "opus":
+            pcm = self._opus.decode(bytes(frame), int(OPUS_MAX_FRAME_S * self.sample_rate))
+            y = np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768.0
+        elif self.encoding == "pcm16":
+            if len(frame) % 2:
+                raise ValueError("PCM16 frame has an odd number of bytes")
+            y = np.frombuffer(frame, dtype="<i2").astype(np.float32) / 32768.0
+        else:
+            if len(frame) % 4:
+                raise ValueError("Float32 frame size is not a multiple of 4 bytes")
+            y = np.frombuffer(frame, dtype="<f4").astype(np.float32)
+        if self._resampler is not None:
+            y = self._resampler.resample_chunk(y)
+        return y
+
+
+class StreamSession:
+    """
+    Per-connection state of a streaming detection: the ring buffer of recent audio
+    and the update schedule. An update is due once `update_s` of new audio arrived,
+    no previous update is still running, and the connection is within its CPU budget:
+    after an inference that took t seconds the next may start t / budget later, so a
+    stream keeps at most `budget` of an inference thread busy. Due updates that can't
+    run are coalesced into the next one; the stream never builds a backlog.
+    """
+
+    def __init__(self, window_s=DEFAULT_WINDOW_S, update_s=DEFAULT_UPDATE_S, cpu_budget=DEFAULT_CPU_BUDGET):
+        self.window = int(window_s * SAMPLE_RATE)
+        self.update = max(1, int(update_s * SAMPLE_RATE))
+        self.cpu_budget = min(1.0, max(1e-3, float(cpu_budget)))
+        self.ring = RingBuffer(self.window)
+        self.scored_at = 0           # ring.total at the last update
+        self.busy = False
+        self.not_before = 0.0        # monotonic time the budget allows the next update
+        self.cpu_seconds = 0.0
+        self.updates = 0
+        self.coalesced = 0
+
+    def push(self, samples):
+        self.ring.write(samples)
+
+    def due(self):
+        if self.ring.total - self.scored_at < self.update:
+            return False
+        return not self.busy and time.monotonic() >= self.not_before
+
+    def start(self):
+        """Claim the current window for an update"""
+        self.busy = True
+        # Whole update intervals that passed without an update of their own
+        self.coalesced += max(0, (self.ring.total - self.scored_at) // self.update - 1)
+        self.scored_at = self.ring.total
+        return self.scored_at, self.ring.latest(self.window)
+
+    def finish(self, seconds):
+        self.busy = False
+        self.updates += 1
+        self.cpu_seconds += seconds
+        self.not_before = time.monotonic() + seconds * (1.0 / self.cpu_budget - 1.0)
+
+    def summary(self):
+        return {
+            "audio_s": round(self.ring.total / SAMPLE_RATE, 3),
+            "updates": self.updates,
+            "coalesced": self.coalesced,
+            "cpu_s": round(self.cpu_seconds, 3),
+        }
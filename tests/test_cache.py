@@ -0,0 +1,128 @@
+import pytest
+
+import cache
+from cache import ResultCache, cache_key
+
+
+class Clock:
+    """Stands in for time.time() in the cache module"""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "time", clock)
+    return clock
+
+
+def result(n):
+    return {"classification": "HUMAN", "confidence": n}
+
+
+def test_cache_key_covers_audio_model_and_variant():
+    key = cache_key(b"audio", "model@abc", "chunked=None")
+    assert key == cache_key(memoryview(b"audio"), "model@abc", "chunked=None")
+    assert key != cache_key(b"audio!", "model@abc", "chunked=None")
+    assert key != cache_key(b"audio", "model@def", "chunked=None")
+    assert key != cache_key(b"audio", "model@abc", "chunked=True")
+
+
+def test_file_objects_hash_like_their_bytes(tmp_path):
+    path = tmp_path / "clip.wav"
+    path.write_bytes(b"x" * (cache.HASH_CHUNK_SIZE + 10))
+    with open(path, "rb") as f:
+        assert cache.content_hash(f) == cache.content_hash(path.read_bytes())
+        assert f.tell() == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    results = ResultCache(max_entries=2)
+    results.put("a", result(1))
+    results.put("b", result(2))
+    assert results.get("a") == result(1)
+    results.put("c", result(3))
+    assert results.get("b") is None
+    assert results.get("a") == result(1)
+    assert results.get("c") == result(3)
+    assert results.evictions == 1
+
+
+def test_returned_results_are_copies():
+    results = ResultCache()
+    results.put("a", result(1))
+    results.get("a")["confidence"] = 0
+    assert results.get("a") == result(1)
+
+
+def test_entries_expire_after_ttl(clock):
+    results = ResultCache(ttl_s=10)
+    results.put("a", result(1))
+    clock.now += 10
+    assert results.get("a") == result(1)
+    clock.now += 1
+    assert results.get("a") is None
+    assert results.expirations == 1
+    assert results.snapshot()["entries"] == 0
+
+
+def test_results_survive_a_restart(tmp_path):
+    db = str(tmp_path / "results.db")
+    results = ResultCache(db_path=db)
+    results.put("a", result(1))
+    results.close()
+
+    reopened = ResultCache(db_path=db)
+    assert reopened.get("a") == result(1)
+    assert reopened.get("a") == result(1)
+    assert (reopened.hits, reopened.disk_hits, reopened.misses) == (2, 1, 0)
+    reopened.close()
+
+
+def test_expired_rows_are_deleted_from_disk(tmp_path, clock):
+    db = str(tmp_path / "results.db")
+    results = ResultCache(ttl_s=10, db_path=db)
+    results.put("a", result(1))
+    results.put("b", result(2))
+    results.close()
+
+    clock.now += 11
+    reopened = ResultCache(ttl_s=10, db_path=db)
+    assert reopened.expirations == 2
+    assert reopened.get("a") is None
+    assert reopened._db.execute("SELECT COUNT(*) FROM results").fetchone()[0] == 0
+    reopened.close()
+
+
+def test_disk_keeps_the_newest_rows(tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(cache, "PRUNE_EVERY", 2)
+    db = str(tmp_path / "results.db")
+    results = ResultCache(max_entries=1, db_path=db, max_db_entries=2)
+    for n, key in enumerate("abc"):
+        clock.now += 1
+        results.put(key, result(n))
+    # Pruning runs every PRUNE_EVERY puts, so the third row is only trimmed on the next open
+    assert results._db.execute("SELECT COUNT(*) FROM results").fetchone()[0] == 3
+    results.close()
+
+    reopened = ResultCache(max_entries=1, db_path=db, max_db_entries=2)
+    assert reopened.evictions == 1
+    assert reopened.get("a") is None
+    assert reopened.get("b") == result(1)
+    assert reopened.get("c") == result(2)
+    reopened.close()
+
+
+def test_periodic_prune_caps_the_file(tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(cache, "PRUNE_EVERY", 2)
+    results = ResultCache(db_path=str(tmp_path / "results.db"), max_db_entries=1)
+    for key in "ab":
+        clock.now += 1
+        results.put(key, result(0))
+    assert results._db.execute("SELECT key FROM results").fetchall() == [("b",)]
+    results.close()
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+import embedding_index
+from audio import SAMPLE_RATE
+from embedding_index import EmbeddingIndex
+
+DIM = 8
+
+
+def basis(i, dim=DIM):
+    vector = np.zeros(dim, dtype=np.float32)
+    vector[i] = 1.0
+    return vector
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = EmbeddingIndex.create(str(tmp_path / "index"), DIM, layer=2, model_id="tiny", clip_seconds=1.5)
+    index.add(np.stack([basis(0), basis(1)]), ["real.wav", "fake.wav"], ["HUMAN", "AI_GENERATED"])
+    return index
+
+
+def test_exact_duplicate_matches_at_threshold_one(index):
+    match, = index.match(basis(1)[None, :], threshold=1.0)
+    assert match == {"id": "fake.wav", "label": "AI_GENERATED", "similarity": 1.0}
+
+
+def test_nearest_entry_matches_only_above_threshold(index):
+    # Cosine similarity 0.8 with real.wav, 0.6 with fake.wav
+    query = 0.8 * basis(0) + 0.6 * basis(1)
+    match, = index.match(query[None, :], threshold=0.79)
+    assert (match["id"], match["similarity"]) == ("real.wav", 0.8)
+    assert index.match(query[None, :], threshold=0.81) == [None]
+
+
+def test_each_query_gets_its_own_match(index):
+    queries = np.stack([basis(0), basis(2), 3.0 * basis(1)])
+    assert [m and m["id"] for m in index.match(queries, threshold=0.95)] == ["real.wav", None, "fake.wav"]
+
+
+def test_empty_index_matches_nothing(tmp_path):
+    index = EmbeddingIndex.create(str(tmp_path / "empty"), DIM, layer=2, model_id="tiny")
+    assert index.match(np.stack([basis(0), basis(1)])) == [None, None]
+
+
+def test_clip_cuts_to_the_indexed_length(index):
+    assert index.clip_samples == int(1.5 * SAMPLE_RATE)
+    y = np.ones(2 * SAMPLE_RATE, dtype=np.float32)
+    assert len(index.clip(y)) == index.clip_samples
+    assert len(index.clip(y[:100])) == 100
+
+
+def test_add_rejects_duplicates_and_unknown_labels(index):
+    with pytest.raises(ValueError):
+        index.add(basis(2)[None, :], ["real.wav"], ["HUMAN"])
+    with pytest.raises(ValueError):
+        index.add(basis(2)[None, :], ["new.wav"], ["MAYBE"])
+    with pytest.raises(ValueError):
+        index.add(np.ones((1, DIM + 1)), ["new.wav"], ["HUMAN"])
+    assert len(index) == 2
+
+
+def test_reopened_index_ignores_rows_of_an_interrupted_add(index):
+    index.add(basis(2)[None, :], ["new.wav"], ["HUMAN"])
+    # Rows written past the recorded count, as an add() killed before its metadata write leaves them
+    with open(index._path(embedding_index.ENTRIES_FILE), "ab") as f:
+        f.write(b'{"id": "partial.wav", "label": "HUMAN"}\n')
+    with open(index._path(embedding_index.VECTORS_FILE), "ab") as f:
+        f.write(basis(3).astype(np.float16).tobytes())
+
+    reopened = EmbeddingIndex(index.directory)
+    assert reopened.ids == ["real.wav", "fake.wav", "new.wav"]
+    assert reopened.match(basis(3)[None, :]) == [None]
+    reopened.add(basis(3)[None, :], ["partial.wav"], ["AI_GENERATED"])
+    assert reopened.match(basis(3)[None, :])[0]["label"] == "AI_GENERATED"
+    assert EmbeddingIndex(index.directory).ids[-1] == "partial.wav"
+
+
+def test_ivf_search_finds_exact_duplicates(tmp_path):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((embedding_index.PQ_CENTROIDS + 44, 16)).astype(np.float32)
+    index = EmbeddingIndex.create(str(tmp_path / "ivf"), 16, layer=1, model_id="tiny")
+    index.add(vectors, [f"clip{i}" for i in range(len(vectors))], ["HUMAN"] * len(vectors))
+    index.train_ivf(nlist=4, subvectors=4, nprobe=4)
+
+    queries = vectors[[0, 17, 299]]
+    assert [m["id"] for m in index.match(queries, threshold=0.99)] == ["clip0", "clip17", "clip299"]
+    # Rows added after training are encoded on the way in
+    index.add(basis(0, 16)[None, :], ["late"], ["AI_GENERATED"])
+    assert index.match(basis(0, 16)[None, :], threshold=0.99)[0]["id"] == "late"
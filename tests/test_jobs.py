@@ -0,0 +1,214 @@
+import http.server
+import io
+import os
+import threading
+
+import pytest
+
+import jobs
+from jobs import JobQueue
+
+
+class Clock:
+    """Stands in for time.time() in the jobs module"""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(jobs.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def directory(tmp_path):
+    return str(tmp_path / "jobs")
+
+
+@pytest.fixture
+def queue(directory, clock):
+    queue = JobQueue(directory)
+    yield queue
+    queue.close()
+
+
+def submit(queue, clock, lane=jobs.DEFAULT_LANE, **kwargs):
+    clock.now += 1
+    return queue.submit(io.BytesIO(b"audio"), lane=lane, **kwargs)
+
+
+def test_claims_go_by_lane_then_age(queue, clock):
+    bulk = submit(queue, clock, "bulk")
+    normal_old = submit(queue, clock, "normal")
+    normal_new = submit(queue, clock, "normal")
+    interactive = submit(queue, clock, "interactive")
+    assert queue.get(normal_new)["queue_position"] == 2
+
+    claimed = [queue.claim("w")["id"] for _ in range(4)]
+    assert claimed == [interactive, normal_old, normal_new, bulk]
+    assert queue.claim("w") is None
+
+
+def test_claim_respects_lanes(queue, clock):
+    submit(queue, clock, "bulk")
+    assert queue.claim("w", lanes=["interactive"]) is None
+    assert queue.claim("w", lanes=["bulk"])["lane"] == "bulk"
+
+
+def test_a_job_is_claimed_once(queue, clock):
+    job_id = submit(queue, clock)
+    other = JobQueue(queue.directory)
+    try:
+        job = queue.claim("w1")
+        assert (job["id"], job["status"], job["attempts"]) == (job_id, "running", 1)
+        assert other.claim("w2") is None
+    finally:
+        other.close()
+
+
+def test_finished_job_keeps_its_result_and_drops_its_audio(queue, clock):
+    job_id = submit(queue, clock)
+    queue.claim("w")
+    assert queue.finish(job_id, "w", result={"classification": "HUMAN"})
+    job = queue.get(job_id)
+    assert (job["status"], job["result"]) == ("done", {"classification": "HUMAN"})
+    assert not os.path.exists(queue.audio_path(job_id))
+
+
+def test_expired_lease_is_reclaimed_after_a_restart(directory, clock):
+    first = JobQueue(directory)
+    job_id = submit(first, clock)
+    first.claim("w1", lease_s=10)
+    # The first worker's process dies holding the job
+    first.close()
+
+    second = JobQueue(directory)
+    try:
+        clock.now += 10
+        assert second.claim("w2", lease_s=10) is None
+        clock.now += 1
+        job = second.claim("w2", lease_s=10)
+        assert (job["id"], job["worker"], job["attempts"]) == (job_id, "w2", 2)
+        # The first worker can no longer record a result for it
+        assert not second.finish(job_id, "w1", result={"classification": "HUMAN"})
+        assert second.finish(job_id, "w2", result={"classification": "AI_GENERATED"})
+        assert second.get(job_id)["result"] == {"classification": "AI_GENERATED"}
+    finally:
+        second.close()
+
+
+def test_renewed_lease_is_not_reclaimed(queue, clock):
+    job_id = submit(queue, clock)
+    queue.claim("w1", lease_s=10)
+    clock.now += 8
+    queue.renew({job_id: "w1"}, lease_s=10)
+    clock.now += 8
+    assert queue.claim("w2") is None
+    assert queue.get(job_id)["status"] == "running"
+
+
+def test_job_fails_once_its_workers_were_lost_max_attempts_times(directory, clock):
+    queue = JobQueue(directory, max_attempts=2)
+    try:
+        job_id = submit(queue, clock)
+        for worker in ("w1", "w2"):
+            assert queue.claim(worker, lease_s=10)["id"] == job_id
+            clock.now += 11
+        assert queue.claim("w3") is None
+        job = queue.get(job_id)
+        assert (job["status"], job["error"]) == ("failed", "Worker lost 2 times")
+        assert not os.path.exists(queue.audio_path(job_id))
+    finally:
+        queue.close()
+
+
+def test_released_job_is_requeued_without_counting_the_attempt(queue, clock):
+    job_id = submit(queue, clock)
+    queue.claim("w1")
+    queue.release(job_id, "w1")
+    assert queue.get(job_id)["status"] == "queued"
+    assert queue.claim("w2")["attempts"] == 1
+
+
+def test_failed_callbacks_back_off_until_delivered(queue, clock):
+    job_id = submit(queue, clock, callback_url="https://hooks.example/done")
+    assert queue.claim_callbacks() == []
+    queue.claim("w")
+    queue.finish(job_id, "w", result={"classification": "HUMAN"})
+
+    assert [row["id"] for row in queue.claim_callbacks()] == [job_id]
+    # Held back while the first attempt is in flight
+    assert queue.claim_callbacks() == []
+    queue.callback_attempted(job_id, "callback answered HTTP 500")
+    clock.now += jobs.CALLBACK_BACKOFF_S - 1
+    assert queue.claim_callbacks() == []
+    clock.now += 1
+    assert [row["id"] for row in queue.claim_callbacks()] == [job_id]
+    queue.callback_attempted(job_id)
+    assert queue.get(job_id)["callback"] == {"url": "https://hooks.example/done", "state": "delivered",
+                                             "attempts": 2, "error": None}
+
+
+@pytest.mark.parametrize("url", ["ftp://hooks.example/", "http://127.0.0.1/", "http://[::1]:8080/",
+                                 "http://169.254.169.254/latest", "http://10.0.0.1/"])
+def test_internal_callback_urls_are_refused(url):
+    with pytest.raises(ValueError):
+        jobs.check_callback_url(url)
+
+
+def test_allowed_callback_hosts_skip_the_address_check():
+    assert jobs.check_callback_url("http://127.0.0.1:8080/hook", frozenset({"127.0.0.1"})) is None
+    with pytest.raises(ValueError):
+        jobs.check_callback_url("http://localhost/hook", frozenset({"127.0.0.1"}))
+
+
+@pytest.fixture
+def hook():
+    """Local HTTP server: 302 to the metadata address on /redirect, 204 elsewhere; records what it got"""
+    received = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_POST(self):
+            received.append((self.command, self.path))
+            self.rfile.read(int(self.headers["Content-Length"]))
+            if self.path == "/redirect":
+                self.send_response(302)
+                self.send_header("Location", "http://169.254.169.254/latest/meta-data/")
+            else:
+                self.send_response(204)
+            self.end_headers()
+
+        do_GET = do_POST
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}", received
+    server.shutdown()
+    server.server_close()
+
+
+def test_callbacks_do_not_follow_redirects(hook):
+    url, received = hook
+    allowed = frozenset({"127.0.0.1"})
+    jobs.post_callback(f"{url}/done", {"id": "job"}, allowed_hosts=allowed)
+    with pytest.raises(jobs.CallbackFailed, match="HTTP 302"):
+        jobs.post_callback(f"{url}/redirect", {"id": "job"}, allowed_hosts=allowed)
+    assert received == [("POST", "/done"), ("POST", "/redirect")]
+
+
+def test_callback_errors_do_not_leak_details(hook):
+    url, received = hook
+    with pytest.raises(jobs.CallbackFailed) as refused:
+        jobs.post_callback(f"{url}/done", {"id": "job"})
+    assert "127.0.0.1" not in str(refused.value)
+    assert received == []
@@ -0,0 +1,103 @@
+import time
+
+import numpy as np
+
+from audio import SAMPLE_RATE
+
+# Defaults (overridable through environment variables in inference.py)
+DEFAULT_FRAME_MS = 30
+# A frame is speech when its energy clears all of: the absolute floor, the loudest
+# frames minus DEFAULT_RANGE_DB, and the quietest frames plus DEFAULT_NOISE_MARGIN_DB
+DEFAULT_THRESHOLD_DB = -50.0
+DEFAULT_RANGE_DB = 30.0
+DEFAULT_NOISE_MARGIN_DB = 6.0
+# Speech regions are widened by this much on both sides (word onsets, short pauses)
+DEFAULT_PAD_MS = 200
+# Less speech than this and the clip counts as having none
+DEFAULT_MIN_SPEECH_S = 0.25
+# At most this much speech is analysed; the rest of the clip is dropped
+DEFAULT_MAX_SPEECH_S = 30.0
+
+
+def frame_energy_db(y, frame):
+    """Mean power of consecutive `frame`-sample frames in dBFS (a short last frame is zero padded)"""
+    n = -(-len(y) // frame)
+    if n * frame != len(y):
+        y = np.pad(y, (0, n * frame - len(y)))
+    frames = y.reshape(n, frame)
+    power = np.einsum("ij,ij->i", frames, frames) / frame
+    return 10.0 * np.log10(power + 1e-10)
+
+
+def speech_mask(y, sr=SAMPLE_RATE, frame_ms=DEFAULT_FRAME_MS, threshold_db=DEFAULT_THRESHOLD_DB,
+                range_db=DEFAULT_RANGE_DB, noise_margin_db=DEFAULT_NOISE_MARGIN_DB):
+    """Per-frame speech flags (before padding) from frame energies"""
+    frame = max(1, int(sr * frame_ms / 1000))
+    energy = frame_energy_db(y, frame)
+    if len(energy) == 0:
+        return energy.astype(bool), frame
+    quiet, loud = np.percentile(energy, [10, 95])
+    threshold = max(threshold_db, loud - range_db, quiet + noise_margin_db)
+    return energy > threshold, frame
+
+
+def speech_regions(mask, pad_frames):
+    """(start, end) frame ranges of the mask after widening every speech frame by `pad_frames`"""
+    if pad_frames > 0 and mask.any():
+        # Zero-padded "valid" convolution: the output lines up with the mask at any length, where
+        # mode="same" returns the kernel's length (shifted) for masks shorter than the kernel
+        padded = np.pad(mask.astype(np.int8), pad_frames)
+        mask = np.convolve(padded, np.ones(2 * pad_frames + 1), mode="valid") > 0
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.astype(np.int8), [0]))))
+    return edges.reshape(-1, 2)
+
+
+def trim_silence(y, sr=SAMPLE_RATE, frame_ms=DEFAULT_FRAME_MS, threshold_db=DEFAULT_THRESHOLD_DB,
+                 pad_ms=DEFAULT_PAD_MS, min_speech_s=DEFAULT_MIN_SPEECH_S, max_speech_s=DEFAULT_MAX_SPEECH_S):
+    """
+    Keep only the speech in `y`, at most `max_speech_s` of it.
+    Returns (waveform, speech seconds); the waveform is empty when there is less than
+    `min_speech_s` of speech, and `y` itself when nothing had to be dropped.
+    """
+    mask, frame = speech_mask(y, sr, frame_ms, threshold_db)
+    speech_s = mask.sum() * frame / sr
+    if speech_s < min_speech_s:
+        return y[:0], 0.0
+
+    regions = speech_regions(mask, int(pad_ms / frame_ms)) * frame
+    budget = len(y) if max_speech_s is None else int(max_speech_s * sr)
+    if len(regions) == 1 and regions[0, 0] == 0 and regions[0, 1] >= len(y) and budget >= len(y):
+        return y, len(y) / sr
+
+    pieces = []
+    for start, end in regions:
+        end = min(end, len(y), start + budget)
+        pieces.append(y[start:end])
+        budget -= end - start
+        if budget <= 0:
+            break
+    speech = np.concatenate(pieces)
+    return speech, len(speech) / sr
+
+
+def decode_speech(decode, source, **options):
+    """
+    decode(source) followed by trim_silence(), for decode workers; `decode` returns
+    (waveform, truncated) as audio.load_audio_capped does. Returns (speech waveform,
+    {"input_seconds", "speech_seconds", "vad_seconds", "truncated"}).
+    """
+    y, truncated = decode(source)
+    started = time.perf_counter()
+    speech, speech_s = trim_silence(y, **options)
+    return speech, {"input_seconds": len(y) / SAMPLE_RATE, "speech_seconds": round(speech_s, 3),
+                    "vad_seconds": time.perf_counter() - started, "truncated": truncated}
+
+
+def no_speech_result(input_seconds):
+    """Answer for a clip without speech, returned without running the model"""
+    return {
+        "classification": "NO_SPEECH",
+        "confidence": 0.0,
+        "explanation": f"No speech detected in {input_seconds:.1f}s of audio; nothing to classify.",
+        "speech_seconds": 0.0,
+    }
@@ -1,10 +1,6 @@
-import requests
 import base64
-import json
 
-# Configuration
-API_URL = "http://127.0.0.1:8001/detect"
-API_KEY = "hackathon-secret-key"
+from detector_client import Client, DetectorError, DEFAULT_URL
 
 def create_dummy_mp3():
     """Create a dummy header-only MP3/Audio file for testing logic if no file exists"""
@@ -21,22 +17,17 @@ def test_api():
     # The API should return 500 or 200 depending on if librosa can interpret it as silence or errors out.
     # Ideally, we should provide a tiny valid Base64 string if possible, or just expect the error handling to work.
     
-    payload = {"audio_base64": b64_string}
-    headers = {
-        "X-API-Key": API_KEY,
-        "Content-Type": "application/json"
-    }
-    
-    print(f"Sending request to {API_URL}...")
-    try:
-        # Note: This requires the server to be running. 
-        # Since I cannot run background server + script in one go easily without blocking,
-        # This script is for the USER to run.
-        response = requests.post(API_URL, json=payload, headers=headers)
-        print("Status Code:", response.status_code)
-        print("Response:", response.json())
-    except Exception as e:
-        print(f"Request failed (Server likely not running): {e}")
+    print(f"Sending request to {DEFAULT_URL}/detect...")
+    # Note: This requires the server to be running (DETECTOR_URL picks another address).
+    # The client retries while the server answers 503 during model loading.
+    with Client() as client:
+        try:
+            print("Response:", client.detect_base64(b64_string))
+        except DetectorError as e:
+            print("Status Code:", e.status_code)
+            print("Response:", e.detail)
+        except Exception as e:
+            print(f"Request failed (Server likely not running): {e}")
 
 if __name__ == "__main__":
     test_api()
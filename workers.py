@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Defaults (overridable through environment variables in app.py)
+DEFAULT_DECODE_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+DEFAULT_INFERENCE_THREADS = 1
+DEFAULT_MAX_PENDING = 64
+DEFAULT_REQUEST_TIMEOUT_S = 30.0
+DEFAULT_RETRY_AFTER_S = 1
+
+
+class Overloaded(Exception):
+    """Raised when the admission queue is full; maps to 503 + Retry-After"""
+
+    def __init__(self, retry_after):
+        super().__init__("Server is overloaded, retry later")
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a job is picked up after its caller has already given up"""
+
+
+def _run_before_deadline(deadline, fn, *args):
+    # Runs inside the worker: skip work nobody is waiting for any more.
+    # time.time() is used (not monotonic) so the check also holds in process workers.
+    if deadline is not None and time.time() > deadline:
+        raise DeadlineExceeded("Request deadline passed before work started")
+    return fn(*args)
+
+
+class InferencePool:
+    """
+    Bounded execution for the blocking parts of a request.
+
+    * decode work (librosa / base64) goes to a thread or process pool,
+    * forward passes go to a small dedicated thread pool (torch releases the GIL),
+    * at most `max_pending` requests are admitted at once; the rest are
+      rejected immediately instead of piling up latency.
+    """
+
+    def __init__(self, decode_workers=DEFAULT_DECODE_WORKERS, inference_threads=DEFAULT_INFERENCE_THREADS,
+                 max_pending=DEFAULT_MAX_PENDING, kind="thread", retry_after_s=DEFAULT_RETRY_AFTER_S):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor kind: {kind}")
+        self.kind = kind
+        self.max_pending = max(1, int(max_pending))
+        self.retry_after_s = retry_after_s
+        self.pending = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.decode_workers = max(1, int(decode_workers))
+        self.inference_threads = max(1, int(inference_threads))
+        self.decode_executor = None
+        self.inference_executor = None
+
+    def start(self):
+        """Create the executors (called from the app lifespan)"""
+        if self.decode_executor is not None:
+            return
+        executor_cls = ProcessPoolExecutor if self.kind == "process" else ThreadPoolExecutor
+        self.decode_executor = executor_cls(max_workers=self.decode_workers)
+        self.inference_executor = ThreadPoolExecutor(
+            max_workers=self.inference_threads, thread_name_prefix="inference"
+        )
+        logger.info(f"Inference pool ready ({self.kind} decode workers={self.decode_workers}, "
+                    f"inference threads={self.inference_threads}, max_pending={self.max_pending})")
+
+    @contextmanager
+    def admit(self):
+        """Reserve a slot for one request or raise Overloaded"""
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise Overloaded(self.retry_after_s)
+        self.pending += 1
+        try:
+            yield
+        finally:
+            self.pending -= 1
+
+    async def decode(self, fn, *args, deadline=None):
+        """Run a (picklable, in process mode) decode function in the decode pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.decode_executor, _run_before_deadline, deadline, fn, *args)
+
+    def snapshot(self):
+        return {
+            "executor": self.kind,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+    def shutdown(self):
+        if self.decode_executor is None:
+            return
+        self.decode_executor.shutdown(wait=False, cancel_futures=True)
+        self.inference_executor.shutdown(wait=False, cancel_futures=True)
+        self.decode_executor = None
+        self.inference_executor = None